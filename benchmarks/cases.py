@@ -0,0 +1,277 @@
+"""
+Benchmark cases. Each case runs in its own process (see run.py), against the
+local fakes started by BenchEnv, so peak RSS and the services' singletons
+(Cache, transport) are per case.
+
+A case receives the BenchEnv and measures its timed region with
+`with env.measure():`. It may return a dict of extra figures (counts, sizes).
+"""
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import resource
+import tempfile
+import time
+
+from fakes.catalog import make_catalog
+from fakes.hdrezka_server import FakeRezkaServer
+from fakes.trakt_server import FakeTraktServer
+
+# Titles in the fake catalog per scale ('full' is ~10x today's list)
+SCALES = {
+    'small': {'shows': 300, 'movies': 200},
+    'full': {'shows': 3000, 'movies': 2000},
+}
+CACHE_SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+CASES = {}
+
+def case(name):
+    def register(fn):
+        CASES[name] = fn
+        return fn
+    return register
+
+
+@contextlib.contextmanager
+def quiet():
+    """Drops log records (formatting and I/O included) and stdout (tqdm bars) inside the block."""
+    previous = logging.root.manager.disable
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(previous)
+
+
+class BenchEnv:
+    """
+    Temp working directory, both fakes sharing one catalog, and the env vars
+    that point the services at them. main/services are imported lazily so
+    they pick up the overrides.
+    """
+
+    def __init__(self, scale='small', seed=1):
+        self.workdir = tempfile.mkdtemp(prefix='trakt-sync-bench-')
+        os.chdir(self.workdir)
+        self.catalog = make_catalog(seed=seed, **SCALES[scale])
+        self.trakt_server = FakeTraktServer(catalog=self.catalog).start()
+        self.rezka_server = FakeRezkaServer(catalog=self.catalog, seed=seed).start()
+
+        token_file = os.path.join(self.workdir, 'trakt_token.json')
+        with open(token_file, 'w') as f:
+            json.dump(self.trakt_server.issue_token(), f)
+        os.environ.update({
+            'TRAKT_API_URL': self.trakt_server.url,
+            'TRAKT_AUTH_URL': self.trakt_server.url,
+            'TRAKT_TOKEN_FILE': token_file,
+            'TRAKT_CLIENT_ID': 'bench',
+            'TRAKT_CLIENT_SECRET': 'bench',
+            'HDREZKA_MIRRORS': self.rezka_server.url,
+            'HDREZKA_USERNAME': 'bench',
+            'HDREZKA_PASSWORD': 'bench',
+        })
+        self.result = {}
+
+    def stop(self):
+        self.trakt_server.stop()
+        self.rezka_server.stop()
+
+    @contextlib.contextmanager
+    def measure(self):
+        """Times the block; request counts and bytes come from the fakes' /__stats counters."""
+        self.trakt_server.stats.reset()
+        self.rezka_server.stats.reset()
+        start = time.perf_counter()
+        # Per-item log records and tqdm bars stay out of the timings and the JSON output
+        with quiet():
+            yield
+        self.result['wall_s'] = round(time.perf_counter() - start, 4)
+        for name, server in (('trakt', self.trakt_server), ('rezka', self.rezka_server)):
+            stats = server.stats.snapshot()
+            self.result[f'{name}_requests'] = stats['total_requests']
+            self.result[f'{name}_bytes'] = stats['bytes_in'] + stats['bytes_out']
+
+    def peak_rss_kb(self):
+        # ru_maxrss is KB on Linux (bytes on macOS), compare like with like
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Shared setup (untimed)
+
+    def trakt(self):
+        from services.trakt_api import TraktAPI
+        return TraktAPI('bench', 'bench')
+
+    def scraper(self):
+        from services.hdrezka import HDRezkaScraper
+        return HDRezkaScraper('bench', 'bench')
+
+    def watch_list(self, scraper):
+        with quiet():
+            return scraper.get_watch_list_http()
+
+    def trakt_watched(self, trakt):
+        with quiet():
+            watched = trakt.get_watched_shows()
+            watched.update(trakt.get_watched_movies())
+        return watched
+
+    def resolved(self, scraper, trakt, trakt_watched):
+        import main
+        from utils.id_index import IdIndex
+        id_index = IdIndex()
+        id_index.add_watched(trakt_watched)
+        with quiet():
+            watch_list = scraper.get_watch_list_http()
+            resolved, _ = main.resolve_watch_list(watch_list, scraper, trakt, id_index, browser_fallback=False)
+            trakt.load_show_progress(trakt_watched, [it['imdb_id'] for it in resolved if it['type'] == 'show'])
+        return resolved
+
+
+def _write_cache_file(path, entries, seed=1):
+    rng = random.Random(seed)
+    data = {}
+    for i in range(entries):
+        item_type = 'show' if i % 3 else 'movie'
+        data[f"/{'series' if item_type == 'show' else 'films'}/drama/{i}-title-{i}.html"] = {
+            'id': f"tt{1000000 + i}",
+            'status': rng.choice(['active', 'active', 'active', 'completed', 'ignored']),
+            'date': f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(2015, 2025)}",
+            'trakt_data': {
+                'title': f"Title {i}",
+                'year': rng.randint(1990, 2025),
+                'ids': {'trakt': 100000 + i, 'slug': f"title-{i}", 'imdb': f"tt{1000000 + i}", 'tmdb': 500000 + i},
+                'type': item_type
+            }
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+
+
+def _fresh_cache(path):
+    from utils.cache import Cache
+    Cache._instance = None # Singleton, force a real load
+    return Cache(path)
+
+
+for _label, _size in CACHE_SIZES.items():
+    def _load(env, size=_size):
+        _write_cache_file('cache.json', size)
+        with env.measure():
+            cache = _fresh_cache('cache.json')
+        return {'entries': len(cache.data), 'file_bytes': os.path.getsize('cache.json')}
+
+    def _save(env, size=_size):
+        _write_cache_file('cache.json', size)
+        cache = _fresh_cache('cache.json')
+        with env.measure():
+            cache.save_cache()
+        return {'entries': len(cache.data), 'file_bytes': os.path.getsize('cache.json')}
+
+    case(f'cache_load_{_label}')(_load)
+    case(f'cache_save_{_label}')(_save)
+
+
+@case('parse_watch_list')
+def parse_watch_list(env):
+    from services.rezka_parser import parse_watch_list as parse
+    import requests
+    session = requests.Session()
+    session.post(f"{env.rezka_server.url}/ajax/login/", data={'login_name': 'bench', 'login_password': 'bench'})
+    page = session.get(f"{env.rezka_server.url}/continue/").text
+    with env.measure():
+        rows = parse(page)
+    return {'rows': len(rows), 'page_bytes': len(page.encode('utf-8'))}
+
+
+@case('watch_list_http')
+def watch_list_http(env):
+    scraper = env.scraper()
+    scraper.select_mirror()
+    with env.measure():
+        rows = scraper.get_watch_list_http()
+    return {'rows': len(rows)}
+
+
+@case('phase1_cold')
+def phase1_cold(env):
+    import main
+    from utils.id_index import IdIndex
+    scraper, trakt = env.scraper(), env.trakt()
+    watched = env.trakt_watched(trakt)
+    watch_list = env.watch_list(scraper)
+    id_index = IdIndex()
+    id_index.add_watched(watched)
+    with env.measure():
+        resolved, failed = main.resolve_watch_list(watch_list, scraper, trakt, id_index, browser_fallback=False)
+    return {'items': len(watch_list), 'resolved': len(resolved), 'failed': len(failed)}
+
+
+@case('phase1_warm')
+def phase1_warm(env):
+    import main
+    from utils.id_index import IdIndex
+    scraper, trakt = env.scraper(), env.trakt()
+    watched = env.trakt_watched(trakt)
+    watch_list = env.watch_list(scraper)
+    id_index = IdIndex()
+    id_index.add_watched(watched)
+    with quiet():
+        main.resolve_watch_list(watch_list, scraper, trakt, id_index, browser_fallback=False)
+    with env.measure():
+        resolved, failed = main.resolve_watch_list(watch_list, scraper, trakt, id_index, browser_fallback=False)
+    return {'items': len(watch_list), 'resolved': len(resolved)}
+
+
+@case('plan_sync')
+def plan_sync(env):
+    import main
+    scraper, trakt = env.scraper(), env.trakt()
+    watched = env.trakt_watched(trakt)
+    resolved = env.resolved(scraper, trakt, watched)
+    with env.measure():
+        final_sync_list, items_to_remove = main.plan_sync(resolved, watched, scraper.cache)
+    return {'items': len(resolved), 'to_sync': len(final_sync_list), 'to_remove': len(items_to_remove)}
+
+
+@case('build_payload')
+def build_payload(env):
+    import main
+    from services.trakt_api import build_history_payload
+    scraper, trakt = env.scraper(), env.trakt()
+    watched = env.trakt_watched(trakt)
+    resolved = env.resolved(scraper, trakt, watched)
+    with quiet():
+        final_sync_list, _ = main.plan_sync(resolved, watched, scraper.cache)
+    batches = [final_sync_list[i:i + 100] for i in range(0, len(final_sync_list), 100)]
+    with env.measure():
+        payloads = [build_history_payload(batch) for batch in batches]
+    return {
+        'items': len(final_sync_list),
+        'payload_bytes': sum(len(json.dumps(p, separators=(',', ':'))) for p in payloads)
+    }
+
+
+@case('verify')
+def verify(env):
+    import main
+    scraper, trakt = env.scraper(), env.trakt()
+    watched = env.trakt_watched(trakt)
+    resolved = env.resolved(scraper, trakt, watched)
+    with env.measure():
+        mismatches = main.verify_synced(resolved, watched)
+    return {'items': len(resolved), 'mismatches': mismatches}
+
+
+@case('full_sync')
+def full_sync(env):
+    import main
+    main.REMOVAL_SETTLE_SECONDS = 0
+    main.PROPAGATION_WAIT_SECONDS = 0
+    with env.measure():
+        main.start(watch_list_mode='http', browser_fallback=False)
+    return {'titles': len(env.catalog)}
@@ -0,0 +1,138 @@
+"""
+End-to-end benchmark suite against the local fakes.
+
+    python -m benchmarks.run                      # all cases, compare with baseline.json
+    python -m benchmarks.run --only cache_load_10k,phase1_cold
+    python -m benchmarks.run --scale full         # ~10x today's list size
+    python -m benchmarks.run --update-baseline    # accept the current numbers
+
+Every case runs in a fresh process. Results (wall time, requests and bytes
+seen by the fakes, peak RSS) are written as JSON; anything worse than the
+baseline by more than --tolerance is reported and makes the exit code 1.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Wall time and RSS are noisy, request counts and bytes should be stable
+DEFAULT_TOLERANCE = 0.25
+COMPARED = ('wall_s', 'trakt_requests', 'trakt_bytes', 'rezka_requests', 'rezka_bytes', 'peak_rss_kb')
+# Below this the wall time is noise
+MIN_WALL_S = 0.05
+
+
+def run_case(name, scale):
+    """Runs one case in a child process, returns its result dict."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    proc = subprocess.run([sys.executable, '-m', 'benchmarks.run', '--child', name, '--scale', scale],
+                          capture_output=True, text=True, cwd=root, env=env)
+    if proc.returncode != 0:
+        return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def child(name, scale):
+    from benchmarks.cases import CASES, BenchEnv
+    env = BenchEnv(scale)
+    try:
+        extra = CASES[name](env) or {}
+        result = dict(env.result, **extra)
+        result['peak_rss_kb'] = env.peak_rss_kb()
+    finally:
+        env.stop()
+    print(json.dumps(result))
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of 'case: metric old -> new' regressions."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or 'error' in result:
+            continue
+        for metric in COMPARED:
+            if metric not in result or metric not in old:
+                continue
+            if metric == 'wall_s' and old[metric] < MIN_WALL_S and result[metric] < MIN_WALL_S:
+                continue
+            if result[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {old[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main():
+    from benchmarks.cases import CASES, SCALES
+
+    parser = argparse.ArgumentParser(description="TraktSync benchmarks")
+    parser.add_argument('--only', help='Comma separated case names')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--list', action='store_true', help='List case names')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.scale)
+    if args.list:
+        print('\n'.join(CASES))
+        return
+
+    names = args.only.split(',') if args.only else list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"Unknown case(s): {', '.join(unknown)}")
+
+    results = {}
+    for name in names:
+        result = run_case(name, args.scale)
+        results[name] = result
+        if 'error' in result:
+            print(f"{name:<20} ERROR {result['error']}")
+        else:
+            print(f"{name:<20} {result['wall_s']:>9.3f}s  trakt {result['trakt_requests']:>5} req  "
+                  f"rezka {result['rezka_requests']:>5} req  rss {result['peak_rss_kb'] // 1024} MB")
+
+    report = {'scale': args.scale, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}")
+
+    # Baselines are per scale
+    baseline_all = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline_all = json.load(f)
+
+    if args.update_baseline:
+        merged = dict(baseline_all.get(args.scale, {}))
+        merged.update({n: r for n, r in results.items() if 'error' not in r})
+        baseline_all[args.scale] = merged
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline_all, f, indent=4)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    baseline = baseline_all.get(args.scale, {})
+    if not baseline:
+        print("No baseline for this scale, run with --update-baseline to record one.")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    errors = [n for n, r in results.items() if 'error' in r]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  - {line}")
+    else:
+        print(f"\nNo regressions against baseline (tolerance {args.tolerance:.0%}).")
+    if regressions or errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
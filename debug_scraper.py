@@ -1,18 +1,25 @@
+import sys
 import requests
 import re
 import base64
+from utils.http_cache import HttpCache
 
 url = "https://hdrezka-home.tv/animation/adventures/20082-dyurarara-tv-1-2010.html"
+# --offline parses the copy in http_cache/ without touching the site
+offline = '--offline' in sys.argv
+http_cache = HttpCache()
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
 print(f"Fetching {url}...")
 try:
-    response = requests.get(url, headers=headers, timeout=10)
-    print(f"Status Code: {response.status_code}")
+    body, from_cache = http_cache.fetch(requests.Session(), url, headers=headers, offline=offline)
+    if body is None:
+        raise Exception("not in http_cache (run once without --offline)")
+    print(f"From Cache: {from_cache}")
     
-    html = response.text
+    html = body.decode('utf-8', errors='replace')
     print(f"HTML Length: {len(html)}")
     
     # Check for help links
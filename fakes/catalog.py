@@ -0,0 +1,53 @@
+"""
+Deterministic synthetic catalog shared by the fake Trakt and HDRezka servers,
+so an HDRezka item page and the Trakt search result agree on the IMDb ID.
+"""
+import random
+
+def make_catalog(shows=300, movies=200, seed=1):
+    """
+    Returns a list of titles:
+    {'type': 'show'/'movie', 'title', 'year', 'ids': {...}, 'seasons': [episode counts] (shows only)}
+    """
+    rng = random.Random(seed)
+    catalog = []
+    for i in range(shows + movies):
+        item_type = 'show' if i < shows else 'movie'
+        trakt_id = 100000 + i
+        title = f"Fake {item_type.title()} {i}"
+        entry = {
+            'type': item_type,
+            'title': title,
+            'year': rng.randint(1990, 2025),
+            'ids': {
+                'trakt': trakt_id,
+                'slug': title.lower().replace(' ', '-'),
+                'imdb': f"tt{9000000 + i}",
+                'tmdb': 500000 + i,
+                'tvdb': 700000 + i if item_type == 'show' else None
+            }
+        }
+        if item_type == 'show':
+            entry['seasons'] = [rng.randint(6, 24) for _ in range(rng.randint(1, 12))]
+        catalog.append(entry)
+    return catalog
+
+def make_watch_state(catalog, watched_fraction=0.5, seed=1):
+    """
+    Random starting progress for the 'account': {imdb_id: {'season', 'episode'} or {} for movies}.
+    Shows are watched up to a random episode, like the HDRezka continue list.
+    """
+    rng = random.Random(seed + 1)
+    state = {}
+    for entry in catalog:
+        if rng.random() >= watched_fraction:
+            continue
+        if entry['type'] == 'movie':
+            state[entry['ids']['imdb']] = {}
+        else:
+            season = rng.randint(1, len(entry['seasons']))
+            state[entry['ids']['imdb']] = {
+                'season': season,
+                'episode': rng.randint(1, entry['seasons'][season - 1])
+            }
+    return state
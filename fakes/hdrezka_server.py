@@ -0,0 +1,330 @@
+"""
+Local stand-in for an HDRezka mirror, for scraper benchmarks.
+
+Serves the /continue/ page (same markup as page_dump.html) with one row per
+catalog title, item pages with /help/<base64> IMDb links, the login form and
+/ajax/login/, optional pagination, JS-only IMDb links and slow responses.
+
+    python -m fakes.hdrezka_server --port 8901 --shows 3000 --movies 2000 --latency 30
+
+then point the scraper at it:
+
+    HDREZKA_MIRRORS=http://127.0.0.1:8901 python main.py --watch-list http
+"""
+import argparse
+import base64
+import hashlib
+import html
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fakes.catalog import make_catalog, make_watch_state
+from fakes.stats import Stats
+
+SESSION_COOKIE = 'dle_user_id'
+LAST_MODIFIED = formatdate(1700000000, usegmt=True)
+
+ITEM_PATH_RE = re.compile(r'^/(series|films)/[a-z]+/(\d+)-[a-z0-9-]+\.html$')
+CONTINUE_PATH_RE = re.compile(r'^/continue/(?:page/(\d+)/)?$')
+
+PAGE_HEAD = ('<!DOCTYPE html><html dir="ltr" lang="ru"><head><title>{title}</title>'
+             '<meta charset="utf-8"></head><body class="b-theme__template__night">'
+             '<div id="wrapper"><div id="main"><div id="top-head" class="b-tophead_wrapper fixed">'
+             '<div class="b-tophead b-wrapper">{tophead}</div></div>')
+PAGE_FOOT = '</div></div></body></html>'
+
+LOGGED_OUT_TOPHEAD = (
+    '<a class="b-tophead__login" href="javascript:void(0)" '
+    'onclick="document.getElementById(\'login-popup\').style.display=\'block\'">Вход</a>'
+    '<div id="login-popup" style="display:none"><form method="post" action="/ajax/login/">'
+    '<input type="text" id="login_name" name="login_name">'
+    '<input type="password" id="login_password" name="login_password">'
+    '<input type="submit" value="Войти"></form></div>'
+)
+LOGGED_IN_TOPHEAD = '<a class="b-tophead-logout" href="/logout/">Выход</a>'
+
+LIST_HEADER = ('<div class="b-videosaves__list_item"> <div class="th date">Дата</div> '
+               '<div class="th title">Название</div> <div class="th info">Последняя информация</div> '
+               '<div class="th controls">&nbsp;</div> </div>')
+
+ROW = ('<div id="videosave-{save_id}" class="b-videosaves__list_item"> <div class="td date"> {date} </div> '
+       '<div class="td title"> <a href="{url}" data-cover_url="{base}/i/cover.jpg">{title}</a> '
+       '<small>({year})</small> </div> <div class="td info"> {info} </div> '
+       '<div class="td controls"> <div class="controls-holder"> '
+       '<a href="javascript:void(0)" title="Отметить как просмотренный" data-id="{save_id}" class="i-sprt view"></a> '
+       '<a href="javascript:void(0)" title="Удалить сохранение" data-id="{save_id}" class="i-sprt delete"></a> '
+       '</div> </div></div>')
+
+SERIES_INFO = ('{season} сезон {episode} серия (Fake Studio) <span class="info-holder"><br>'
+               '<a href="{url}#continue" class="new-episode own">смотреть ещё <b>{left}</b> серий в '
+               '<b>{season}</b> сезоне</a></span>')
+
+# Comment-section filler, so item pages weigh roughly what the real ones do
+FILLER_BLOCK = ('<div class="b-comment"><div class="b-comment__text">Lorem ipsum dolor sit amet, '
+                'consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.</div></div>\n')
+
+
+class FakeRezkaConfig:
+    def __init__(self, latency=0.0, jitter=0.0, page_size=0, item_kb=300, js_only_rate=0.0,
+                 error_rate=0.0, username=None, password=None):
+        self.latency = latency            # seconds added to every response
+        self.jitter = jitter              # +- uniform seconds
+        self.page_size = page_size        # /continue/ rows per page (0 = one page)
+        self.item_kb = item_kb            # approximate item page size
+        self.js_only_rate = js_only_rate  # fraction of items whose IMDb link only exists after JS
+        self.error_rate = error_rate      # fraction of item pages answered with 503
+        self.username = username          # None accepts any login
+        self.password = password
+
+
+class RezkaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass # Quiet, /__stats has the numbers
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        server = self.server
+        parsed = urllib.parse.urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if parsed.path == '/__stats':
+            return self._send(None, 200, json.dumps(server.stats.snapshot()).encode('utf-8'), 'application/json')
+        if parsed.path == '/__reset_stats':
+            server.stats.reset()
+            return self._send(None, 200, b'{"ok": true}', 'application/json')
+
+        config = server.config
+        delay = config.latency + (random.uniform(-config.jitter, config.jitter) if config.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        self.request_bytes = len(body)
+        logged_in = self._cookie(SESSION_COOKIE) == server.session_id
+
+        if method == 'POST' and parsed.path == '/ajax/login/':
+            return self._login(body)
+        if method != 'GET':
+            return self._send('other', 405, b'')
+        if parsed.path == '/':
+            return self._send('GET /', 200, self._page('HDrezka', logged_in, '<div class="b-content__main"></div>'))
+
+        match = CONTINUE_PATH_RE.match(parsed.path)
+        if match:
+            page = int(match.group(1) or 1)
+            return self._send('GET /continue/', 200, self._continue_page(page, logged_in))
+
+        match = ITEM_PATH_RE.match(parsed.path)
+        if match:
+            entry = server.by_trakt.get(int(match.group(2)))
+            if entry is None:
+                return self._send('GET /item', 404, self._page('404', logged_in, ''))
+            if config.error_rate and random.random() < config.error_rate:
+                return self._send('GET /item', 503, b'Service Unavailable')
+            return self._item_page(entry, logged_in)
+
+        self._send('other', 404, self._page('404', logged_in, ''))
+
+    def _cookie(self, name):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        return cookie[name].value if name in cookie else None
+
+    def _login(self, body):
+        form = dict(urllib.parse.parse_qsl(body.decode('utf-8')))
+        config = self.server.config
+        ok = ((config.username is None or form.get('login_name') == config.username) and
+              (config.password is None or form.get('login_password') == config.password))
+        headers = {}
+        if ok:
+            headers['Set-Cookie'] = f"{SESSION_COOKIE}={self.server.session_id}; Path=/"
+        if self.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            # The site's own JS login
+            data = b'{"success": true}' if ok else b'{"success": false, "message": "bad login"}'
+            return self._send('POST /ajax/login/', 200, data, 'application/json', headers)
+        # Plain form post (the browser modal): back to the home page
+        headers['Location'] = '/'
+        self._send('POST /ajax/login/', 302, b'', headers=headers)
+
+    def _page(self, title, logged_in, content):
+        tophead = LOGGED_IN_TOPHEAD if logged_in else LOGGED_OUT_TOPHEAD
+        return (PAGE_HEAD.format(title=title, tophead=tophead) + content + PAGE_FOOT).encode('utf-8')
+
+    def _continue_page(self, page, logged_in):
+        server = self.server
+        rows = server.rows if logged_in else []
+        size = server.config.page_size or max(1, len(rows))
+        page_count = max(1, -(-len(rows) // size))
+        parts = ['<div class="b-container b-content b-wrapper"> <div class="b-content__htitle"> '
+                 '<h1>Продолжить просмотр</h1></div><div class="b-content__inline"> '
+                 '<div id="videosaves-list" class="b-videosaves__list"> ', LIST_HEADER, ' ']
+        base = server.public_url(self.headers.get('Host'))
+        for row in rows[(page - 1) * size:page * size]:
+            parts.append(row.replace('{base}', base))
+        parts.append(' </div></div>')
+        if page < page_count:
+            parts.append(f'<div class="b-navigation"><a href="{base}/continue/page/{page + 1}/">'
+                         '<span class="b-navigation__next i-sprt"></span></a></div>')
+        parts.append('</div>')
+        return self._page('Досмотреть', logged_in, ''.join(parts))
+
+    def _item_page(self, entry, logged_in):
+        etag = f'"item-{entry["ids"]["trakt"]}"'
+        if self.headers.get('If-None-Match') == etag:
+            return self._send('GET /item', 304, b'', headers={'ETag': etag, 'Last-Modified': LAST_MODIFIED})
+
+        imdb_url = f"https://www.imdb.com/title/{entry['ids']['imdb']}/"
+        encoded = base64.b64encode(urllib.parse.quote(imdb_url, safe='').encode('ascii')).decode('ascii')
+        if self.server.js_only(entry):
+            # Rendered by a script, not findable in the raw HTML
+            imdb_link = ('<span class="b-post__info_rates imdb"><a id="imdb-link" target="_blank">IMDb</a>'
+                         f"<script>document.getElementById('imdb-link').href='/he'+'lp/'+'{encoded}'+'/';</script></span>")
+        else:
+            imdb_link = (f'<span class="b-post__info_rates imdb"><a href="/help/{encoded}/" '
+                         'target="_blank" rel="nofollow">IMDb</a></span>')
+        content = (
+            f'<div class="b-post"><div class="b-post__title"><h1 itemprop="name">{html.escape(entry["title"])}</h1></div>'
+            f'<div class="b-post__origtitle" itemprop="alternativeHeadline">{html.escape(entry["title"])}</div>'
+            f'<table class="b-post__info"><tr><td><h2>Рейтинги</h2>:</td><td>{imdb_link}</td></tr>'
+            f'<tr><td><h2>Год</h2>:</td><td>{entry["year"]}</td></tr></table></div>'
+            f'<div id="comments-list">{self.server.filler}</div>'
+        )
+        self._send('GET /item', 200, self._page(entry['title'], logged_in, content),
+                   headers={'ETag': etag, 'Last-Modified': LAST_MODIFIED})
+
+    def _send(self, endpoint, status, data, content_type='text/html; charset=utf-8', headers=None):
+        # Counted before the client can see the response, so a stats read right after is exact
+        if endpoint:
+            self.server.stats.record(endpoint, status, getattr(self, 'request_bytes', 0), len(data))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeRezkaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, catalog=None, progress=None, config=None, seed=1):
+        super().__init__((host, port), RezkaHandler)
+        self.catalog = catalog or make_catalog(seed=seed)
+        self.config = config or FakeRezkaConfig()
+        self.seed = seed
+        self.by_trakt = {entry['ids']['trakt']: entry for entry in self.catalog}
+        self.session_id = hashlib.sha1(str(seed).encode()).hexdigest()[:12]
+        self.stats = Stats()
+        self.filler = FILLER_BLOCK * max(0, self.config.item_kb * 1024 // len(FILLER_BLOCK.encode('utf-8')))
+        # HDRezka is "ahead" of Trakt: every title is on the list, at its own random position
+        if progress is None:
+            progress = make_watch_state(self.catalog, 1.0, seed + 7)
+        self.rows = self._build_rows(progress)
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def public_url(self, host_header):
+        return f"http://{host_header}" if host_header else self.url
+
+    def js_only(self, entry):
+        rate = self.config.js_only_rate
+        return rate > 0 and random.Random(entry['ids']['trakt']).random() < rate
+
+    def item_path(self, entry):
+        section = 'series' if entry['type'] == 'show' else 'films'
+        genre = 'drama' if entry['type'] == 'show' else 'comedy'
+        return f"/{section}/{genre}/{entry['ids']['trakt']}-{entry['ids']['slug']}.html"
+
+    def _build_rows(self, progress):
+        """Pre-rendered rows, newest first. '{base}' is filled in per request (Host header)."""
+        today = datetime.now()
+        rows = []
+        entries = [e for e in self.catalog if e['ids']['imdb'] in progress]
+        for i, entry in enumerate(entries):
+            url = '{base}' + self.item_path(entry)
+            if i == 0:
+                date = 'сегодня'
+            elif i == 1:
+                date = 'вчера'
+            else:
+                date = (today - timedelta(days=i)).strftime('%d-%m-%Y')
+            p = progress[entry['ids']['imdb']]
+            if entry['type'] == 'show' and p:
+                info = SERIES_INFO.format(season=p['season'], episode=p['episode'], url=url,
+                                          left=entry['seasons'][p['season'] - 1] - p['episode'])
+            else:
+                info = 'Дубляж'
+            # Placeholders first, escape only the title
+            rows.append(ROW.format(save_id=10000000 + i, date=date, url=url, base='{base}',
+                                   title=html.escape(entry['title']), year=entry['year'], info=info))
+        return rows
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-body (the streaming scraper does on purpose) aren't errors
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        """Serves in a background thread (for benchmarks); returns self."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake HDRezka mirror for scraper benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--shows', type=int, default=300)
+    parser.add_argument('--movies', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0, help='Added latency per request (ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='Latency jitter (+- ms)')
+    parser.add_argument('--page-size', type=int, default=0, help='Rows per /continue/ page (0 = no pagination)')
+    parser.add_argument('--item-kb', type=int, default=300, help='Approximate item page size (KB)')
+    parser.add_argument('--js-only-rate', type=float, default=0, help='Fraction of items with a JS-rendered IMDb link')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of 503 item pages')
+    parser.add_argument('--username', help='Only accept this login (default: any)')
+    parser.add_argument('--password')
+    args = parser.parse_args()
+
+    config = FakeRezkaConfig(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                             page_size=args.page_size, item_kb=args.item_kb,
+                             js_only_rate=args.js_only_rate, error_rate=args.error_rate,
+                             username=args.username, password=args.password)
+    server = FakeRezkaServer(args.host, args.port, make_catalog(args.shows, args.movies, args.seed),
+                             config=config, seed=args.seed)
+    print(f"Fake HDRezka on {server.url} ({len(server.rows)} rows)")
+    print(f"  HDREZKA_MIRRORS={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
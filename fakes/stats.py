@@ -0,0 +1,31 @@
+import threading
+
+class Stats:
+    """Request counts and bytes per endpoint, served by the fakes at /__stats."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}
+        self.statuses = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, endpoint, status, bytes_in, bytes_out):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'total_requests': sum(self.requests.values()),
+                'statuses': dict(self.statuses),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out
+            }
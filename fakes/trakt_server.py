@@ -0,0 +1,472 @@
+"""
+Local stand-in for api.trakt.tv, for offline load tests and benchmarks.
+
+Implements the endpoints TraktAPI uses, backed by the synthetic catalog, with
+configurable latency, 423/429/5xx injection, a rate limit and pagination.
+
+    python -m fakes.trakt_server --port 8900 --latency 50 --error-rate 0.02 --rate-limit 20
+
+then run the sync against it:
+
+    TRAKT_API_URL=http://127.0.0.1:8900 TRAKT_AUTH_URL=http://127.0.0.1:8900 \
+    TRAKT_TOKEN_FILE=fake_token.json python main.py
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fakes.catalog import make_catalog, make_watch_state
+from fakes.stats import Stats
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class TraktState:
+    """Catalog + watch history of the fake account. All access under self.lock."""
+
+    def __init__(self, catalog, watch_state):
+        self.lock = threading.Lock()
+        self.catalog = catalog
+        self.by_id = {}
+        for entry in catalog:
+            for source, value in entry['ids'].items():
+                if value is not None:
+                    self.by_id[str(value)] = entry
+        # history: list of {'id', 'watched_at', 'imdb', 'season', 'number'} (season None for movies)
+        self.history = []
+        self.next_history_id = 1
+        self.activity_at = time.time()
+        now = time.time()
+        for imdb_id, progress in watch_state.items():
+            entry = self.by_id[imdb_id]
+            for season, number in self._episodes_up_to(entry, progress):
+                self._add(entry, season, number, _iso(now - 86400 * 30))
+
+    def _episodes_up_to(self, entry, progress):
+        if entry['type'] == 'movie':
+            return [(None, None)]
+        eps = []
+        for s, count in enumerate(entry['seasons'], start=1):
+            if s > progress['season']:
+                break
+            last = progress['episode'] if s == progress['season'] else count
+            eps.extend((s, e) for e in range(1, last + 1))
+        return eps
+
+    def _add(self, entry, season, number, watched_at):
+        self.history.append({
+            'id': self.next_history_id,
+            'watched_at': watched_at,
+            'imdb': entry['ids']['imdb'],
+            'season': season,
+            'number': number
+        })
+        self.next_history_id += 1
+        self.activity_at = time.time()
+
+    def lookup(self, ids):
+        for source in ('trakt', 'imdb', 'tmdb', 'tvdb', 'slug'):
+            value = ids.get(source)
+            if value is not None and str(value) in self.by_id:
+                return self.by_id[str(value)]
+        return None
+
+    def summary(self, entry):
+        return {'title': entry['title'], 'year': entry['year'], 'ids': dict(entry['ids'])}
+
+    def watched(self, item_type, with_seasons):
+        grouped = {}
+        for h in self.history:
+            entry = self.by_id[h['imdb']]
+            if entry['type'] == item_type:
+                grouped.setdefault(h['imdb'], []).append(h)
+        result = []
+        for imdb_id, entries in grouped.items():
+            entry = self.by_id[imdb_id]
+            last = max(h['watched_at'] for h in entries)
+            item = {
+                'plays': len(entries),
+                'last_watched_at': last,
+                'last_updated_at': last,
+                item_type: self.summary(entry)
+            }
+            if item_type == 'show' and with_seasons:
+                seasons = {}
+                for h in entries:
+                    eps = seasons.setdefault(h['season'], {})
+                    prev = eps.get(h['number'])
+                    if prev is None or h['watched_at'] > prev['last_watched_at']:
+                        eps[h['number']] = {'number': h['number'], 'plays': 1, 'last_watched_at': h['watched_at']}
+                item['seasons'] = [
+                    {'number': s, 'episodes': [eps[n] for n in sorted(eps)]}
+                    for s, eps in sorted(seasons.items())
+                ]
+            result.append(item)
+        return result
+
+    def progress(self, entry):
+        watched = {}
+        for h in self.history:
+            if h['imdb'] == entry['ids']['imdb']:
+                key = (h['season'], h['number'])
+                if key not in watched or h['watched_at'] > watched[key]:
+                    watched[key] = h['watched_at']
+        seasons = []
+        for s, count in enumerate(entry['seasons'], start=1):
+            episodes = [{
+                'number': e,
+                'completed': (s, e) in watched,
+                'last_watched_at': watched.get((s, e))
+            } for e in range(1, count + 1)]
+            seasons.append({'number': s, 'episodes': episodes})
+        return {'seasons': seasons}
+
+    def history_for(self, entry):
+        result = []
+        for h in sorted(self.history, key=lambda x: x['watched_at'], reverse=True):
+            if h['imdb'] != entry['ids']['imdb']:
+                continue
+            row = {'id': h['id'], 'watched_at': h['watched_at'], 'action': 'watch', 'type': entry['type']}
+            if entry['type'] == 'show':
+                row['type'] = 'episode'
+                row['show'] = self.summary(entry)
+                ep_ids = {'trakt': entry['ids']['trakt'] * 10000 + h['season'] * 100 + h['number']}
+                row['episode'] = {'season': h['season'], 'number': h['number'], 'ids': ep_ids}
+            else:
+                row['movie'] = self.summary(entry)
+            result.append(row)
+        return result
+
+    def apply_add(self, payload):
+        added = {'movies': 0, 'episodes': 0}
+        not_found = {'movies': [], 'shows': [], 'episodes': []}
+        now = _iso(time.time())
+        for obj in payload.get('movies', []):
+            entry = self.lookup(obj.get('ids', {}))
+            if not entry or entry['type'] != 'movie':
+                not_found['movies'].append(obj)
+                continue
+            self._add(entry, None, None, obj.get('watched_at', now))
+            added['movies'] += 1
+        for obj in payload.get('shows', []):
+            entry = self.lookup(obj.get('ids', {}))
+            if not entry or entry['type'] != 'show':
+                not_found['shows'].append(obj)
+                continue
+            show_at = obj.get('watched_at', now)
+            seasons = obj.get('seasons')
+            if not seasons:
+                seasons = [{'number': s} for s in range(1, len(entry['seasons']) + 1)]
+            for season in seasons:
+                s = season.get('number')
+                if not s or s > len(entry['seasons']):
+                    not_found['episodes'].append(season)
+                    continue
+                season_at = season.get('watched_at', show_at)
+                episodes = season.get('episodes') or [{'number': e} for e in range(1, entry['seasons'][s - 1] + 1)]
+                for ep in episodes:
+                    if ep.get('number', 0) > entry['seasons'][s - 1]:
+                        not_found['episodes'].append(ep)
+                        continue
+                    self._add(entry, s, ep['number'], ep.get('watched_at', season_at))
+                    added['episodes'] += 1
+        # Bare episode objects (by episode trakt id, as produced by history_for)
+        for obj in payload.get('episodes', []):
+            not_found['episodes'].append(obj)
+        return {'added': added, 'not_found': not_found}
+
+    def apply_remove(self, payload):
+        deleted = {'movies': 0, 'episodes': 0}
+        not_found = {'movies': [], 'shows': [], 'episodes': [], 'ids': []}
+        remove_ids = set(payload.get('ids', []))
+        found_ids = set()
+        targets = []
+        for kind in ('movies', 'shows'):
+            for obj in payload.get(kind, []):
+                entry = self.lookup(obj.get('ids', {}))
+                if not entry:
+                    not_found[kind].append(obj)
+                    continue
+                seasons = obj.get('seasons')
+                if seasons:
+                    for season in seasons:
+                        for ep in season.get('episodes') or []:
+                            targets.append((entry['ids']['imdb'], season['number'], ep['number']))
+                        if not season.get('episodes'):
+                            targets.append((entry['ids']['imdb'], season['number'], None))
+                else:
+                    targets.append((entry['ids']['imdb'], None, None))
+
+        kept = []
+        for h in self.history:
+            hit = h['id'] in remove_ids
+            if hit:
+                found_ids.add(h['id'])
+            for imdb_id, season, number in targets:
+                if h['imdb'] == imdb_id and season in (None, h['season']) and number in (None, h['number']):
+                    hit = True
+            if hit:
+                deleted['episodes' if h['season'] is not None else 'movies'] += 1
+            else:
+                kept.append(h)
+        self.history = kept
+        not_found['ids'] = sorted(remove_ids - found_ids)
+        self.activity_at = time.time()
+        return {'deleted': deleted, 'not_found': not_found}
+
+
+class FaultConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, lock_rate=0.0,
+                 rate_limit=0, token_ttl=86400, page_limit=100):
+        self.latency = latency          # seconds added to every response
+        self.jitter = jitter            # +- uniform seconds
+        self.error_rate = error_rate    # fraction answered with 500/502/503
+        self.lock_rate = lock_rate      # fraction answered with 423
+        self.rate_limit = rate_limit    # requests per second (0 = unlimited), 429 above
+        self.token_ttl = token_ttl      # expires_in for issued tokens
+        self.page_limit = page_limit    # default page size for paginated endpoints
+
+
+class TraktHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass # Quiet, /__stats has the numbers
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        server = self.server
+        parsed = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        endpoint = re.sub(r'/(tt\d+|\d+|[a-z0-9-]+-\d+)(?=/|$)', '/:id', parsed.path)
+
+        if parsed.path.startswith('/__'):
+            return self._control(parsed.path, endpoint, body)
+
+        faults = server.faults
+        delay = faults.latency + (random.uniform(-faults.jitter, faults.jitter) if faults.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if not parsed.path.startswith('/oauth/'):
+            if faults.rate_limit and not server.take_rate_token():
+                return self._send(endpoint, 429, {'error': 'rate limited'}, body, {'Retry-After': '1'})
+            if faults.lock_rate and random.random() < faults.lock_rate:
+                return self._send(endpoint, 423, {'error': 'locked'}, body)
+            if faults.error_rate and random.random() < faults.error_rate:
+                return self._send(endpoint, random.choice((500, 502, 503)), {'error': 'injected'}, body)
+            if not server.valid_token(self.headers.get('Authorization', '')):
+                return self._send(endpoint, 401, {'error': 'invalid_token'}, body)
+
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return self._send(endpoint, 400, {'error': 'bad json'}, body)
+
+        status, data, headers = self._route(method, parsed.path, query, payload)
+        self._send(endpoint, status, data, body, headers)
+
+    def _route(self, method, path, query, payload):
+        server = self.server
+        state = server.state
+
+        if method == 'GET' and path == '/oauth/authorize':
+            # Browser flow: bounce straight back with a code
+            target = query.get('redirect_uri', '') + '?code=fake-code'
+            return 302, None, {'Location': target}
+        if method == 'POST' and path == '/oauth/token':
+            return 200, server.issue_token(), {}
+
+        with state.lock:
+            if method == 'GET' and path.startswith('/search/imdb/'):
+                entry = state.by_id.get(path.rsplit('/', 1)[1])
+                if not entry:
+                    return 200, [], {}
+                return 200, [{'type': entry['type'], 'score': 1000, entry['type']: state.summary(entry)}], {}
+
+            if method == 'GET' and path == '/sync/watched/shows':
+                with_seasons = query.get('extended') != 'noseasons'
+                return 200, state.watched('show', with_seasons), {}
+            if method == 'GET' and path == '/sync/watched/movies':
+                return 200, state.watched('movie', False), {}
+
+            match = re.match(r'^/shows/([^/]+)/progress/watched$', path)
+            if method == 'GET' and match:
+                entry = state.by_id.get(match.group(1))
+                if not entry or entry['type'] != 'show':
+                    return 404, {'error': 'not found'}, {}
+                return 200, state.progress(entry), {}
+
+            match = re.match(r'^/sync/history/(shows|movies)/([^/]+)$', path)
+            if method == 'GET' and match:
+                entry = state.by_id.get(match.group(2))
+                rows = state.history_for(entry) if entry else []
+                return self._paginate(rows, query)
+
+            if method == 'POST' and path == '/sync/history':
+                return 201, state.apply_add(payload), {}
+            if method == 'POST' and path == '/sync/history/remove':
+                return 200, state.apply_remove(payload), {}
+
+            if method == 'GET' and path == '/sync/last_activities':
+                at = _iso(state.activity_at)
+                return 200, {'all': at, 'episodes': {'watched_at': at}, 'movies': {'watched_at': at}}, {}
+
+        return 404, {'error': 'not found'}, {}
+
+    def _paginate(self, rows, query):
+        limit = int(query.get('limit', self.server.faults.page_limit))
+        page = int(query.get('page', 1))
+        page_count = max(1, -(-len(rows) // limit))
+        headers = {
+            'X-Pagination-Page': str(page),
+            'X-Pagination-Limit': str(limit),
+            'X-Pagination-Page-Count': str(page_count),
+            'X-Pagination-Item-Count': str(len(rows))
+        }
+        return 200, rows[(page - 1) * limit:page * limit], headers
+
+    def _control(self, path, endpoint, body):
+        if path == '/__stats':
+            return self._send(None, 200, self.server.stats.snapshot(), body)
+        if path == '/__reset_stats':
+            self.server.stats.reset()
+            return self._send(None, 200, {'ok': True}, body)
+        if path == '/__expire_tokens':
+            self.server.tokens.clear()
+            return self._send(None, 200, {'ok': True}, body)
+        return self._send(None, 404, {'error': 'not found'}, body)
+
+    def _send(self, endpoint, status, data, request_body=b'', headers=None):
+        out = json.dumps(data).encode('utf-8') if data is not None else b''
+        # Counted before the client can see the response, so a stats read right after is exact
+        if endpoint:
+            self.server.stats.record(f"{self.command} {endpoint}", status, len(request_body), len(out))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(out)
+
+
+class FakeTraktServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, catalog=None, watch_state=None, faults=None):
+        super().__init__((host, port), TraktHandler)
+        catalog = catalog or make_catalog()
+        if watch_state is None:
+            watch_state = make_watch_state(catalog)
+        self.state = TraktState(catalog, watch_state)
+        self.faults = faults or FaultConfig()
+        self.stats = Stats()
+        self.tokens = {}
+        self.token_lock = threading.Lock()
+        self.rate_tokens = float(self.faults.rate_limit)
+        self.rate_at = time.monotonic()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def issue_token(self):
+        token = f"fake-{random.getrandbits(64):x}"
+        with self.token_lock:
+            self.tokens[token] = time.time() + self.faults.token_ttl
+        return {
+            'access_token': token,
+            'refresh_token': f"fake-refresh-{random.getrandbits(64):x}",
+            'token_type': 'bearer',
+            'expires_in': self.faults.token_ttl,
+            'scope': 'public',
+            'created_at': int(time.time())
+        }
+
+    def valid_token(self, header):
+        token = header.replace('Bearer ', '', 1)
+        with self.token_lock:
+            expires = self.tokens.get(token)
+        return expires is not None and expires > time.time()
+
+    def take_rate_token(self):
+        """Token bucket refilled at rate_limit per second."""
+        with self.token_lock:
+            now = time.monotonic()
+            limit = self.faults.rate_limit
+            self.rate_tokens = min(limit, self.rate_tokens + (now - self.rate_at) * limit)
+            self.rate_at = now
+            if self.rate_tokens >= 1:
+                self.rate_tokens -= 1
+                return True
+            return False
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-body (the streaming scraper does on purpose) aren't errors
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        """Serves in a background thread (for benchmarks); returns self."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Trakt API for offline load tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--shows', type=int, default=300)
+    parser.add_argument('--movies', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--watched-fraction', type=float, default=0.5)
+    parser.add_argument('--latency', type=float, default=0, help='Added latency per request (ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='Latency jitter (+- ms)')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of 500/502/503 responses')
+    parser.add_argument('--lock-rate', type=float, default=0, help='Fraction of 423 responses')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Requests per second before 429 (0 = off)')
+    parser.add_argument('--token-ttl', type=int, default=86400, help='expires_in of issued tokens (s)')
+    parser.add_argument('--page-limit', type=int, default=100, help='Default page size for history')
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.shows, args.movies, args.seed)
+    faults = FaultConfig(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                         error_rate=args.error_rate, lock_rate=args.lock_rate,
+                         rate_limit=args.rate_limit, token_ttl=args.token_ttl,
+                         page_limit=args.page_limit)
+    server = FakeTraktServer(args.host, args.port, catalog,
+                             make_watch_state(catalog, args.watched_fraction, args.seed), faults)
+    print(f"Fake Trakt API on {server.url} ({len(catalog)} titles)")
+    print(f"  TRAKT_API_URL={server.url} TRAKT_AUTH_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -2,52 +2,195 @@
 import sys
 import threading
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                               QHBoxLayout, QPushButton, QTextEdit, QTableWidget, 
-                               QTableWidgetItem, QHeaderView, QTabWidget, QMenu,
-                               QLabel, QLineEdit, QMessageBox, QComboBox)
-from PySide6.QtCore import Qt, Signal, QObject, Slot, QThread, QTimer
-from PySide6.QtGui import QAction, QTextCursor
+                               QHBoxLayout, QPushButton, QPlainTextEdit, QTableView, 
+                               QStyledItemDelegate, QHeaderView, QTabWidget, QMenu,
+                               QLabel, QLineEdit, QMessageBox, QComboBox, QCheckBox,
+                               QProgressBar)
+from PySide6.QtCore import (Qt, Signal, QObject, Slot, QThread, QTimer,
+                            QAbstractTableModel, QModelIndex)
+from PySide6.QtGui import QAction
 
 import main
 from utils.cache import Cache
+from utils.log import setup_logging
+from utils import events as sync_events
 
+import logging
 import queue
 
+logger = logging.getLogger(__name__)
+
+# Cache Manager rows handed to the view per fetchMore
+FETCH_BATCH = 500
+
+# Log pane: lines kept, records appended per timer tick
+LOG_MAX_LINES = 5000
+LOG_BATCH = 500
+
 # Global Queue for logs
 log_queue = queue.Queue()
 
 class LogRedirector:
+    # stdout only carries the tqdm bars (shown as progress bars from the sync events
+    # instead) and stray prints; the log file is written by the logging listener
     def write(self, text):
+        if '\r' in text or not text.strip():
+            return
         log_queue.put(text)
-        try:
-            with open("sync_log.txt", "a", encoding="utf-8") as f:
-                f.write(text)
-        except Exception:
-            pass
 
     def flush(self):
         pass
 
+class GuiLogHandler(logging.Handler):
+    """Hands formatted records to the log pane (runs on the logging listener thread)."""
+    def emit(self, record):
+        log_queue.put(self.format(record) + "\n")
+
 class SyncWorker(QThread):
     finished_signal = Signal()
     
-    def __init__(self, resync=False):
+    def __init__(self, resync=False, profile=False, events=None):
         super().__init__()
         self.resync = resync
+        self.profile = profile
+        self.events = events
 
     def run(self):
         try:
-            main.start(resync=self.resync)
+            main.start(resync=self.resync, profile=self.profile, events=self.events)
         except Exception as e:
-            print(f"Error in sync: {e}")
+            logger.exception("Error in sync: %s", e)
         finally:
             self.finished_signal.emit()
 
+class CacheTableModel(QAbstractTableModel):
+    """
+    Table over the Cache singleton. Only the (filtered) keys are held, cells are
+    read from the cache when the view paints them, and rows are handed to the
+    view FETCH_BATCH at a time as it scrolls (canFetchMore/fetchMore).
+    """
+    COLUMNS = ["Key/URL", "ID", "Status", "Raw Data"]
+    STATUS_COLUMN = 2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = None # Set by the first load, Cache() reads cache.json
+        self.keys = []
+        self.loaded = 0
+
+    def set_keys(self, keys):
+        self.beginResetModel()
+        self.keys = keys
+        self.loaded = min(FETCH_BATCH, len(keys))
+        self.endResetModel()
+
+    def key_at(self, row):
+        return self.keys[row]
+
+    def row_changed(self, row):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.keys)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH, len(self.keys) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        key = self.keys[index.row()]
+        column = index.column()
+        if column == 0:
+            return key
+        entry = self.cache.get_entry(key)
+        if column == 3:
+            return str(entry)
+        if isinstance(entry, dict):
+            imdb_id, status = entry.get('id') or "", entry.get('status') or ""
+        else:
+            imdb_id, status = str(entry) if entry else "", ""
+        return imdb_id if column == 1 else str(status)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == self.STATUS_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != self.STATUS_COLUMN:
+            return False
+        self.cache.set_status(self.keys[index.row()], value or "")
+        self.row_changed(index.row())
+        return True
+
+class StatusDelegate(QStyledItemDelegate):
+    """Status combo box, created only while a cell is being edited."""
+    STATUSES = ["", "ignored", "completed"]
+
+    def createEditor(self, parent, option, index):
+        combo = QComboBox(parent)
+        combo.addItems(self.STATUSES)
+        # Commit as soon as a value is picked, like the old per-row combos
+        combo.activated.connect(lambda: (self.commitData.emit(combo), self.closeEditor.emit(combo)))
+        return combo
+
+    def setEditorData(self, editor, index):
+        status = index.data(Qt.EditRole) or ""
+        if editor.findText(status) < 0:
+            editor.addItem(status) # e.g. 'active'
+        editor.setCurrentText(status)
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), Qt.EditRole)
+
+class CacheLoader(QThread):
+    """
+    Loads (first use of the Cache singleton reads cache.json; reload=True re-reads
+    it) and filters the cache keys off the GUI thread. The first load also builds
+    the cache's search index, later filters are index lookups.
+    """
+    loaded = Signal(list)
+
+    def __init__(self, reload=False, text=""):
+        super().__init__()
+        self.reload = reload
+        self.text = text.lower()
+
+    def run(self):
+        cache = Cache()
+        if self.reload:
+            cache.reload()
+        matched = cache.search(self.text)
+        # Keep the cache's order
+        keys = [key for key in cache.get_all_items() if key in matched]
+        self.loaded.emit(keys)
+
 class CacheManagerTab(QWidget):
-# ... (Keep CacheManagerTab as is)    
     def __init__(self):
         super().__init__()
-        self.cache = Cache()
+        self.cache = None
+        self.loader = None
+        self.pending_reload = None # Load requested while one was running
         self.layout = QVBoxLayout(self)
         
         # Search Bar
@@ -57,81 +200,61 @@ class CacheManagerTab(QWidget):
         
         # Debounce Timer
         self.search_timer = QTimer()
-        self.search_timer.setInterval(300)
+        self.search_timer.setInterval(100)
         self.search_timer.setSingleShot(True)
         self.search_timer.timeout.connect(self.perform_filter)
         
         self.search_input.textChanged.connect(lambda: self.search_timer.start())
         search_layout.addWidget(self.search_input)
+        self.count_label = QLabel("")
+        search_layout.addWidget(self.count_label)
         self.layout.addLayout(search_layout)
 
         # Table
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Key/URL", "ID", "Status", "Raw Data"])
+        self.model = CacheTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setItemDelegateForColumn(CacheTableModel.STATUS_COLUMN, StatusDelegate(self.table))
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
         self.table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.show_context_menu)
         self.layout.addWidget(self.table)
         
         self.refresh_btn = QPushButton("Refresh")
-        self.refresh_btn.clicked.connect(self.load_data)
+        self.refresh_btn.clicked.connect(lambda: self.load_data(reload=True))
         self.layout.addWidget(self.refresh_btn)
 
         self.load_data()
 
-    def load_data(self):
-        self.table.setRowCount(0)
-        # Re-instantiate to get fresh data from disk
-        self.cache = Cache()
-        items = self.cache.get_all_items()
-        
-        for url, data in items.items():
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            
-            # Data parsing
-            imdb_id = ""
-            status = ""
-            if isinstance(data, dict):
-                imdb_id = data.get('id', '')
-                status = data.get('status', '')
-            else:
-                imdb_id = str(data)
-                
-            self.table.setItem(row, 0, QTableWidgetItem(url))
-            self.table.setItem(row, 1, QTableWidgetItem(imdb_id))
-            
-            # Status ComboBox
-            combo = QComboBox()
-            combo.addItems(["", "ignored", "completed"])
-            combo.setCurrentText(str(status) if status else "")
-            # Using lambda to capture url. Need default arg for late binding fix.
-            combo.currentTextChanged.connect(lambda text, u=url: self.update_status_from_combo(u, text))
-            self.table.setCellWidget(row, 2, combo)
-            
-            self.table.setItem(row, 3, QTableWidgetItem(str(data)))
+    def load_data(self, reload=False):
+        """
+        Rebuilds the key list in the background. The Cache singleton is shared with
+        the sync, so it is current already; reload=True re-reads cache.json for
+        changes made by another process.
+        """
+        if self.loader and self.loader.isRunning():
+            self.pending_reload = bool(self.pending_reload) or reload
+            return
+        self.count_label.setText("Loading...")
+        self.loader = CacheLoader(reload, self.search_input.text())
+        self.loader.loaded.connect(self.on_loaded)
+        self.loader.finished.connect(self.on_loader_finished)
+        self.loader.start()
+
+    def on_loaded(self, keys):
+        self.cache = self.model.cache = Cache() # Loaded by now
+        self.model.set_keys(keys)
+        self.count_label.setText(f"{len(keys)} entries")
 
-    def update_status_from_combo(self, url, text):
-        # Convert "" back to None for logic or keep ""? Cache handles "" as valid status?
-        # main.py checks == 'ignored' or 'completed'. "" is fine.
-        val = text if text else ""
-        self.cache.set_status(url, val)
-        # No need to popup success for every combo change.
+    def on_loader_finished(self):
+        if self.pending_reload is not None:
+            reload, self.pending_reload = self.pending_reload, None
+            self.load_data(reload)
 
     def perform_filter(self):
-        text = self.search_input.text().lower()
-        self.table.setUpdatesEnabled(False)
-        for i in range(self.table.rowCount()):
-            match = False
-            for j in range(self.table.columnCount()):
-                item = self.table.item(i, j)
-                if item and text in item.text().lower():
-                    match = True
-                    break
-            self.table.setRowHidden(i, not match)
-        self.table.setUpdatesEnabled(True)
+        self.load_data()
 
     def show_context_menu(self, pos):
         menu = QMenu()
@@ -150,23 +273,14 @@ class CacheManagerTab(QWidget):
         menu.exec_(self.table.viewport().mapToGlobal(pos))
 
     def set_status(self, status):
-        rows = set(index.row() for index in self.table.selectedIndexes())
+        rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
         if not rows:
             return
             
-        for row in rows:
-            url_item = self.table.item(row, 0)
-            if not url_item: continue
-            url = url_item.text()
-            
-            # Update Cache
-            if status is None:
-                self.cache.set_status(url, '')
-            else:
-                self.cache.set_status(url, status)
-                
-            # Update UI
-            self.table.setItem(row, 2, QTableWidgetItem(str(status) if status else ""))
+        # One cache write for the whole selection
+        self.cache.set_status_many([self.model.key_at(row) for row in rows], status or '')
+        self.model.dataChanged.emit(self.model.index(rows[0], 0),
+                                    self.model.index(rows[-1], len(CacheTableModel.COLUMNS) - 1))
             
         QMessageBox.information(self, "Success", f"Updated {len(rows)} items.")
 
@@ -193,12 +307,31 @@ class MainWindow(QMainWindow):
         self.btn_resync.setStyleSheet("background-color: #ffcccc;")
         self.btn_resync.clicked.connect(self.force_resync)
         btn_layout.addWidget(self.btn_resync)
+
+        self.chk_profile = QCheckBox("Profile")
+        self.chk_profile.setToolTip("Profile each phase and write reports to profile/")
+        btn_layout.addWidget(self.chk_profile)
         
         self.sync_layout.addLayout(btn_layout)
+
+        # Progress (from the sync's events)
+        self.phase_label = QLabel("Idle")
+        self.sync_layout.addWidget(self.phase_label)
+        self.overall_bar = QProgressBar()
+        self.overall_bar.setRange(0, len(sync_events.PHASES))
+        self.overall_bar.setFormat("Phase %v/%m")
+        self.sync_layout.addWidget(self.overall_bar)
+        self.phase_bar = QProgressBar()
+        self.phase_bar.setRange(0, 1)
+        self.phase_bar.setValue(0)
+        self.sync_layout.addWidget(self.phase_bar)
+        self.counts_label = QLabel("")
+        self.sync_layout.addWidget(self.counts_label)
         
-        # Log Output
-        self.log_text = QTextEdit()
+        # Log Output, capped so long syncs don't grow memory
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_MAX_LINES)
         self.log_text.setStyleSheet("background-color: black; color: white; font-family: Consolas;")
         self.sync_layout.addWidget(self.log_text)
         
@@ -217,19 +350,55 @@ class MainWindow(QMainWindow):
         self.log_timer = QTimer()
         self.log_timer.setInterval(100) # Check every 100ms
         self.log_timer.timeout.connect(self.process_logs)
+        self.log_timer.timeout.connect(self.process_events)
         self.log_timer.start()
 
+        self.events = sync_events.EventBus()
+        self.event_queue = self.events.subscribe()
         self.worker = None
 
     def process_logs(self):
-        while not log_queue.empty():
+        # One append per tick, at most LOG_BATCH records, the rest waits for the next
+        chunks = []
+        while len(chunks) < LOG_BATCH:
             try:
-                text = log_queue.get_nowait()
-                self.log_text.moveCursor(QTextCursor.End)
-                self.log_text.insertPlainText(text)
-                self.log_text.ensureCursorVisible()
+                chunks.append(log_queue.get_nowait())
             except queue.Empty:
                 break
+        if chunks:
+            self.log_text.appendPlainText("".join(chunks).rstrip("\n"))
+
+    def process_events(self):
+        progress = None # Only the latest tick is drawn
+        while True:
+            try:
+                event = self.event_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event.kind == sync_events.PHASE_STARTED:
+                progress = None
+                self.phase_label.setText(f"Phase: {event.phase}")
+                if event.phase in sync_events.PHASES:
+                    self.overall_bar.setValue(sync_events.PHASES.index(event.phase))
+                self.phase_bar.setRange(0, 0) # Busy until the first progress event
+                self.phase_bar.setFormat("")
+            elif event.kind == sync_events.PROGRESS:
+                progress = event
+            elif event.kind == sync_events.COUNTS:
+                self.counts_label.setText(", ".join(f"{k.replace('_', ' ')}: {v}" for k, v in event.data.items()))
+            elif event.kind == sync_events.SYNC_FINISHED:
+                progress = None
+                self.overall_bar.setValue(self.overall_bar.maximum())
+                self.phase_bar.setRange(0, 1)
+                self.phase_bar.setValue(1)
+                self.phase_bar.setFormat("Done" if event.data.get('ok') else "Aborted")
+                self.phase_label.setText("Finished" if event.data.get('ok') else "Aborted")
+
+        if progress and progress.total:
+            self.phase_bar.setRange(0, progress.total)
+            self.phase_bar.setValue(progress.done)
+            eta = f", ETA {progress.eta:.0f}s" if progress.eta is not None else ""
+            self.phase_bar.setFormat(f"%v/%m (%p%){eta}")
 
     def start_sync(self):
         self.run_worker(resync=False)
@@ -249,8 +418,10 @@ class MainWindow(QMainWindow):
         self.btn_start.setEnabled(False)
         self.btn_resync.setEnabled(False)
         self.log_text.clear()
+        self.counts_label.setText("")
+        self.overall_bar.setValue(0)
         
-        self.worker = SyncWorker(resync)
+        self.worker = SyncWorker(resync, profile=self.chk_profile.isChecked(), events=self.events)
         self.worker.finished_signal.connect(self.on_worker_finished)
         self.worker.start()
 
@@ -262,10 +433,8 @@ class MainWindow(QMainWindow):
         self.cache_tab.load_data()
 
 def main_gui():
-    # Clear log file on startup
-    with open("sync_log.txt", "w", encoding="utf-8") as f:
-        f.write("")
-        
+    setup_logging(console=False, handlers=[GuiLogHandler()])
+
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
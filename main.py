@@ -1,24 +1,52 @@
+import json
+import logging
+import math
 import os
+import signal
+import sys
+import threading
+import time
 import argparse
 from dotenv import load_dotenv
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from datetime import datetime
-from services.trakt_api import TraktAPI
-from services.hdrezka import HDRezkaScraper
 
+# Before the service imports, they read TRAKT_API_URL etc. at import time
 load_dotenv()
 
+from services.trakt_api import TraktAPI, build_episodes_payload
+from services.hdrezka import HDRezkaScraper
+from utils.id_index import IdIndex
+from utils.cache import Cache, cache_key
+from utils.cassette import Cassette, RECORD, REPLAY
+from utils.transport import transport
+from utils.profiling import Profiler
+from utils.metrics import metrics
+from utils.log import setup_logging, LOG_LEVEL
+from utils.events import EventBus
+from utils.auth_server import ControlServer, CONTROL_PORT
+from utils.scheduler import Scheduler, format_delay, DEFAULT_INTERVAL, DEFAULT_JITTER, MAX_BACKOFF_SECONDS
+
+logger = logging.getLogger(__name__)
+
 TRAKT_CLIENT_ID = os.getenv('TRAKT_CLIENT_ID')
 TRAKT_CLIENT_SECRET = os.getenv('TRAKT_CLIENT_SECRET')
 
 HDREZKA_USERNAME = os.getenv('HDREZKA_USERNAME')
 HDREZKA_PASSWORD = os.getenv('HDREZKA_PASSWORD')
 
-def process_id_resolution(item, scraper, trakt):
+# Pauses for Trakt to settle (removals before re-adding, history before verifying)
+REMOVAL_SETTLE_SECONDS = 5
+PROPAGATION_WAIT_SECONDS = 5
+# Single-title verification re-checks this often within PROPAGATION_WAIT_SECONDS
+VERIFY_POLL_SECONDS = 0.5
+
+def process_id_resolution(item, scraper, trakt, id_index=None):
     """
     Phase 1: Just get the IMDB ID and Metadata.
+    id_index (IdIndex of the Trakt watched payloads) is checked before searching Trakt.
     Returns: (imdb_id, type_hint, status, title, progress)
     """
     url = item['url']
@@ -48,8 +76,13 @@ def process_id_resolution(item, scraper, trakt):
         if imdb_id:
             # 3. Fetch Trakt Metadata for this ID
             # This is critical to know if it's movie or show
-            # We use the search endpoint
-            trakt_result = trakt.search_by_imdb(imdb_id)
+            # Anything the account has watched is already in the watched payload,
+            # only never-watched titles need the search endpoint
+            trakt_result = id_index.lookup('imdb', imdb_id) if id_index else None
+            if trakt_result:
+                status += " -> Local"
+            else:
+                trakt_result = trakt.search_by_imdb(imdb_id)
             if trakt_result:
                  # result is like { 'type': 'movie', 'movie': {...}, 'score': ... }
                  item_type = trakt_result.get('type')
@@ -61,8 +94,6 @@ def process_id_resolution(item, scraper, trakt):
                  
                  scraper.cache.set_trakt_data(url, save_data)
                  status += " -> Trakt Resolved"
-                 if imdb_id == 'tt0118401':
-                     print(f"[DEBUG-TRACE] Processed tt0118401 from {url}")
                  # print(f"[DEBUG] Trakt Lookup Success: {url} -> {item_type}")
             else:
                  status += " -> Trakt Lookup Failed"
@@ -164,94 +195,44 @@ def deduplicate_item(trakt, imdb_id, itype='shows', dry_run=False):
                 ids_to_remove.append(d['id'])
                 
     if ids_to_remove:
-        print(f"   [Dedupe] {imdb_id}: Removing {len(ids_to_remove)} duplicate entries.")
-        trakt.remove_history_ids(ids_to_remove)
-
-def deduplicate_item(trakt, imdb_id, itype='shows'):
-    # Fetch history
-    history = trakt.get_history(imdb_id, type=itype)
-    if not history:
-        return
-
-    # Group by Unique Key (Season/Ep for shows, ID for movies)
-    groups = {}
-    for entry in history:
-        hid = entry['id']
-        watched_at = entry['watched_at']
-        
-        key = None
-        if itype == 'shows':
-            s = entry.get('episode', {}).get('season')
-            e = entry.get('episode', {}).get('number')
-            if s is not None and e is not None:
-                key = (s, e)
-        else:
-             # For movies, just one entry allowed
-             key = 'movie'
-             
-        if key:
-            if key not in groups:
-                groups[key] = []
-            groups[key].append({'id': hid, 'date': watched_at})
-
-    # Find duplicates
-    ids_to_remove = []
-    
-    for key, entries in groups.items():
-        if len(entries) > 1:
-            # Sort by date (Oldest first)
-            entries.sort(key=lambda x: x['date'])
-            
-            # Keep the OLDEST (index 0) and remove the rest
-            duplicates = entries[1:]
-            for d in duplicates:
-                ids_to_remove.append(d['id'])
-                
-    if ids_to_remove:
-        print(f"   [Dedupe] {imdb_id}: Removing {len(ids_to_remove)} duplicate entries.")
+        logger.info("   [Dedupe] %s: Removing %s duplicate entries.", imdb_id, len(ids_to_remove))
         if not dry_run:
             trakt.remove_history_ids(ids_to_remove)
         else:
-            print(f"   [Dry Run] Would remove {len(ids_to_remove)} IDs.")
+            logger.info("   [Dry Run] Would remove %s IDs.", len(ids_to_remove))
 
-def flatten_show_history(trakt, imdb_id, target_date_str):
+def flatten_show_history(trakt, imdb_id, target_date_str, dry_run=False):
     """
     Fetches ALL watched episodes for a show, wipes history, 
     and re-adds them all with the specific target_date.
     Preserves 'Watched' status while fixing dates.
     """
-    print(f"   [Flatten] Fetching full history for {imdb_id}...")
+    logger.info("   [Flatten] Fetching full history for %s...", imdb_id)
     history = trakt.get_history(imdb_id, type='shows', limit=10000)
     if not history:
-        print("   [Flatten] No history found to flatten.")
+        logger.warning("   [Flatten] No history found to flatten.")
         return
 
-    # Extract unique episodes
-    # Use Trakt ID for precision
-    # Item structure: {'id': 123, 'episode': {'ids': {'trakt': ...}}}
-    unique_eps = {}
+    # Extract unique episodes as (season, number)
+    unique_eps = set()
     for h in history:
         ep_data = h.get('episode')
         if not ep_data: continue
         
-        t_id = ep_data.get('ids', {}).get('trakt')
-        if t_id and t_id not in unique_eps:
-            unique_eps[t_id] = ep_data['ids']
+        if ep_data.get('season') is not None and ep_data.get('number') is not None:
+            unique_eps.add((ep_data['season'], ep_data['number']))
             
-    print(f"   [Flatten] Found {len(unique_eps)} unique episodes. Wiping and re-adding with date {target_date_str}...")
+    logger.info("   [Flatten] Found %s unique episodes. Wiping and re-adding with date %s...", len(unique_eps), target_date_str)
     
     # 1. Wipe
     # We use the generic wipe payload (by IMDB ID of show) to clear everything quickly
     # Must provide 'type' and 'wipe' to remove_from_history_batch
-    trakt.remove_from_history_batch([
-        {'imdb_id': imdb_id, 'type': 'show', 'wipe': True}
-    ])
+    if not dry_run:
+        trakt.remove_from_history_batch([
+            {'imdb_id': imdb_id, 'type': 'show', 'wipe': True}
+        ])
     
     # 2. Re-Add Batch
-    # Construct items. 
-    # API limit per request? Trakt is lenient, but maybe split if huge?
-    # Let's try one batch.
-    items = []
     # format date to ISO? 'watched_at' expects ISO 8601.
     # target_date_str is DD-MM-YYYY.
     # Convert to ISO.
@@ -260,37 +241,37 @@ def flatten_show_history(trakt, imdb_id, target_date_str):
         dt = datetime.strptime(target_date_str, "%d-%m-%Y")
         iso_date = dt.strftime("%Y-%m-%dT12:00:00.000Z")
     except:
-        print(f"   [Flatten] Invalid date format {target_date_str}, using NOW.")
+        logger.warning("   [Flatten] Invalid date format %s, using NOW.", target_date_str)
         iso_date = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z")
         
-    for ids in unique_eps.values():
-        items.append({
-            "ids": ids,
-            "watched_at": iso_date
-        })
-        
-    # Send
-    # We don't have a batch add method exposed cleanly that takes raw items?
-    # trakt.add_to_history takes "item" which is {movie:..., show:...}
-    # We need to construct a "episodes": [...] payload.
-    # Send
-    payload = {"episodes": items}
-    url = f"https://api.trakt.tv/sync/history"
+    # One show object without a date, one season object per season carrying the
+    # shared date, bare episode numbers inside (build_episodes_payload)
+    payload = build_episodes_payload({"imdb": imdb_id}, unique_eps, iso_date)
     try:
         if not dry_run:
-            trakt._post(url, payload)
-            print(f"   [Flatten] Successfully re-added {len(items)} episodes.")
+            trakt._post_history(payload)
+            logger.info("   [Flatten] Successfully re-added %s episodes.", len(unique_eps))
         else:
-             print(f"   [Dry Run] Would flatten re-add {len(items)} episodes.")
+             logger.info("   [Dry Run] Would flatten re-add %s episodes.", len(unique_eps))
     except Exception as e:
-        print(f"   [Flatten] Error re-adding: {e}")
+        logger.error("   [Flatten] Error re-adding: %s", e)
+
+def fetch_watched(trakt):
+    """Trakt watched summary (noseasons) of shows and movies, keyed by IMDb ID."""
+    watched = trakt.get_watched_shows()
+    watched_movies = trakt.get_watched_movies()
+    if watched_movies:
+        watched.update(watched_movies)
+    return watched
 
-def sync_completed_from_cache(trakt, cache, dry_run=False):
+def sync_completed_from_cache(trakt, cache, dry_run=False, watched=None):
     """
     Iterates through cache. If item is 'completed', ensure it is fully watched on Trakt with correct date.
     Deduplicates by IMDb ID (choosing latest date) to prevent conflicts.
+    watched: the fetch_watched() summary if the caller already has it.
+    Returns True if it sent changes to Trakt.
     """
-    print("\n=== Syncing 'Completed' Status from Cache ===")
+    logger.info("\n=== Syncing 'Completed' Status from Cache ===")
     
     # 1. Get all completed items from cache and Group by ID
     completed_groups = {} # {imdb_id: [item1, item2]}
@@ -303,13 +284,11 @@ def sync_completed_from_cache(trakt, cache, dry_run=False):
                     completed_groups[mid] = []
                 completed_groups[mid].append(data)
                 
-    print(f"Found {len(completed_groups)} unique completed shows/movies in cache.")
+    logger.info("Found %s unique completed shows/movies in cache.", len(completed_groups))
     
-    # 2. Check Trakt
-    watched = trakt.get_watched_shows(load_progress=True)
-    watched_movies = trakt.get_watched_movies()
-    if watched_movies:
-        watched.update(watched_movies)
+    # 2. Check Trakt (only last_watched_at is compared, the summary is enough)
+    if watched is None:
+        watched = fetch_watched(trakt)
     
     items_to_sync = [] # List of unique representative items
     items_to_remove = [] # Mismatches need wipe first
@@ -348,7 +327,7 @@ def sync_completed_from_cache(trakt, cache, dry_run=False):
             
             # Compare Dates
             if c_date_str and t_date_str != c_date_str:
-                 print(f"   [Date Mismatch] {title}: Trakt {t_date_str} != Cache {c_date_str}. Fixing...")
+                 logger.info("   [Date Mismatch] %s: Trakt %s != Cache %s. Fixing...", title, t_date_str, c_date_str)
                  
                  # Prepare representative for sync
                  sync_rep = best_item.copy()
@@ -360,7 +339,7 @@ def sync_completed_from_cache(trakt, cache, dry_run=False):
 
             pass
         else:
-             print(f"   [Missing] {title} ({imdb_id}) marked completed in cache but missing on Trakt.")
+             logger.warning("   [Missing] %s (%s) marked completed in cache but missing on Trakt.", title, imdb_id)
              sync_rep = best_item.copy()
              if c_date_str:
                  sync_rep['date'] = c_date_str
@@ -368,7 +347,7 @@ def sync_completed_from_cache(trakt, cache, dry_run=False):
 
     # Handle Removals
     if items_to_remove:
-        print(f"   Wiping history for {len(items_to_remove)} items to fix dates...")
+        logger.info("   Wiping history for %s items to fix dates...", len(items_to_remove))
         
         rem_payload = []
         for it in items_to_remove:
@@ -388,10 +367,10 @@ def sync_completed_from_cache(trakt, cache, dry_run=False):
                  trakt.remove_from_history_batch(chunk)
                  time.sleep(2)
              else:
-                 print(f"   [Dry Run] Would wipe mismatch items.")
+                 logger.info("   [Dry Run] Would wipe mismatch items.")
 
     if items_to_sync:
-        print(f"   Enforcing 'Completed' status for {len(items_to_sync)} items...")
+        logger.info("   Enforcing 'Completed' status for %s items...", len(items_to_sync))
         
         batch_list = []
         for it in items_to_sync:
@@ -421,147 +400,93 @@ def sync_completed_from_cache(trakt, cache, dry_run=False):
             
         if not dry_run:
             results = trakt.add_to_history_batch(batch_list)
-            print(f"   [Completed Sync] Configured {len(batch_list)} shows as Watched.")
+            logger.info("   [Completed Sync] Configured %s shows as Watched.", len(batch_list))
         else:
-            print(f"   [Dry Run] Would batch sync {len(batch_list)} completed items.")
+            logger.info("   [Dry Run] Would batch sync %s completed items.", len(batch_list))
 
-def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False, dry_run=False):
-    # If run from CLI, args might be passed via sys.argv, but we can't easily mix 
-    # explicit args and argparse if we call start() directly.
-    # Pattern: ArgumentParser parses sys.argv only if no args passed to function? 
-    # Better: Move argparse logic to `if __name__ == "__main__":` block or handling inside start
-    
-    # We'll allow explicit parameters. If they are defaults, we check CLI usage only if main?
-    # Simpler: start() accepts params. CLI calls start(args.resync).
-    
-    print("Starting TraktSync...")
-    if resync:
-        print(">>> FORCE RESYNC MODE ENABLED <<<")
-        print("    Items will be REMOVED from Trakt history before syncing (unless Trakt is ahead).")
+    return bool(items_to_sync) and not dry_run
+
+def resolved_item(item, result, cache):
+    """Phase 1 result for one watch list item with an IMDb ID (its watch date goes to the cache)."""
+    imdb_id, item_type, status, title, progress = result
+    # --- Back-Sync / Cache Logic ---
+    cached_status = cache.get_status(item['url'])
     
-    if dry_run:
-        print(">>> DRY RUN MODE <<<")
-        print("    No changes will be sent to Trakt.")
+    # Update Date in Cache (if we have it)
+    if item.get('date'):
+        d_str = item['date'].strftime("%d-%m-%Y")
+        # Only update if different? 
+        # Actually just update, set_date is safe
+        cache.set_date(item['url'], d_str)
     
-    if not TRAKT_CLIENT_ID or not TRAKT_CLIENT_SECRET:
-        print("Error: TRAKT_CLIENT_ID and TRAKT_CLIENT_SECRET must be set in .env")
-        return
+    trakt_data = cache.get_trakt_data(item['url'])
+    return {
+        'imdb_id': imdb_id,
+        'trakt_id': (trakt_data or {}).get('ids', {}).get('trakt'),
+        'type': item_type,
+        'title': title,
+        'progress': progress,
+        'url': item['url'],
+        'date': item.get('date'),
+        'cached_status': cached_status
+    }
 
-    # Initialize Services
-    trakt = TraktAPI(TRAKT_CLIENT_ID, TRAKT_CLIENT_SECRET)
-    try:
-        trakt.authenticate()
-    except Exception as e:
-        print(f"Trakt Auth failed: {e}")
-        return
-
-    # Check Credentials
-    username = HDREZKA_USERNAME
-    password = HDREZKA_PASSWORD
-    if not username or not password:
-        print("HDRezka credentials not found in env.")
+def resolve_watch_list(watch_list, scraper, trakt, id_index=None, browser_fallback=True, workers=5, events=None):
+    """
+    Phase 1: resolves IMDb ID, type and Trakt IDs for every watch list item,
+    retrying items without an IMDb link in the browser.
+    events (EventBus) gets a progress event per item.
+    Returns (resolved_items, failed_resolution)
+    """
+    resolved_items = []
+    failed_resolution = []
+    unresolved = [] # No IMDb link in the plain HTML, retried in the browser below
 
-    scraper = HDRezkaScraper(username, password, headless=headless)
-    
-    if fix_duplicates:
-        print("\n=== Running Deduplication Scan ===")
-        # target specific ID if needed, or all from cache
-        # For now, let's scan ALL cached items that have an ID.
-        cached_items = scraper.cache.data
-        print(f"Scanning {len(cached_items)} items from cache...")
+    def collect(item, result, pbar):
+        imdb_id, item_type, status, title, progress = result
         
-        # We need to iterate over a COPY because we might not modify it but it's safer
-        # Actually we iterate data directly
-        for url, data in tqdm(cached_items.items(), desc="Deduplicating"):
-             if isinstance(data, dict):
-                 imdb_id = data.get('id')
-                 if not imdb_id or not imdb_id.startswith('tt'):
-                     continue
-                 
-                 # Only check shows? Or movies too?
-                 # Midsomer Murders is a show. Duplicates usually happen in shows.
-                 # Let's assume shows for now, or check type if available.
-                 trakt_data = data.get('trakt_data')
-                 itype = 'shows'
-                 if trakt_data and trakt_data.get('type') == 'movie':
-                     itype = 'movies'
-                 
-                 deduplicate_item(trakt, imdb_id, itype, dry_run=dry_run)
-                 
-        print("Deduplication complete.")
-        return
-    
-    
-    # [Completed Authority] from Cache (NEW)
-    try:
-        # 1. Sync completed items (Handles its own fetching, basic)
-        sync_completed_from_cache(trakt, scraper.cache.data, dry_run=dry_run)
-    
-        # 2. Fetch Trakt Watched State (Optimized)
-        # We now request FULL progress (load_progress=True) to compare
-        trakt_watched = trakt.get_watched_shows(load_progress=True)
-        trakt_movies = trakt.get_watched_movies()
-        if trakt_movies:
-            trakt_watched.update(trakt_movies)
-    except Exception as e:
-        print(f"\n[CRITICAL] Aborting Sync: {e}")
-        return
-    
-    print("Fetching Watch List from HDRezka...")
-    watch_list = scraper.get_watch_list()
-    
-    if not watch_list:
-        print("No items found or login failed.")
-        return
+        if imdb_id:
+            resolved_items.append(resolved_item(item, result, scraper.cache))
+            pbar.set_postfix_str(f"{status}: {title[:20]}")
+        else:
+            unresolved.append(item)
+            pbar.set_postfix_str(f"Failed: {title[:20]}")
         
-    # --- Phase 1: Resolve Repositories ---
-    print(f"\nPhase 1: Resolving IMDB IDs for {len(watch_list)} items...")
+        pbar.update(1)
+        if events:
+            events.progress(pbar.n, pbar.total, title=title, status=status if imdb_id else 'Failed')
     
-    resolved_items = []
-    failed_resolution = []
-    
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_item = {executor.submit(process_id_resolution, item, scraper, trakt): item for item in watch_list}
+    # One cache.json write for the whole phase instead of one per ID/date
+    with scraper.cache.batch():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_item = {executor.submit(process_id_resolution, item, scraper, trakt, id_index): item for item in watch_list}
         
-        import sys
-        with tqdm(total=len(watch_list), desc="Resolving IDs", file=sys.stdout) as pbar:
-            for future in as_completed(future_to_item):
-                item = future_to_item[future]
-                imdb_id, item_type, status, title, progress = future.result()
-                
-                if imdb_id:
-                    # --- Back-Sync / Cache Logic ---
-                    cached_status = scraper.cache.get_status(item['url'])
-                    
-                    # Update Date in Cache (if we have it)
-                    if item.get('date'):
-                        d_str = item['date'].strftime("%d-%m-%Y")
-                        # Only update if different? 
-                        # Actually just update, set_date is safe
-                        scraper.cache.set_date(item['url'], d_str)
-                    
-                    resolved_items.append({
-                        'imdb_id': imdb_id,
-                        'trakt_id': scraper.cache.get_trakt_data(item['url']).get('ids', {}).get('trakt') if scraper.cache.get_trakt_data(item['url']) else None,
-                        'type': item_type,
-                        'title': title,
-                        'progress': progress,
-                        'url': item['url'],
-                        'date': item.get('date'),
-                        'cached_status': cached_status
-                    })
-                    pbar.set_postfix_str(f"{status}: {title[:20]}")
-                else:
-                    failed_resolution.append(f"{title} (No IMDB ID)")
-                    pbar.set_postfix_str(f"Failed: {title[:20]}")
-                
-                pbar.update(1)
+            with tqdm(total=len(watch_list), desc="Resolving IDs", file=sys.stdout) as pbar:
+                for future in as_completed(future_to_item):
+                    collect(future_to_item[future], future.result(), pbar)
 
-    # Report Detected Progress & Back-Sync Candidates
-    print("\n--- Detected Progress & Status ---")
-    
+        # Fallback: JS-rendered item pages, all of them in one browser pass
+        if unresolved and browser_fallback:
+            scraper.resolve_with_browser([item['url'] for item in unresolved])
+            retry, unresolved = unresolved, []
+            with tqdm(total=len(retry), desc="Resolving IDs (browser)", file=sys.stdout) as pbar:
+                for item in retry:
+                    collect(item, process_id_resolution(item, scraper, trakt, id_index), pbar)
+
+    for item in unresolved:
+        failed_resolution.append(f"{item['title']} (No IMDB ID)")
+
+    return resolved_items, failed_resolution
+
+def plan_sync(resolved_items, trakt_watched, cache, resync=False, fix_mismatch=False):
+    """
+    Decision loop: compares each resolved item with the Trakt watched state.
+    Marks items where Trakt is ahead as 'completed' in the cache.
+    Returns (final_sync_list, items_to_remove), removal items carry a 'wipe' flag.
+    """
     final_sync_list = []
     items_to_remove = []
+    completed_urls = [] # Marked 'completed' in one cache write after the loop
     
     for item in resolved_items:
         imdb_id = item['imdb_id']
@@ -579,7 +504,7 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
 
         # 1. Check Cache Status
         if cached_status == 'ignored':
-            print(f"{info} | [IGNORED] - Skipping Sync (User Flag)")
+            logger.info("%s | [IGNORED] - Skipping Sync (User Flag)", info)
             continue
 
         # 2. Check Trakt Status
@@ -623,7 +548,7 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
                 if r_date_str != "None" and t_date_str != "None":
                     if r_date_str != t_date_str:
                         # Allow 1 day variance? Or strict. Let's start strict.
-                        print(f"{info} | [MISMATCH] {t_date_str} != {r_date_str} -> Marking for Forced Wipe")
+                        logger.info("%s | [MISMATCH] %s != %s -> Marking for Forced Wipe", info, t_date_str, r_date_str)
                         force_wipe = True
 
             # Comparison Logic
@@ -635,19 +560,19 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
                 # Note: We must toggle trakt_ahead flag BEFORE mismatch check
                 if (t_season > h_season) or (t_season == h_season and t_episode > h_episode):
                     trakt_ahead = True
-                    print(f"{info} | [{trakt_info_str}] | [TRAKT AHEAD] - Backfilling Date")
+                    logger.info("%s | [%s] | [TRAKT AHEAD] - Backfilling Date", info, trakt_info_str)
                     
                     # If Mismatch flag is ON, we force sync but do NOT wipe (unless future date? For now, trust Ahead)
                     # User wants to "update date" but keep progress.
                     if fix_mismatch and r_date_str != "None" and t_date_str != "None" and r_date_str != t_date_str:
-                         print(f"   -> [MISMATCH] {t_date_str} != {r_date_str}. Treating as Backfill strictly.")
+                         logger.info("   -> [MISMATCH] %s != %s. Treating as Backfill strictly.", t_date_str, r_date_str)
                          should_sync = True
                          # CRITICAL: Disable force_wipe to prevent removal logic from nuking history
                          force_wipe = False 
                     else:
                          should_sync = True
                          
-                    scraper.cache.set_status(item['url'], 'completed')
+                    completed_urls.append(item['url'])
                         
                 elif (t_season == h_season) and (t_episode == h_episode):
                      # Progress Equal. Check Date?
@@ -656,14 +581,14 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
                         dates_match = (t_date_dt.date() == rezka_date.date())
                      
                      if dates_match and not force_wipe:
-                         print(f"{info} | [{trakt_info_str}] | [EQUAL] - Dates Match")
+                         logger.info("%s | [%s] | [EQUAL] - Dates Match", info, trakt_info_str)
                          should_sync = False
                      else:
-                         print(f"{info} | [{trakt_info_str}] | [DATE MISMATCH] -> {r_date_str}")
+                         logger.info("%s | [%s] | [DATE MISMATCH] -> %s", info, trakt_info_str, r_date_str)
                          should_sync = True
                 else:
                      # HDRezka Ahead
-                     print(f"{info} | [{trakt_info_str}] | [SYNCING] - Progress Update")
+                     logger.info("%s | [%s] | [SYNCING] - Progress Update", info, trakt_info_str)
                      
             else:
                 # Movie logic
@@ -672,13 +597,13 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
                     dates_match = (t_date_dt.date() == rezka_date.date())
 
                 if dates_match:
-                     print(f"{info} | [{trakt_info_str}] | [EQUAL] - Dates Match")
+                     logger.info("%s | [%s] | [EQUAL] - Dates Match", info, trakt_info_str)
                      should_sync = False
                 else:
-                     print(f"{info} | [{trakt_info_str}] | [DATE MISMATCH] -> {r_date_str}")
+                     logger.info("%s | [%s] | [DATE MISMATCH] -> %s", info, trakt_info_str, r_date_str)
                      should_sync = True
         else:
-            print(f"{info} | [NEW] | [SYNCING]")
+            logger.info("%s | [NEW] | [SYNCING]", info)
 
         if should_sync:
             final_sync_list.append(item)
@@ -703,52 +628,33 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
             if imdb_id in trakt_watched and not resync:
                  items_to_remove.append(rem_item)
 
-    print("-------------------------\n")
+    if completed_urls:
+        cache.set_status_many(completed_urls, 'completed')
+    return final_sync_list, items_to_remove
 
-    # --- Phase 2: Batch Sync ---
-    if not final_sync_list:
-        print("Nothing to sync.")
+def wait_until(check, timeout):
+    """Polls check() every VERIFY_POLL_SECONDS for up to timeout seconds, or just waits without one."""
+    if check is None:
+        time.sleep(timeout)
         return
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not check():
+        time.sleep(VERIFY_POLL_SECONDS)
 
-    print(f"\nPhase 2: Syncing {len(final_sync_list)} items to Trakt...")
-    
-    # Deduplicate final_sync_list by IMDb ID to prevent conflict (Double shows)
-    # Strategy: Keep item with LATEST date.
-    # This handles cases like 'Dan Da Dan' appearing as TV-1 and TV-2
-    unique_map = {}
-    for item in final_sync_list:
-        mid = item.get('imdb_id') or item.get('ids', {}).get('imdb')
-        if not mid: continue
-        
-        if mid not in unique_map:
-            unique_map[mid] = item
-        else:
-            # Compare dates
-            existing = unique_map[mid]
-            d1 = existing.get('date')
-            d2 = item.get('date')
-            
-            # If d2 > d1, replace
-            # date is datetime object usually
-            if d2 and d1:
-                if d2 > d1:
-                    unique_map[mid] = item
-            elif d2 and not d1:
-                    unique_map[mid] = item
-                    
-    final_sync_list = list(unique_map.values())
-    if len(final_sync_list) < len(unique_map): # Wait, unique_map len is deduped len.
-         pass # Check logic: len(final_sync_list) is new len.
-         
-    # Re-check len
-    print(f"   Deduplicated to {len(final_sync_list)} unique items.")
-
+def push_history(trakt, final_sync_list, items_to_remove, resync=False, dry_run=False, events=None, removed=None):
+    """
+    Phase 2 writes: removes old history (everything on resync, else the items
+    plan_sync flagged), then adds final_sync_list, 100 items per request.
+    removed: check that the removals show up on Trakt, polled instead of the
+    fixed REMOVAL_SETTLE_SECONDS wait.
+    Returns the number of movies/episodes Trakt reports as added.
+    """
     # Batch size of 100 (Trakt limit)
     batch_size = 100
     # 1. Handle Removals (for Updates or Forced Resync)
     removal_list = []
     if resync:
-        print("   [Force Resync] Updating all synced items (clean slate)...")
+        logger.info("   [Force Resync] Updating all synced items (clean slate)...")
         # For resync, we want to WIPE everything.
         # Create copies with wipe=True
         removal_list = []
@@ -758,28 +664,29 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
             removal_list.append(c)
     else:
         if items_to_remove:
-            print(f"   [Update] Clearing old history for {len(items_to_remove)} items to ensure correct dates...")
+            logger.info("   [Update] Clearing old history for %s items to ensure correct dates...", len(items_to_remove))
             removal_list = items_to_remove 
         
+    batches_done = 0
+    batches_total = math.ceil(len(removal_list) / batch_size) + math.ceil(len(final_sync_list) / batch_size)
     if removal_list:
-        print(f"Removing history for {len(removal_list)} items...")
-        # Helper logging for GUI
-        import sys
-        import time
+        logger.info("Removing history for %s items...", len(removal_list))
         r_chunks = [removal_list[i:i + batch_size] for i in range(0, len(removal_list), batch_size)]
         for chunk in tqdm(r_chunks, desc="Removing Old History", file=sys.stdout):
              if not dry_run:
                  trakt.remove_from_history_batch(chunk)
-                 time.sleep(5) # Wait for Trakt to process removals
+                 wait_until(removed, REMOVAL_SETTLE_SECONDS) # Wait for Trakt to process removals
              else:
-                 print(f"   [Dry Run] Would remove batch of {len(chunk)} items.")
+                 logger.info("   [Dry Run] Would remove batch of %s items.", len(chunk))
+             batches_done += 1
+             if events:
+                 events.progress(batches_done, batches_total, step='remove', items=len(chunk))
 
     # 2. Add New History
     chunks = [final_sync_list[i:i + batch_size] for i in range(0, len(final_sync_list), batch_size)]
     
     total_synced = 0
     
-    import sys
     for chunk in tqdm(chunks, desc="Batch Adding", file=sys.stdout):
         if not dry_run:
             result = trakt.add_to_history_batch(chunk)
@@ -793,42 +700,29 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
                 nf = result.get('not_found', {})
                 not_found_count = len(nf.get('movies', [])) + len(nf.get('shows', [])) + len(nf.get('episodes', []))
                 if not_found_count > 0:
-                    print(f"   [Trakt Warning] {not_found_count} items ignored by Trakt (Invalid ID/Not Found):")
+                    logger.warning("   [Trakt Warning] %s items ignored by Trakt (Invalid ID/Not Found):", not_found_count)
                     for x in nf.get('movies', []):
-                         print(f"      - Movie ID: {x.get('ids')}")
+                         logger.info("      - Movie ID: %s", x.get('ids'))
                     for x in nf.get('shows', []):
-                         print(f"      - Show ID: {x.get('ids')}")
+                         logger.info("      - Show ID: %s", x.get('ids'))
         else:
-             print(f"   [Dry Run] Would add batch of {len(chunk)} items.")
+             logger.info("   [Dry Run] Would add batch of %s items.", len(chunk))
              total_synced += len(chunk) # fake count for summary
-        
-    print(f"\nSync Complete!")
-    print(f"Total Items Processed: {len(watch_list)}")
-    print(f"Resolved IDs: {len(resolved_items)}")
-    print(f"Items Added to History: {total_synced}")
-    
-    import time
-    if failed_resolution:
-        print("\nItems with no IMDB ID found:")
-        for fail in failed_resolution:
-            print(f"- {fail}")
+        batches_done += 1
+        if events:
+            events.progress(batches_done, batches_total, step='add', items=len(chunk), added=total_synced)
 
-    # --- Phase 3: Verification ---
-    print("\n-------------------------")
-    print("Phase 3: Verification")
-    print("Waiting 5 seconds for Trakt propagation...")
-    time.sleep(5)
-    
-    print("Re-fetching Trakt history...")
-    # Re-fetch fresh state
-    trakt_watched_new = trakt.get_watched_shows(load_progress=True)
-    trakt_movies_new = trakt.get_watched_movies()
-    if trakt_movies_new:
-        trakt_watched_new.update(trakt_movies_new)
-        
-    print(f"Verifying {len(final_sync_list)} synced items...")
-    
+    return total_synced
+
+def verify_synced(final_sync_list, trakt_watched_new, quiet=False):
+    """
+    Phase 3: checks that every synced item shows up in the re-fetched Trakt
+    state with the HDRezka date (episode level for shows).
+    quiet: mismatches are logged at debug level (a check that will be retried).
+    Returns the number of mismatches.
+    """
     mismatch_count = 0
+    log = logger.debug if quiet else logger.warning
     
     for item in final_sync_list:
         imdb_id = item['imdb_id']
@@ -836,7 +730,7 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
         rezka_date = item['date']
         
         if imdb_id not in trakt_watched_new:
-            print(f"[VERIFY FAIL] '{title}' ({imdb_id}) not found in Trakt history!")
+            log("[VERIFY FAIL] '%s' (%s) not found in Trakt history!", title, imdb_id)
             mismatch_count += 1
             continue
             
@@ -890,20 +784,747 @@ def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False
                      pass
                  else:
                      ep_date_str = found_ep_date.strftime("%d-%m-%Y") if found_ep_date else "None"
-                     print(f"[VERIFY FAIL] '{title}' (S{s_req}E{e_req}) -> Expected: {r_str} | Found: {ep_date_str}")
+                     log("[VERIFY FAIL] '%s' (S%sE%s) -> Expected: %s | Found: %s", title, s_req, e_req, r_str, ep_date_str)
                      mismatch_count += 1
             else:
                  # Movie or simple show match
-                 print(f"[VERIFY FAIL] '{title}' -> Expected: {r_str} | Found: {t_str}")
+                 log("[VERIFY FAIL] '%s' -> Expected: %s | Found: %s", title, r_str, t_str)
                  mismatch_count += 1
         else:
             # print(f"[VERIFY OK] '{title}' date match: {r_str}")
             pass
+
+    return mismatch_count
+
+def watch_signature(item):
+    """What a watch list item looks like to the sync: a change means it needs another pass."""
+    date = item.get('date')
+    # Day only, 'today'/'yesterday' rows parse to the current time
+    date = date.strftime("%d-%m-%Y") if date else None
+    return (date, json.dumps(item.get('progress'), sort_keys=True))
+
+class SyncSession:
+    """
+    Services and Trakt state kept warm between runs in one process (the daemon):
+    the Trakt client with its token, the scraper with its mirror choice, login
+    cookies, parse pool and the in-memory cache, the watched summary with its
+    IdIndex, and what the last successful run synced.
+
+    With start(session=..., incremental=True) the watched state is downloaded
+    again only when /sync/last_activities moved, and only watch list items that
+    changed since the last run are resolved, planned and verified. Any Trakt
+    change we did not make ourselves falls back to comparing every item.
+    """
+    def __init__(self, headless=False, parse_workers=0):
+        self.trakt = TraktAPI(TRAKT_CLIENT_ID, TRAKT_CLIENT_SECRET)
+        self.scraper = HDRezkaScraper(HDREZKA_USERNAME, HDREZKA_PASSWORD, headless=headless, parse_workers=parse_workers)
+        self.events = EventBus()
+        self.activities = None # /sync/last_activities the watched state below belongs to
+        self.trakt_watched = None
+        self.id_index = None
+        self.trakt_changed = True # Someone else changed Trakt since our last run
+        self.synced = {} # cache key -> watch_signature() of the last successful run
+        self.staged = None # (synced entries of the running sync, replace all?)
+        self.last_result = None
+
+    def watched(self, reuse=True):
+        """fetch_watched(), reused while Trakt's last activities stay the same."""
+        activities = self.trakt.get_last_activities()
+        if reuse and self.trakt_watched is not None and activities == self.activities:
+            logger.info("Trakt unchanged since the last run, reusing the watched state.")
+            self.trakt_changed = False
+            return self.trakt_watched
+        self.trakt_changed = self.activities is not None and activities != self.activities
+        self.set_watched(fetch_watched(self.trakt), activities)
+        return self.trakt_watched
+
+    def refetch_watched(self):
+        """
+        fetch_watched() after our own writes: their activities become the
+        baseline instead of counting as a change someone else made.
+        """
+        activities = self.trakt.get_last_activities()
+        self.set_watched(fetch_watched(self.trakt), activities)
+        return self.trakt_watched
+
+    def set_watched(self, trakt_watched, activities):
+        self.trakt_watched = trakt_watched
+        self.activities = activities
+        self.id_index = None
+
+    def get_id_index(self):
+        if self.id_index is None:
+            self.id_index = IdIndex()
+            self.id_index.add_watched(self.trakt_watched)
+        return self.id_index
+
+    def changed_items(self, watch_list):
+        return [item for item in watch_list
+                if self.synced.get(cache_key(item['url'])) != watch_signature(item)]
+
+    def stage(self, items, replace):
+        """Remembers the watch list items this run synced, committed by finish() if it succeeds."""
+        self.staged = ({cache_key(item['url']): watch_signature(item) for item in items}, replace)
+
+    def finish(self, ok):
+        if ok and self.staged:
+            synced, replace = self.staged
+            if replace:
+                self.synced = synced
+            else:
+                self.synced.update(synced)
+        self.staged = None
+
+    def apply_title(self, imdb_id, entry, before, after):
+        """
+        Folds a single-title sync into the warm watched state: entry (None if
+        unwatched) replaces the title's, and the activities move on to after,
+        unless Trakt had already moved past ours (before) for other reasons.
+        """
+        if self.trakt_watched is None or before != self.activities:
+            return
+        if entry:
+            self.trakt_watched[imdb_id] = entry
+            if self.id_index is not None:
+                self.id_index.add_watched({imdb_id: entry})
+        else:
+            self.trakt_watched.pop(imdb_id, None)
+        self.activities = after
+
+    def close(self):
+        self.scraper.close()
+
+class SyncRun:
+    """
+    Phase and count bookkeeping of one run, shared by _sync and sync_title so
+    the profiler, the event bus and the metrics always move together.
+    """
+    def __init__(self, profiler, events):
+        self.profiler = profiler
+        self.events = events
+
+    def phase(self, name):
+        self.profiler.switch(name)
+        self.events.start_phase(name)
+
+    def count(self, **counts):
+        for kind, value in counts.items():
+            metrics.set('sync_items', value, kind=kind)
+        self.events.count(**counts)
+
+def start(resync=False, headless=False, fix_duplicates=False, fix_mismatch=False, dry_run=False, parse_workers=0, browser_fallback=True, watch_list_mode='browser', profile=False, events=None, session=None, incremental=False, title=None):
+    """
+    Runs a full sync. profile=True profiles every phase (cProfile, tracemalloc,
+    sampled stacks of all threads) and writes the reports to profile/.
+    Metrics of the run are written to METRICS_JSON, lifetime totals to METRICS_TEXTFILE.
+    events: utils.events.EventBus that receives phase, progress and count events.
+    session: SyncSession whose warm services are used instead of new ones
+    (headless/parse_workers then come from the session), incremental=True
+    lets it skip what did not change since its last run.
+    title: {'url' or 'imdb_id', optional 'season'/'episode'/'date'} syncs
+    just that title (sync_title), in a couple of requests.
+    Returns {'ok', 'incremental', 'counts', 'elapsed'}.
+    """
+    metrics.start_run()
+    profiler = Profiler(enabled=profile)
+    events = events or (session.events if session else EventBus())
+    events.reset()
+    started = time.monotonic()
+    ok = False
+    try:
+        if title:
+            ok = sync_title(title, resync, fix_mismatch, dry_run, profiler, events, session) is not False
+        else:
+            ok = _sync(resync, headless, fix_duplicates, fix_mismatch, dry_run, parse_workers, browser_fallback, watch_list_mode, profiler, events, session, incremental) is not False
+    finally:
+        events.finish(ok)
+        if session:
+            session.finish(ok and not dry_run)
+        report = profiler.finish()
+        if report:
+            logger.info("\nProfile written to %s", report)
+        metrics.inc('sync_runs_total', mode='incremental' if session and incremental else 'full',
+                    result='ok' if ok else 'failed')
+        metrics.set('sync_last_run_success', int(ok))
+        metrics.set('sync_last_run_timestamp_seconds', int(time.time()))
+        try:
+            metrics.write_reports()
+        except OSError as e:
+            logger.error("Could not write metrics: %s", e)
+    result = {'ok': ok, 'incremental': bool(session and incremental and not title), 'counts': events.snapshot()['counts'],
+              'elapsed': round(time.monotonic() - started, 3)}
+    if session:
+        session.last_result = result
+    return result
+
+def _sync(resync, headless, fix_duplicates, fix_mismatch, dry_run, parse_workers, browser_fallback, watch_list_mode, profiler, events, session, incremental):
+    run = SyncRun(profiler, events)
+
+    # If run from CLI, args might be passed via sys.argv, but we can't easily mix 
+    # explicit args and argparse if we call start() directly.
+    # Pattern: ArgumentParser parses sys.argv only if no args passed to function? 
+    # Better: Move argparse logic to `if __name__ == "__main__":` block or handling inside start
+    
+    # We'll allow explicit parameters. If they are defaults, we check CLI usage only if main?
+    # Simpler: start() accepts params. CLI calls start(args.resync).
+    
+    logger.info("Starting TraktSync...")
+    if resync:
+        logger.info(">>> FORCE RESYNC MODE ENABLED <<<")
+        logger.info("    Items will be REMOVED from Trakt history before syncing (unless Trakt is ahead).")
+    
+    if dry_run:
+        logger.info(">>> DRY RUN MODE <<<")
+        logger.info("    No changes will be sent to Trakt.")
+    
+    if not TRAKT_CLIENT_ID or not TRAKT_CLIENT_SECRET:
+        logger.error("Error: TRAKT_CLIENT_ID and TRAKT_CLIENT_SECRET must be set in .env")
+        return False
+
+    run.phase('trakt_auth')
+    # Initialize Services (the daemon's session keeps them between runs)
+    trakt = session.trakt if session else TraktAPI(TRAKT_CLIENT_ID, TRAKT_CLIENT_SECRET)
+    try:
+        trakt.authenticate()
+    except Exception as e:
+        logger.error("Trakt Auth failed: %s", e)
+        return False
+
+    # Check Credentials
+    username = HDREZKA_USERNAME
+    password = HDREZKA_PASSWORD
+    if not username or not password:
+        logger.warning("HDRezka credentials not found in env.")
+
+    if session:
+        scraper = session.scraper
+        if scraper.cache.reload_if_changed():
+            logger.info("cache.json changed on disk, reloaded it.")
+        if not incremental:
+            # Give mirrors that failed earlier in the session a chance to come back
+            scraper.reset_mirrors()
+    else:
+        scraper = HDRezkaScraper(username, password, headless=headless, parse_workers=parse_workers)
+    
+    if fix_duplicates:
+        run.phase('fix_duplicates')
+        logger.info("\n=== Running Deduplication Scan ===")
+        # target specific ID if needed, or all from cache
+        # For now, let's scan ALL cached items that have an ID.
+        cached_items = scraper.cache.data
+        logger.info("Scanning %s items from cache...", len(cached_items))
+        
+        # We need to iterate over a COPY because we might not modify it but it's safer
+        # Actually we iterate data directly
+        for url, data in tqdm(cached_items.items(), desc="Deduplicating"):
+             if isinstance(data, dict):
+                 imdb_id = data.get('id')
+                 if not imdb_id or not imdb_id.startswith('tt'):
+                     continue
+                 
+                 # Only check shows? Or movies too?
+                 # Midsomer Murders is a show. Duplicates usually happen in shows.
+                 # Let's assume shows for now, or check type if available.
+                 trakt_data = data.get('trakt_data')
+                 itype = 'shows'
+                 if trakt_data and trakt_data.get('type') == 'movie':
+                     itype = 'movies'
+                 
+                 deduplicate_item(trakt, imdb_id, itype, dry_run=dry_run)
+                 
+        logger.info("Deduplication complete.")
+        return
+    
+    
+    run.phase('trakt_watched')
+    # [Completed Authority] from Cache (NEW)
+    try:
+        # Fetch Trakt Watched State (Optimized)
+        # Lightweight summary (noseasons) for everything; season/episode progress
+        # is loaded after Phase 1 for the shows HDRezka actually has
+        if session:
+            trakt_watched = session.watched(reuse=incremental)
+            trakt_changed = session.trakt_changed
+        else:
+            trakt_watched = fetch_watched(trakt)
+
+        # Sync completed items against it, fetch again if that changed anything
+        if sync_completed_from_cache(trakt, scraper.cache.data, dry_run=dry_run, watched=trakt_watched):
+            trakt_watched = session.refetch_watched() if session else fetch_watched(trakt)
+    except Exception as e:
+        logger.error("\n[CRITICAL] Aborting Sync: %s", e)
+        return False
+    
+    run.phase('watch_list')
+    logger.info("Fetching Watch List from HDRezka...")
+    if watch_list_mode == 'http':
+        watch_list = scraper.get_watch_list_http()
+    else:
+        watch_list = scraper.get_watch_list()
+    
+    if not watch_list:
+        logger.error("No items found or login failed.")
+        return False
+
+    # Incremental: only items that changed since the last run, unless Trakt
+    # changed behind our back (then every item needs comparing)
+    full_list = watch_list
+    only_changed = bool(session and incremental and session.synced and not trakt_changed)
+    if only_changed:
+        watch_list = session.changed_items(full_list)
+        logger.info("%s of %s watch list items changed since the last run.", len(watch_list), len(full_list))
+        run.count(unchanged=len(full_list) - len(watch_list))
+        if not watch_list:
+            run.count(watch_list=len(full_list), resolved=0, to_sync=0)
+            logger.info("Nothing to sync.")
+            return
+        
+    run.phase('phase1')
+    # --- Phase 1: Resolve Repositories ---
+    logger.info("\nPhase 1: Resolving IMDB IDs for %s items...", len(watch_list))
+    
+    # Watched shows/movies already carry type + Trakt IDs, resolve from them first
+    if session:
+        id_index = session.get_id_index()
+    else:
+        id_index = IdIndex()
+        id_index.add_watched(trakt_watched)
+    
+    resolved_items, failed_resolution = resolve_watch_list(watch_list, scraper, trakt, id_index, browser_fallback, events=events)
+    run.count(watch_list=len(full_list), resolved=len(resolved_items), unresolved=len(failed_resolution))
+
+    if session:
+        # Unresolved items are retried next run
+        resolved_urls = {it['url'] for it in resolved_items}
+        session.stage([item for item in watch_list if item['url'] in resolved_urls], replace=not only_changed)
+    else:
+        # Parsing is done after Phase 1, release the worker processes
+        scraper.close()
+
+    run.phase('trakt_progress')
+    # Second tier: full progress only for the shows we are going to compare
+    try:
+        trakt.load_show_progress(trakt_watched, [it['imdb_id'] for it in resolved_items if it['type'] == 'show'])
+    except Exception as e:
+        logger.error("\n[CRITICAL] Aborting Sync: %s", e)
+        return False
+
+    run.phase('plan')
+    # Report Detected Progress & Back-Sync Candidates
+    logger.info("\n--- Detected Progress & Status ---")
+    
+    final_sync_list, items_to_remove = plan_sync(resolved_items, trakt_watched, scraper.cache, resync, fix_mismatch)
+    run.count(to_sync=len(final_sync_list), to_remove=len(items_to_remove))
+
+    logger.info("-------------------------\n")
+
+    run.phase('phase2')
+    # --- Phase 2: Batch Sync ---
+    if not final_sync_list:
+        logger.info("Nothing to sync.")
+        return
+
+    logger.info("\nPhase 2: Syncing %s items to Trakt...", len(final_sync_list))
+    
+    # Deduplicate final_sync_list by IMDb ID to prevent conflict (Double shows)
+    # Strategy: Keep item with LATEST date.
+    # This handles cases like 'Dan Da Dan' appearing as TV-1 and TV-2
+    unique_map = {}
+    for item in final_sync_list:
+        mid = item.get('imdb_id') or item.get('ids', {}).get('imdb')
+        if not mid: continue
+        
+        if mid not in unique_map:
+            unique_map[mid] = item
+        else:
+            # Compare dates
+            existing = unique_map[mid]
+            d1 = existing.get('date')
+            d2 = item.get('date')
             
+            # If d2 > d1, replace
+            # date is datetime object usually
+            if d2 and d1:
+                if d2 > d1:
+                    unique_map[mid] = item
+            elif d2 and not d1:
+                    unique_map[mid] = item
+                    
+    final_sync_list = list(unique_map.values())
+    if len(final_sync_list) < len(unique_map): # Wait, unique_map len is deduped len.
+         pass # Check logic: len(final_sync_list) is new len.
+         
+    # Re-check len
+    logger.info("   Deduplicated to %s unique items.", len(final_sync_list))
+
+    total_synced = push_history(trakt, final_sync_list, items_to_remove, resync, dry_run, events)
+
+    logger.info("\nSync Complete!")
+    logger.info("Total Items Processed: %s", len(watch_list))
+    logger.info("Resolved IDs: %s", len(resolved_items))
+    logger.info("Items Added to History: %s", total_synced)
+    run.count(added=total_synced)
+    
+    import time
+    if failed_resolution:
+        logger.info("\nItems with no IMDB ID found:")
+        for fail in failed_resolution:
+            logger.info("- %s", fail)
+
+    run.phase('verify')
+    # --- Phase 3: Verification ---
+    logger.info("\n-------------------------")
+    logger.info("Phase 3: Verification")
+    logger.info("Waiting %s seconds for Trakt propagation...", PROPAGATION_WAIT_SECONDS)
+    time.sleep(PROPAGATION_WAIT_SECONDS)
+    
+    logger.info("Re-fetching Trakt history...")
+    # Re-fetch fresh state (activities first: a change after them shows up next run)
+    activities = trakt.get_last_activities() if session else None
+    trakt_watched_new = trakt.get_watched_shows()
+    trakt.load_show_progress(trakt_watched_new, [it['imdb_id'] for it in final_sync_list if it['type'] == 'show'])
+    trakt_movies_new = trakt.get_watched_movies()
+    if trakt_movies_new:
+        trakt_watched_new.update(trakt_movies_new)
+    if session:
+        # Our own changes are in it, the next incremental run starts from here
+        session.set_watched(trakt_watched_new, activities)
+        
+    logger.info("Verifying %s synced items...", len(final_sync_list))
+    
+    mismatch_count = verify_synced(final_sync_list, trakt_watched_new)
+    run.count(verify_mismatches=mismatch_count)
+
     if mismatch_count == 0:
-        print("\nAll items verified successfully!")
+        logger.info("\nAll items verified successfully!")
     else:
-        print(f"\nVerification finished with {mismatch_count} mismatches. Check log.")
+        logger.warning("\nVerification finished with %s mismatches. Check log.", mismatch_count)
+
+def find_title_keys(cache, imdb_id):
+    """Cache keys of the HDRezka items with this IMDb ID."""
+    with cache.lock:
+        return [key for key, entry in cache.data.items()
+                if (entry.get('id') if isinstance(entry, dict) else entry) == imdb_id]
+
+def sync_title(title, resync, fix_mismatch, dry_run, profiler, events, session=None):
+    """
+    start(title=...): the sync pipeline for one title. Reads only its row of
+    the watch list (over HTTP, stopping at its page; skipped when 'date' and,
+    for shows, 'season'/'episode' are given), only its history and progress
+    from Trakt, then plans, applies and verifies that one item.
+    """
+    run = SyncRun(profiler, events)
+
+    if not TRAKT_CLIENT_ID or not TRAKT_CLIENT_SECRET:
+        logger.error("Error: TRAKT_CLIENT_ID and TRAKT_CLIENT_SECRET must be set in .env")
+        return False
+
+    run.phase('trakt_auth')
+    trakt = session.trakt if session else TraktAPI(TRAKT_CLIENT_ID, TRAKT_CLIENT_SECRET)
+    try:
+        trakt.authenticate()
+    except Exception as e:
+        logger.error("Trakt Auth failed: %s", e)
+        return False
+    scraper = session.scraper if session else HDRezkaScraper(HDREZKA_USERNAME, HDREZKA_PASSWORD)
+    cache = scraper.cache
+
+    run.phase('watch_list')
+    if title.get('url'):
+        keys = [cache_key(title['url'])]
+    else:
+        keys = find_title_keys(cache, title['imdb_id'])
+        if not keys:
+            logger.error("%s is not in the cache, sync it by its HDRezka URL instead.", title['imdb_id'])
+            return False
+    progress = {'season': title['season'], 'episode': title['episode']} if title.get('episode') else None
+    date = datetime.strptime(title['date'], "%d-%m-%Y") if title.get('date') else None
+    cached_type = (cache.get_trakt_data(keys[0]) or {}).get('type')
+
+    items = []
+    if not (date and (progress or cached_type == 'movie')):
+        logger.info("Looking up %s on the HDRezka watch list...", ', '.join(keys))
+        items = scraper.get_watch_list_http(only=set(keys))
+    if not items:
+        if not date:
+            logger.error("%s is not on the HDRezka watch list, give the watch date (and season/episode) to sync it anyway.", ', '.join(keys))
+            return False
+        items = [{'url': key, 'title': (cache.get_trakt_data(key) or {}).get('title', key), 'progress': None, 'date': None}
+                 for key in keys]
+    # Same title under several URLs (TV-1/TV-2): the latest one wins, as in Phase 2
+    item = max(items, key=lambda it: it.get('date') or datetime.min)
+    if date:
+        item['date'] = date
+    if progress:
+        item['progress'] = progress
+
+    run.phase('phase1')
+    result = process_id_resolution(item, scraper, trakt)
+    if not result[0]:
+        logger.error("No IMDb ID found for %s.", item['url'])
+        return False
+    resolved = resolved_item(item, result, cache)
+    run.count(watch_list=1, resolved=1)
+
+    run.phase('trakt_progress')
+    imdb_id = resolved['imdb_id']
+    id_val = resolved['trakt_id'] or imdb_id
+    try:
+        before = trakt.get_last_activities() if session else None
+        entry = trakt.get_watched_entry(resolved['type'], id_val)
+    except Exception as e:
+        logger.error("\n[CRITICAL] Aborting Sync: %s", e)
+        return False
+    trakt_watched = {imdb_id: entry} if entry else {}
+
+    run.phase('plan')
+    final_sync_list, items_to_remove = plan_sync([resolved], trakt_watched, cache, resync, fix_mismatch)
+    run.count(to_sync=len(final_sync_list), to_remove=len(items_to_remove))
+
+    run.phase('phase2')
+    if session:
+        session.stage([item], replace=False)
+    if not final_sync_list:
+        logger.info("Nothing to sync.")
+        return
+    def removed():
+        # Whole-title removals are done once its history is empty, single
+        # episode ones once the episode is no longer watched
+        wipe = resync or any(it['type'] == 'movie' or it.get('wipe') or not it.get('progress') for it in items_to_remove)
+        if wipe:
+            return not trakt.get_history(id_val, type=f"{resolved['type']}s", limit=1)
+        season, episode = resolved['progress']['season'], resolved['progress']['episode']
+        return not any(sea['number'] == season and any(ep['number'] == episode for ep in sea['episodes'])
+                       for sea in trakt.get_show_progress(id_val))
+
+    added = push_history(trakt, final_sync_list, items_to_remove, resync, dry_run, events, removed)
+    run.count(added=added)
+    logger.info("Items Added to History: %s", added)
+    if dry_run:
+        return
+
+    run.phase('verify')
+    # Poll instead of one fixed wait, a single title usually shows up at once
+    deadline = time.monotonic() + PROPAGATION_WAIT_SECONDS
+    while True:
+        final = time.monotonic() >= deadline
+        after = trakt.get_last_activities() if session else None
+        entry = trakt.get_watched_entry(resolved['type'], id_val)
+        mismatch_count = verify_synced(final_sync_list, {imdb_id: entry} if entry else {}, quiet=not final)
+        if not mismatch_count or final:
+            break
+        time.sleep(VERIFY_POLL_SECONDS)
+    run.count(verify_mismatches=mismatch_count)
+    if session:
+        session.apply_title(imdb_id, entry, before, after)
+
+    if mismatch_count == 0:
+        logger.info("Verified: %s", resolved['title'])
+    else:
+        logger.warning("Verification of %s failed, check log.", resolved['title'])
+
+def search_cache(query, limit=50):
+    """'search' command: prints the cache entries matching every word of query."""
+    cache = Cache()
+    start_time = time.perf_counter()
+    cache.ensure_index()
+    index_ms = (time.perf_counter() - start_time) * 1000
+    start_time = time.perf_counter()
+    keys = cache.search(query)
+    query_ms = (time.perf_counter() - start_time) * 1000
+
+    for key in sorted(keys)[:limit]:
+        entry = cache.get_entry(key)
+        if isinstance(entry, dict):
+            trakt_data = entry.get('trakt_data') or {}
+            title = f"{trakt_data.get('title', '')} ({trakt_data.get('year', '?')})" if trakt_data else ''
+            print(f"{key}  {entry.get('id') or '-'}  {entry.get('status') or '-'}  {title}")
+        else:
+            print(f"{key}  {entry or '-'}")
+    shown = f", showing {limit}" if len(keys) > limit else ""
+    print(f"{len(keys)} matches in {query_ms:.1f} ms (index of {len(cache.data)} entries built in {index_ms:.0f} ms){shown}")
+
+def watch_date(value):
+    """argparse type: a DD-MM-YYYY watch date, as stored in the cache."""
+    try:
+        datetime.strptime(value, "%d-%m-%Y")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected DD-MM-YYYY, got {value!r}")
+    return value
+
+def bulk_edit(args):
+    """
+    'bulk' command: applies the same field changes to many cache entries (URLs,
+    a file of URLs, search matches) or a JSON {url: {field: value}} file, with
+    a single cache write.
+    """
+    cache = Cache()
+    if args.json:
+        with open(args.json, encoding='utf-8') as f:
+            updates = json.load(f)
+    else:
+        fields = {}
+        if args.status:
+            fields['status'] = '' if args.status == 'clear' else args.status
+        if args.date:
+            fields['date'] = args.date
+        if args.imdb_id:
+            fields['id'] = args.imdb_id
+
+        urls = list(args.urls)
+        if args.file:
+            f = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+            with f:
+                urls += [line.strip() for line in f if line.strip()]
+        if args.search:
+            urls += sorted(cache.search(args.search))
+        updates = {url: fields for url in urls}
+
+    if args.dry_run or args.bulk_dry_run:
+        missing = [url for url in updates if cache.get_entry(url) is None]
+        for url, fields in updates.items():
+            if url not in missing:
+                print(f"{url}  {fields}")
+        print(f"Would update {len(updates) - len(missing)} entries.")
+    else:
+        start_time = time.perf_counter()
+        count, missing = cache.bulk_update(updates)
+        print(f"Updated {count} entries in {(time.perf_counter() - start_time) * 1000:.0f} ms.")
+    if missing:
+        print(f"Skipped {len(missing)} URLs that are not in the cache:")
+        for url in missing:
+            print(f"  {url}")
+
+def add_title_arguments(parser, default=None):
+    """--url/--imdb/--season/--episode/--date of the single-title sync (top level and 'sync')."""
+    title_group = parser.add_mutually_exclusive_group()
+    title_group.add_argument('--url', default=default, help='Sync only this HDRezka title (any mirror): reads its watch list row and its Trakt history/progress only')
+    title_group.add_argument('--imdb', metavar='IMDB_ID', default=default, help='Same as --url, for a title already in the cache')
+    parser.add_argument('--season', type=int, default=default, help='With --url/--imdb: last watched season (with --episode), instead of the watch list')
+    parser.add_argument('--episode', type=int, default=default, help='With --url/--imdb: last watched episode of --season')
+    parser.add_argument('--date', dest='title_date', metavar='DD-MM-YYYY', type=watch_date, default=default, help='With --url/--imdb: watch date, DD-MM-YYYY. With it (and --season/--episode for shows) the watch list is not read')
+
+def run_sync_command(args):
+    global REMOVAL_SETTLE_SECONDS, PROPAGATION_WAIT_SECONDS
+    watch_list_mode = args.watch_list
+    browser_fallback = not args.no_browser_fallback
+    cassette = None
+    if args.record or args.replay:
+        # Playwright traffic can't be captured, stay on the HTTP paths
+        watch_list_mode = 'http'
+        browser_fallback = False
+        if args.record:
+            cassette = Cassette(args.record, RECORD)
+        else:
+            cassette = Cassette(args.replay, REPLAY, realtime=not args.replay_instant)
+            logger.info("Replaying %s recorded exchanges from %s", cassette.count, args.replay)
+            if args.replay_instant:
+                REMOVAL_SETTLE_SECONDS = 0
+                PROPAGATION_WAIT_SECONDS = 0
+        transport.cassette = cassette
+    
+    try:
+        title = None
+        if args.url or args.imdb:
+            title = {'url': args.url, 'imdb_id': args.imdb, 'season': args.season, 'episode': args.episode, 'date': args.title_date}
+        return start(resync=args.resync, headless=args.headless, fix_duplicates=args.fix_duplicates, fix_mismatch=args.fix_mismatch, dry_run=args.dry_run, parse_workers=args.parse_workers, browser_fallback=browser_fallback, watch_list_mode=watch_list_mode, profile=args.profile, title=title)
+    finally:
+        if cassette:
+            cassette.close()
+            if args.record:
+                logger.info("Recorded %s exchanges to %s", cassette.count, args.record)
+            elif cassette.remaining():
+                logger.warning("Replay finished with %s unused recorded exchanges", cassette.remaining())
+
+class DaemonControl:
+    """What the control API (utils.auth_server.ControlServer) can see and do in the daemon."""
+    def __init__(self, session, scheduler):
+        self.session = session
+        self.scheduler = scheduler
+
+    def sync(self, full=False):
+        # A queued full run stays full when an incremental request comes in after it
+        if full:
+            self.scheduler.trigger(sync=True, full=True)
+        else:
+            self.scheduler.trigger(sync=True)
+
+    def sync_url(self, url):
+        self.scheduler.trigger(urls=[url])
+
+    def status(self):
+        status = {
+            'running': self.scheduler.running,
+            'next_run': self.scheduler.next_run,
+            'failures': self.scheduler.failures,
+            'last_result': self.session.last_result,
+        }
+        if self.scheduler.running:
+            status.update(self.session.events.snapshot())
+        return status
+
+    def search(self, query, limit):
+        cache = self.session.scraper.cache
+        keys = sorted(cache.search(query))
+        return {'total': len(keys), 'entries': {key: cache.get_entry(key) for key in keys[:limit]}}
+
+    def metrics(self):
+        return metrics.prometheus()
+
+def run_daemon(args):
+    """
+    'daemon' command: keeps one SyncSession warm and runs incremental syncs
+    every --interval seconds (with jitter, backing off after failures) until
+    SIGTERM/Ctrl+C. Every --full-every'th run compares every item again.
+    The control API on --control-port queues syncs and reports status.
+    """
+    if not TRAKT_CLIENT_ID or not TRAKT_CLIENT_SECRET:
+        logger.error("Error: TRAKT_CLIENT_ID and TRAKT_CLIENT_SECRET must be set in .env")
+        return
+    watch_list_mode = args.watch_list
+    session = SyncSession(headless=args.headless, parse_workers=args.parse_workers)
+    runs = 0
+
+    def job(sync=False, full=False, urls=None):
+        # Scheduled runs (no arguments) and POST /sync do the full/incremental
+        # rotation, POST /sync/url adds title syncs; queued together, both run
+        nonlocal runs
+        ok = True
+        if sync or full or not urls:
+            full = full or (args.full_every > 0 and runs % args.full_every == 0)
+            runs += 1
+            ok = run(f"{'full' if full else 'incremental'} sync #{runs}", incremental=not full)
+        for url in dict.fromkeys(urls or []):
+            ok = run(f"sync of {url}", title={'url': url}) and ok
+        return ok
+
+    def run(label, **mode):
+        logger.info("\n=== Daemon: %s ===", label)
+        result = start(fix_mismatch=args.fix_mismatch, dry_run=args.dry_run, browser_fallback=not args.no_browser_fallback,
+                       watch_list_mode=watch_list_mode, profile=args.profile, session=session, **mode)
+        logger.info("Daemon: %s %s in %.1fs.", label, 'finished' if result['ok'] else 'FAILED', result['elapsed'])
+        return result['ok']
+
+    scheduler = Scheduler(job, args.interval, jitter=args.jitter, max_backoff=args.max_backoff)
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    control = None
+    if args.control_port:
+        try:
+            control = ControlServer(DaemonControl(session, scheduler), port=args.control_port).start()
+            # GET /cache searches the index, build it before the first request
+            threading.Thread(target=session.scraper.cache.ensure_index, daemon=True).start()
+        except OSError as e:
+            logger.error("Control API not started, port %s: %s", args.control_port, e)
+    logger.info("Sync daemon started (every %s, +-%.0f%%).", format_delay(args.interval), args.jitter * 100)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Sync daemon stopped.")
+        if control:
+            control.stop()
+        session.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Sync HDRezka history to Trakt")
@@ -912,8 +1533,67 @@ if __name__ == "__main__":
     parser.add_argument('--fix-duplicates', action='store_true', help='Scan and remove duplicate history entries')
     parser.add_argument('--fix-mismatch', action='store_true', help='Force wipe and resync if Trakt Last Watched Date does not match HDRezka')
     parser.add_argument('--dry-run', action='store_true', help='Simulate run without making changes to Trakt')
+    parser.add_argument('--no-browser-fallback', action='store_true', help='Do not retry items without an IMDb link in a headless browser')
+    parser.add_argument('--watch-list', choices=['browser', 'http'], default='browser', help='Fetch the HDRezka watch list with Playwright (default) or plain HTTP')
+    parser.add_argument('--profile', action='store_true', help='Profile each phase (cProfile + tracemalloc) and write reports and a collapsed-stack file to profile/')
+    parser.add_argument('--parse-workers', type=int, default=0, help='Parse HDRezka pages in N worker processes (0 = on the resolver threads)')
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', metavar='CASSETTE', help='Record all HTTP traffic of this run to a cassette (.jsonl.gz). Uses the HTTP watch list.')
+    cassette_group.add_argument('--replay', metavar='CASSETTE', help='Serve HTTP traffic from a recorded cassette instead of the network')
+    parser.add_argument('--replay-instant', action='store_true', help='Replay without the recorded latency and skip the settle waits')
+    add_title_arguments(parser)
+    parser.add_argument('--log-level', default=LOG_LEVEL, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help='Console and log file level (default: LOG_LEVEL or INFO)')
+
+    # No command (or 'sync') runs the sync with the options above
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    search_parser = subparsers.add_parser('search', help='Search the local cache by title, URL slug, year, IMDb/Trakt ID or status')
+    search_parser.add_argument('query', nargs='+', help='Words to match (prefix or substring)')
+    search_parser.add_argument('--limit', type=int, default=50, help='Entries to print (default: 50)')
+    sync_parser = subparsers.add_parser('sync', help='Run the sync with the options above (the default); with --url/--imdb only for one title')
+    # SUPPRESS: options given before 'sync' are not reset by its defaults
+    add_title_arguments(sync_parser, default=argparse.SUPPRESS)
+    bulk_parser = subparsers.add_parser('bulk', help='Set status/date/IMDb ID of many cache entries with a single cache write')
+    bulk_parser.add_argument('urls', nargs='*', help='HDRezka URLs (any mirror) or cache keys')
+    bulk_parser.add_argument('--file', metavar='PATH', help="Also read URLs from PATH, one per line ('-' for stdin)")
+    bulk_parser.add_argument('--search', metavar='QUERY', help='Also select the entries matching QUERY (as in search)')
+    bulk_parser.add_argument('--json', metavar='PATH', help='Apply a JSON {url: {"status"|"date"|"id": value}} file instead')
+    bulk_parser.add_argument('--status', choices=['active', 'completed', 'ignored', 'clear'], help='New status (clear = no status)')
+    bulk_parser.add_argument('--date', type=watch_date, help='New watch date, DD-MM-YYYY')
+    bulk_parser.add_argument('--imdb-id', help='New IMDb ID')
+    bulk_parser.add_argument('--dry-run', dest='bulk_dry_run', action='store_true', help='Print the changes without writing them (as does the global --dry-run)')
+    daemon_parser = subparsers.add_parser('daemon', help='Keep Trakt/HDRezka sessions and state warm and run incremental syncs on a schedule (uses the sync options above)')
+    daemon_parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help=f'Seconds between syncs (default: {DEFAULT_INTERVAL})')
+    daemon_parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help=f'Random spread of the interval as a fraction (default: {DEFAULT_JITTER})')
+    daemon_parser.add_argument('--max-backoff', type=float, default=MAX_BACKOFF_SECONDS, help=f'Longest wait after repeated failures, in seconds (default: {MAX_BACKOFF_SECONDS})')
+    daemon_parser.add_argument('--control-port', type=int, default=CONTROL_PORT, help='Port of the local control API, 0 = off (default: CONTROL_PORT or 8765)')
+    daemon_parser.add_argument('--full-every', type=int, default=12, help='Compare every item again on every Nth run, 0 = only the first (default: 12)')
     
     args = parser.parse_args()
-    
-    start(resync=args.resync, headless=args.headless, fix_duplicates=args.fix_duplicates, fix_mismatch=args.fix_mismatch, dry_run=args.dry_run)
+    setup_logging(level=args.log_level)
 
+    if args.command == 'search':
+        search_cache(' '.join(args.query), args.limit)
+    elif args.command == 'daemon':
+        if args.resync or args.fix_duplicates or args.record or args.replay or args.url or args.imdb:
+            daemon_parser.error("--resync, --fix-duplicates, --record, --replay, --url and --imdb are for single runs")
+        run_daemon(args)
+    elif args.command == 'bulk':
+        if args.json and (args.status or args.date or args.imdb_id):
+            bulk_parser.error("--json can't be combined with --status/--date/--imdb-id")
+        if not args.json and not (args.status or args.date or args.imdb_id):
+            bulk_parser.error("nothing to change, give --status, --date, --imdb-id or --json")
+        if not args.json and not (args.urls or args.file or args.search):
+            bulk_parser.error("no entries selected, give URLs, --file or --search")
+        try:
+            bulk_edit(args)
+        except ValueError as e: # Unknown fields in --json
+            bulk_parser.error(str(e))
+    else:
+        if (args.season is None) != (args.episode is None):
+            parser.error("--season and --episode go together")
+        if (args.season is not None or args.title_date) and not (args.url or args.imdb):
+            parser.error("--season/--episode/--date need --url or --imdb")
+        if (args.url or args.imdb) and args.fix_duplicates:
+            parser.error("--fix-duplicates scans the whole cache, it can't be combined with --url/--imdb")
+        if not run_sync_command(args)['ok']:
+            sys.exit(1)
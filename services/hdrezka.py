@@ -1,11 +1,46 @@
 from playwright.sync_api import sync_playwright
-import base64
-import re
+from playwright.async_api import async_playwright
+import asyncio
+import logging
+import os
+import threading
+import time
 import requests
-from utils.cache import Cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utils.cache import Cache, cache_key
+from utils.http_cache import HttpCache
+from utils.singleflight import singleflight
+from utils.transport import transport
+from utils.metrics import metrics, endpoint_template
+from services.rezka_parser import (find_imdb_id, find_next_page, split_watch_list_rows,
+                                   parse_watch_list_rows)
+
+logger = logging.getLogger(__name__)
+
+# Comma separated mirror list, e.g. HDREZKA_MIRRORS=hdrezka-home.tv,rezka.ag
+DEFAULT_MIRRORS = 'hdrezka-home.tv'
+MIRROR_PROBE_TIMEOUT = 5
+
+# Item page streaming: scan as chunks arrive, give up after STREAM_MAX_BYTES
+STREAM_CHUNK_SIZE = 16 * 1024
+STREAM_OVERLAP = 512
+STREAM_MAX_BYTES = 1024 * 1024
+
+# Rows per task when the watch list is parsed in the process pool
+PARSE_BATCH_ROWS = 100
+
+# Browser fallback for JS-only item pages: parallel pages in one context
+BROWSER_RESOLVE_PAGES = 4
+BROWSER_RESOLVE_TIMEOUT = 20000
+# Not needed to find the IMDb link, aborted to keep page loads short
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font', 'stylesheet'}
+IMDB_LINK_SELECTOR = 'a[href*="/help/"], a[href*="imdb.com/title/"]'
+
+# Safety stop for /continue/ pagination
+MAX_LIST_PAGES = 200
 
 class HDRezkaScraper:
-    def __init__(self, username, password, headless=False):
+    def __init__(self, username, password, headless=False, parse_workers=0):
         self.username = username
         self.password = password
         # self.headless = headless # User requested ALWAYS headless
@@ -14,6 +49,125 @@ class HDRezkaScraper:
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        # Requests go through the shared transport: pooled keep-alive connections
+        # per mirror host, retries and a circuit breaker that feeds failover
+        # Conditional response cache for item pages (re-resolution after remaps)
+        self.http_cache = HttpCache()
+
+        # Mirrors: probed once per run, fastest healthy one first
+        self.mirrors = parse_mirrors(os.getenv('HDREZKA_MIRRORS', DEFAULT_MIRRORS))
+        self.mirror_lock = threading.Lock()
+        self.mirror_order = None
+        self.dead_mirrors = set()
+
+        # Cookies of the logged-in browser session, reused by the async fallback
+        self.storage_state = None
+
+        # Optional process pool for the CPU-bound parsing (regex/base64/dates),
+        # so it doesn't fight the fetch threads for the GIL on big imports
+        self.parse_pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers else None
+
+    def close(self):
+        self.http_cache.flush()
+        if self.parse_pool:
+            self.parse_pool.shutdown()
+            self.parse_pool = None
+
+    def _parse(self, fn, *args):
+        """
+        Runs a rezka_parser function inline or in the parse pool. Only for
+        whole pages: per-chunk scans are cheaper inline than a round trip.
+        """
+        if self.parse_pool:
+            return self.parse_pool.submit(fn, *args).result()
+        return fn(*args)
+
+    async def _parse_async(self, fn, *args):
+        """_parse() from the browser's event loop, without blocking it."""
+        if self.parse_pool:
+            return await asyncio.get_running_loop().run_in_executor(self.parse_pool, fn, *args)
+        return fn(*args)
+
+    def parse_watch_list(self, page_html):
+        """Parses the /continue/ page, spread over the parse pool in row batches if enabled."""
+        rows = split_watch_list_rows(page_html)
+        if not self.parse_pool:
+            return parse_watch_list_rows(rows)
+        batches = [rows[i:i + PARSE_BATCH_ROWS] for i in range(0, len(rows), PARSE_BATCH_ROWS)]
+        items = []
+        for parsed in self.parse_pool.map(parse_watch_list_rows, batches):
+            items.extend(parsed)
+        return items
+
+    def select_mirror(self):
+        """
+        Probes all configured mirrors in parallel and orders them by latency.
+        Unreachable or 5xx mirrors go to the back of the list.
+        Returns the base URL to use for this run.
+        """
+        def probe(base):
+            start = time.monotonic()
+            try:
+                response = transport.request('GET', base + '/', headers=self.headers, max_retries=0,
+                                             timeout=MIRROR_PROBE_TIMEOUT, stream=True, service='hdrezka')
+                response.close()
+                if response.status_code < 500:
+                    return base, time.monotonic() - start
+            except requests.RequestException:
+                pass
+            return base, None
+
+        if len(self.mirrors) == 1:
+            results = [(self.mirrors[0], 0.0)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.mirrors)) as executor:
+                results = list(executor.map(probe, self.mirrors))
+
+        healthy = sorted([r for r in results if r[1] is not None], key=lambda r: r[1])
+        for base, latency in healthy:
+            logger.info("   [Mirror] %s: %.0f ms", base, latency * 1000)
+        for base, latency in results:
+            if latency is None:
+                logger.warning("   [Mirror] %s: unreachable", base)
+
+        with self.mirror_lock:
+            self.mirror_order = [r[0] for r in healthy] + [r[0] for r in results if r[1] is None]
+            self.dead_mirrors = set()
+        logger.info("Using mirror: %s", self.mirror_order[0])
+        return self.mirror_order[0]
+
+    def reset_mirrors(self):
+        """Forgets the mirror order and failures, the next request probes again (long-lived scrapers)."""
+        with self.mirror_lock:
+            self.mirror_order = None
+            self.dead_mirrors = set()
+
+    @property
+    def base_url(self):
+        """Current mirror base URL (probes on first use)."""
+        if self.mirror_order is None:
+            self.select_mirror()
+        with self.mirror_lock:
+            for base in self.mirror_order:
+                if base not in self.dead_mirrors:
+                    return base
+            # Everything failed once this run, start over rather than give up
+            self.dead_mirrors = set()
+            return self.mirror_order[0]
+
+    def failover(self, failed_base):
+        """Marks a mirror as failed for this run. Returns the next base URL or None."""
+        with self.mirror_lock:
+            self.dead_mirrors.add(failed_base)
+            remaining = [b for b in self.mirror_order if b not in self.dead_mirrors]
+        if not remaining:
+            return None
+        logger.warning("   [Mirror] %s failed, switching to %s", failed_base, remaining[0])
+        return remaining[0]
+
+    def to_mirror(self, url, base=None):
+        """Rewrites an HDRezka URL (any mirror or a bare path) onto the given/current mirror."""
+        return (base or self.base_url) + cache_key(url)
 
     def get_watch_list(self):
         """
@@ -23,189 +177,300 @@ class HDRezkaScraper:
         items = []
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=self.headless)
-            context = browser.new_context()
+            # Cookies of an earlier run of this scraper (daemon) skip the login
+            context = browser.new_context(storage_state=self.storage_state)
             page = context.new_page()
             
-            print("Opening HDRezka...")
-            try:
-                page.goto("https://hdrezka-home.tv/", timeout=30000)
-            except Exception as e:
-                print(f"Error opening page: {e}")
-                browser.close()
-                return []
+            logger.info("Opening HDRezka...")
+            base = self.base_url
+            while True:
+                try:
+                    page.goto(f"{base}/", timeout=30000)
+                    break
+                except Exception as e:
+                    logger.error("Error opening page: %s", e)
+                    base = self.failover(base)
+                    if not base:
+                        browser.close()
+                        return []
             
             # Login
-            print("Logging in...")
-            try:
-                # Click login button to open modal
-                page.click('.b-tophead__login', timeout=5000)
-                page.fill('#login_name', self.username)
-                page.fill('#login_password', self.password)
-                page.press('#login_password', 'Enter')
-                
-                # Wait for login to complete (reduced timeout as requested)
-                page.wait_for_selector('.b-tophead-logout', timeout=5000)
-                print("Logged in successfully.")
-            except Exception as e:
-                print(f"Login failed or already logged in: {e}")
-            
-            print("Navigating to 'Continue Watching'...")
-            page.goto("https://hdrezka-home.tv/continue/")
-            page.wait_for_load_state('networkidle')
-            
-            item_rows = page.locator('div.b-videosaves__list_item').all()
-            print(f"Found {len(item_rows)} items in list.")
-            
-            for row in item_rows:
-                title_link = row.locator('.td.title a').first
-                if title_link.count() == 0:
-                    continue
-                    
-                url = title_link.get_attribute('href')
-                if not url:
-                    continue
-                
-                title = title_link.inner_text()
-                full_url = url if url.startswith('http') else f"https://hdrezka-home.tv{url}"
-                
-                # Extract Date
-                date_node = row.locator('.td.date')
-                date_text = ""
-                if date_node.count() > 0:
-                    date_text = date_node.inner_text().strip()
-                
-                watched_date = None
-                
+            if self.storage_state is not None and page.query_selector('.b-tophead-logout'):
+                logger.info("Still logged in.")
+            else:
+                logger.info("Logging in...")
                 try:
-                    from datetime import datetime, timedelta
-                    import re
-                    now = datetime.now()
-                    
-                    found_date_str = date_text
-                    
-                    # Fallback: Search in row text if specific node empty
-                    if not found_date_str:
-                        row_text = row.inner_text()
-                        # Matches DD.MM.YYYY or DD-MM-YYYY
-                        date_match = re.search(r'(\d{2}[.-]\d{2}[.-]\d{4})', row_text)
-                        if date_match:
-                            found_date_str = date_match.group(1)
-                            print(f"[DEBUG] Found date via regex: {found_date_str}")
-
-                    if 'сегодня' in found_date_str.lower():
-                        watched_date = now
-                    elif 'вчера' in found_date_str.lower():
-                        watched_date = now - timedelta(days=1)
-                    else:
-                        # Try parsing various formats
-                        # 19.12.2025 or 19-12-2025
-                        clean_date = found_date_str.replace('.', '-')
-                        # Regex to ensure we have DD-MM-YYYY
-                        match = re.search(r'(\d{2}-\d{2}-\d{4})', clean_date)
-                        if match:
-                            watched_date = datetime.strptime(match.group(1), "%d-%m-%Y")
-                            
-                    print(f"[DEBUG] '{title}' -> Raw: '{date_text}' | Parsed: {watched_date}")
-                            
+                    # Click login button to open modal
+                    page.click('.b-tophead__login', timeout=5000)
+                    page.fill('#login_name', self.username)
+                    page.fill('#login_password', self.password)
+                    page.press('#login_password', 'Enter')
+
+                    # Wait for login to complete (reduced timeout as requested)
+                    page.wait_for_selector('.b-tophead-logout', timeout=5000)
+                    logger.info("Logged in successfully.")
                 except Exception as e:
-                    print(f"[DEBUG] Date parse error for '{title}': {e}")
-                    pass # Keep None if parse fails
-
-                # Extract Progress (Season/Episode)
-                # Text is in .td.info, but we need to ignore .info-holder (which is "watch more")
-                # We can grab inner_text and parse, or just grab the first text node.
-                # inner_text returns "1 сезон 10 серия (Diva Universal) \n смотреть ещё..."
-                
-                info_text = row.locator('.td.info').inner_text()
-                # Clean up newlines
-                info_text = info_text.split('\n')[0].strip()
-                
-                # Regex for "X сезон Y серия"
-                progress = None
-                # Check for "X сезон Y серия"
-                has_season = re.search(r'(\d+)\s+сезон\s+(\d+)\s+серия', info_text)
-                if has_season:
-                    progress = {
-                        'season': int(has_season.group(1)),
-                        'episode': int(has_season.group(2))
-                    }
-                
-                items.append({
-                    'url': full_url, 
-                    'title': title, 
-                    'progress': progress,
-                    'date': watched_date
-                })
+                    logger.warning("Login failed or already logged in: %s", e)
+            
+            logger.info("Navigating to 'Continue Watching'...")
+            rows = []
+            next_url = f"{base}/continue/"
+            for _ in range(MAX_LIST_PAGES):
+                page.goto(self.to_mirror(next_url, base))
+                page.wait_for_load_state('networkidle')
+                # One round-trip for the whole page instead of several locator calls per row
+                content = page.content()
+                rows.extend(self.parse_watch_list(content))
+                next_url = find_next_page(content)
+                if not next_url:
+                    break
+            items = self._watch_list_items(rows, base)
 
+            # Keep the session so the fallback resolver doesn't log in again
+            self.storage_state = context.storage_state()
             browser.close()
         return items
 
+    def get_watch_list_http(self, only=None):
+        """
+        Same as get_watch_list without a browser: logs in through /ajax/login/
+        and fetches the /continue/ pages over the shared transport (the session
+        keeps the login cookies). Much lighter on big lists, but breaks if the
+        site starts gating the list behind JS.
+        only: cache keys to look for; returns just those rows and stops paging
+        once all of them were seen (recent titles are on the first page).
+        """
+        base = self.base_url
+        logger.info("Logging in to HDRezka (HTTP)...")
+        headers = dict(self.headers, **{'X-Requested-With': 'XMLHttpRequest'})
+        data = {'login_name': self.username, 'login_password': self.password, 'login_not_save': '0'}
+        while True:
+            try:
+                response = transport.request('POST', f"{base}/ajax/login/", headers=headers, data=data, timeout=30, service='hdrezka')
+                break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                logger.error("Error opening page: %s", e)
+                base = self.failover(base)
+                if not base:
+                    return []
+        try:
+            if not response.json().get('success'):
+                logger.error("Login failed: %s", response.json().get('message'))
+        except ValueError:
+            logger.error("Login failed: status %s", response.status_code)
+
+        logger.info("Fetching 'Continue Watching'...")
+        rows = []
+        next_url = f"{base}/continue/"
+        for _ in range(MAX_LIST_PAGES):
+            response = transport.request('GET', self.to_mirror(next_url, base), headers=self.headers, timeout=30, service='hdrezka')
+            if response.status_code != 200:
+                logger.error("Error fetching %s: status %s", next_url, response.status_code)
+                break
+            page_rows = self.parse_watch_list(response.text)
+            if only is not None:
+                page_rows = [row for row in page_rows if cache_key(row['url']) in only]
+            rows.extend(page_rows)
+            next_url = find_next_page(response.text)
+            if not next_url or (only is not None and len(rows) >= len(only)):
+                break
+        return self._watch_list_items(rows, base)
+
+    def _watch_list_items(self, rows, base):
+        """Parsed /continue/ rows -> watch list items on the current mirror."""
+        logger.info("Found %s items in list.", len(rows))
+        items = []
+        for row in rows:
+            title = row['title']
+            logger.debug("[DEBUG] '%s' -> Raw: '%s' | Parsed: %s", title, row['date_text'], row['date'])
+            items.append({
+                'url': self.to_mirror(row['url'], base), 
+                'title': title, 
+                'progress': row['progress'],
+                'date': row['date']
+            })
+        return items
+
+    @singleflight
     def get_imdb_id(self, url):
         """
         Fetches the IMDB ID for a given URL.
-        Checks cache first. If not cached, scrapes using requests.
+        Checks cache first. If not cached, streams the page over the pooled session
+        and stops reading as soon as the IMDb link has been seen.
         """
         # Check cache
         cached_id = self.cache.get_imdb_id(url)
         if cached_id:
             return cached_id, True
 
-        # Scrape
+        # Scrape (on the current mirror, failing over on connection errors)
+        base = self.base_url
+        while base:
+            try:
+                imdb_id = self._stream_imdb_id(self.to_mirror(url, base))
+                if imdb_id:
+                    self.cache.set_imdb_id(url, imdb_id)
+                    return imdb_id, False
+                break
+            except (requests.ConnectionError, requests.Timeout):
+                # Retries exhausted or breaker open for this mirror (CircuitOpenError)
+                base = self.failover(base)
+            except Exception as e:
+                logger.error("   [HDRezka] Error fetching %s: %s", url, e)
+                break
+            
+        return None, False
+
+    def _stream_imdb_id(self, url):
+        """
+        Reads the item page chunk by chunk and scans each chunk as it arrives.
+        The IMDb link sits in the info table near the top of the page, so most of
+        the ~500 KB page (comments, player scripts) never has to be downloaded.
+        """
+        meta, cached_body = self.http_cache.get(url)
+        headers = dict(self.headers)
+        headers.update(self.http_cache.validators(meta))
+
+        response = transport.request('GET', url, headers=headers, timeout=10, stream=True, service='hdrezka')
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            if response.status_code == 200:
-                html = response.text
-                
-                # Look for base64 obfuscated link
-                # Pattern: href=".../help/BASE64..."
-                # Regex to find the base64 string
-                # We use [^/"']+ to match until a separator
-                help_links = re.findall(r'/help/([^/"\'\s]+)', html)
-                
-                import urllib.parse
-                
-                for b64_part in help_links:
+            if response.status_code == 304 and cached_body is not None:
+                # Unchanged since last time, parse the local copy
+                metrics.inc('cache_lookups_total', cache='http', result='revalidated')
+                self.http_cache.touch(url)
+                return self._parse(find_imdb_id, cached_body)
+            if response.status_code != 200:
+                return None
+
+            chunks = []
+            tail = b''
+            read = 0
+            imdb_id = None
+            complete = False
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                # Keep an overlap so links split across chunk borders still match
+                window = tail + chunk
+                imdb_id = find_imdb_id(window, False)
+                if imdb_id:
+                    break
+                tail = window[-STREAM_OVERLAP:]
+                read += len(chunk)
+                if read >= STREAM_MAX_BYTES:
+                    break
+            else:
+                # Body ended, the held-back tail can be trusted now
+                complete = True
+                imdb_id = find_imdb_id(tail)
+
+            body = b''.join(chunks)
+            metrics.inc('http_response_bytes_total', len(body), service='hdrezka', endpoint=endpoint_template(url))
+            # The prefix we read is enough to re-resolve from on a later 304
+            self.http_cache.put(url, body, response.headers, complete=complete)
+            return imdb_id
+        finally:
+            # Closing early drops the rest of the body instead of draining it
+            response.close()
+
+
+    def resolve_with_browser(self, urls, pages=BROWSER_RESOLVE_PAGES):
+        """
+        Fallback for item pages where the plain HTTP fetch found no IMDb link
+        (the link is rendered by JS on some pages).
+        Loads all URLs in one batch over a bounded pool of pages sharing one
+        logged-in browser context. Found IDs are written to the cache.
+        Returns {url: imdb_id} for the URLs that were resolved.
+        """
+        if not urls:
+            return {}
+        logger.info("Resolving %s items in the browser (%s pages)...", len(urls), pages)
+        return asyncio.run(self._resolve_with_browser(list(urls), pages))
+
+    async def _resolve_with_browser(self, urls, pages):
+        found = {}
+        queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+
+        async def block_resources(route):
+            if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        async def worker(context):
+            page = await context.new_page()
+            try:
+                while True:
                     try:
-                        # Fix padding if needed, though usually fine if matched correctly
-                        # Strip trailing slash if caught
-                        b64_part = b64_part.rstrip('/')
-                        
-                        # Pad
-                        b64_part += '=' * (-len(b64_part) % 4)
-                        
-                        decoded_bytes = base64.b64decode(b64_part)
-                        decoded_str = decoded_bytes.decode('utf-8')
-                        
-                        # It might be URL encoded
-                        decoded_url = urllib.parse.unquote(decoded_str)
-                        
-                        if 'imdb.com/title/tt' in decoded_url:
-                            match = re.search(r'(tt\d+)', decoded_url)
-                            if match:
-                                imdb_id = match.group(1)
-                                self.cache.set_imdb_id(url, imdb_id)
-                                return imdb_id, False
-                    except Exception:
-                        continue
-                
-                # Fallback: check for plain text or standard links
-                # Some mirrors or old pages might have direct links
-                # Also check specific span structures if known
-                # <span class="imdb">IMDb: <span>7.8</span></span> - NO, that's rating
-                
-                match = re.search(r'imdb\.com/title/(tt\d+)', html)
-                if match:
-                     imdb_id = match.group(1)
-                     self.cache.set_imdb_id(url, imdb_id)
-                     return imdb_id, False
-                     
-                # Look for "IMDb" text and see if there is an ID nearby in a data attribute?
-                # Sometimes it's in a hidden field or script.
-                pass
+                        url = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    imdb_id = await self._resolve_page(page, url)
+                    if imdb_id:
+                        found[url] = imdb_id
+                        self.cache.set_imdb_id(url, imdb_id)
+            finally:
+                await page.close()
 
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=self.headless)
+            try:
+                context = await browser.new_context(storage_state=self.storage_state)
+                await context.route('**/*', block_resources)
+                if self.storage_state is None:
+                    await self._login_async(context)
+                await asyncio.gather(*[worker(context) for _ in range(min(pages, len(urls)))])
+            finally:
+                await browser.close()
+
+        logger.info("Browser fallback resolved %s/%s items.", len(found), len(urls))
+        return found
+
+    async def _resolve_page(self, page, url):
+        try:
+            await page.goto(self.to_mirror(url), wait_until='domcontentloaded',
+                            timeout=BROWSER_RESOLVE_TIMEOUT)
+            try:
+                await page.wait_for_selector(IMDB_LINK_SELECTOR, state='attached', timeout=5000)
+            except Exception:
+                pass # Parse whatever rendered
+            # Rendered hrefs first (resolved by JS), then the whole DOM
+            hrefs = await page.eval_on_selector_all('a[href]', 'els => els.map(e => e.href)')
+            imdb_id = find_imdb_id('\n'.join(hrefs).encode('utf-8'))
+            if not imdb_id:
+                imdb_id = await self._parse_async(find_imdb_id, (await page.content()).encode('utf-8'))
+            return imdb_id
         except Exception as e:
-            # print(f"Error fetching {url}: {e}")
-            pass
-            
-        return None, False
+            logger.warning("   [Browser] %s: %s", url, e)
+            return None
+
+    async def _login_async(self, context):
+        """Same login as get_watch_list, for when the fallback runs on its own."""
+        if not self.username or not self.password:
+            return
+        page = await context.new_page()
+        try:
+            await page.goto(f"{self.base_url}/", timeout=30000)
+            await page.click('.b-tophead__login', timeout=5000)
+            await page.fill('#login_name', self.username)
+            await page.fill('#login_password', self.password)
+            await page.press('#login_password', 'Enter')
+            await page.wait_for_selector('.b-tophead-logout', timeout=5000)
+        except Exception as e:
+            logger.warning("Login failed or already logged in: %s", e)
+        finally:
+            await page.close()
 
+def parse_mirrors(value):
+    """'a.tv, https://b.tv/' -> ['https://a.tv', 'https://b.tv']"""
+    mirrors = []
+    for part in value.split(','):
+        part = part.strip().rstrip('/')
+        if not part:
+            continue
+        if not part.startswith('http'):
+            part = 'https://' + part
+        mirrors.append(part)
+    return mirrors
@@ -0,0 +1,167 @@
+"""
+Pure HTML parsing for HDRezka pages.
+
+Nothing in here touches the network or Playwright, so the functions can run
+inline on the resolver threads or inside ProcessPoolExecutor workers
+(see HDRezkaScraper(parse_workers=N)).
+"""
+import base64
+import html
+import re
+import urllib.parse
+from datetime import datetime, timedelta
+
+# Precompiled so resolver threads don't hit the re module cache on every page
+HELP_LINK_RE = re.compile(rb'/help/([^/"\'\s]+)')
+IMDB_URL_RE = re.compile(r'imdb\.com/title/(tt\d+)')
+IMDB_URL_BYTES_RE = re.compile(rb'imdb\.com/title/(tt\d+)')
+
+ROW_START_RE = re.compile(r'<div id="videosave-\d+" class="b-videosaves__list_item">')
+ROW_TITLE_RE = re.compile(r'<div class="td title">\s*<a href="([^"]+)"[^>]*>(.*?)</a>', re.S)
+ROW_DATE_RE = re.compile(r'<div class="td date">(.*?)</div>', re.S)
+ROW_INFO_RE = re.compile(r'<div class="td info">(.*?)(?:<span class="info-holder"|</div>)', re.S)
+TAG_RE = re.compile(r'<[^>]+>')
+# Pagination: <a href=".../continue/page/2/"><span class="b-navigation__next i-sprt"></span></a>
+NEXT_PAGE_RE = re.compile(r'<a href="([^"]+)"[^>]*>\s*<span class="b-navigation__next')
+
+# Matches DD.MM.YYYY or DD-MM-YYYY
+DATE_IN_TEXT_RE = re.compile(r'(\d{2}[.-]\d{2}[.-]\d{4})')
+DATE_DASHED_RE = re.compile(r'(\d{2}-\d{2}-\d{4})')
+# "X сезон Y серия"
+PROGRESS_RE = re.compile(r'(\d+)\s+сезон\s+(\d+)\s+серия')
+
+
+def find_imdb_id(data, complete=True):
+    """
+    Scans page bytes for an IMDb ID.
+    Looks at the base64 obfuscated /help/ links first, then plain imdb.com links.
+    With complete=False (a streamed chunk) matches touching the end of the buffer
+    are skipped, they may be cut in half and decode to a shorter ID.
+    """
+    end = len(data) if complete else len(data) - 1
+    # Pattern: href=".../help/BASE64..."
+    # We use [^/"']+ to match until a separator
+    for match in HELP_LINK_RE.finditer(data):
+        if match.end() > end:
+            continue
+        b64_part = match.group(1)
+        try:
+            # Pad
+            b64_part += b'=' * (-len(b64_part) % 4)
+            decoded_str = base64.b64decode(b64_part).decode('utf-8')
+
+            # It might be URL encoded
+            decoded_url = urllib.parse.unquote(decoded_str)
+
+            id_match = IMDB_URL_RE.search(decoded_url)
+            if id_match:
+                return id_match.group(1)
+        except Exception:
+            continue
+
+    # Fallback: check for plain text or standard links
+    # Some mirrors or old pages might have direct links
+    for match in IMDB_URL_BYTES_RE.finditer(data):
+        if match.end() <= end:
+            return match.group(1).decode('ascii')
+    return None
+
+
+def parse_watch_date(date_text, row_text='', now=None):
+    """
+    'сегодня' / 'вчера' / 'DD-MM-YYYY' (or DD.MM.YYYY) -> datetime, None if unknown.
+    row_text is searched for a date if the date cell is empty.
+    """
+    now = now or datetime.now()
+    found_date_str = date_text
+
+    # Fallback: Search in row text if specific node empty
+    if not found_date_str:
+        date_match = DATE_IN_TEXT_RE.search(row_text)
+        if date_match:
+            found_date_str = date_match.group(1)
+
+    if 'сегодня' in found_date_str.lower():
+        return now
+    if 'вчера' in found_date_str.lower():
+        return now - timedelta(days=1)
+
+    # 19.12.2025 or 19-12-2025
+    clean_date = found_date_str.replace('.', '-')
+    match = DATE_DASHED_RE.search(clean_date)
+    if match:
+        return datetime.strptime(match.group(1), "%d-%m-%Y")
+    return None
+
+
+def parse_progress(info_text):
+    """'1 сезон 10 серия (Diva Universal)' -> {'season': 1, 'episode': 10}, else None."""
+    has_season = PROGRESS_RE.search(info_text)
+    if has_season:
+        return {
+            'season': int(has_season.group(1)),
+            'episode': int(has_season.group(2))
+        }
+    return None
+
+
+def split_watch_list_rows(page_html):
+    """Splits the /continue/ page into per-row HTML fragments (header row excluded)."""
+    starts = [m.start() for m in ROW_START_RE.finditer(page_html)]
+    rows = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(page_html)
+        rows.append(page_html[start:end])
+    return rows
+
+
+def parse_watch_list_rows(rows, now=None):
+    """
+    Parses row fragments from the /continue/ page.
+    Returns a list of dicts: {'url', 'title', 'date_text', 'date', 'progress'}
+    'url' is the href as found (absolute or a bare path).
+    """
+    now = now or datetime.now()
+    items = []
+    for row in rows:
+        title_match = ROW_TITLE_RE.search(row)
+        if not title_match or not title_match.group(1):
+            continue
+        url = html.unescape(title_match.group(1))
+        title = _text(title_match.group(2))
+
+        date_match = ROW_DATE_RE.search(row)
+        date_text = _text(date_match.group(1)) if date_match else ""
+        try:
+            watched_date = parse_watch_date(date_text, _text(row) if not date_text else '', now)
+        except ValueError:
+            watched_date = None # Keep None if parse fails
+
+        # Text is in .td.info, but we need to ignore .info-holder (which is "watch more")
+        info_match = ROW_INFO_RE.search(row)
+        info_text = _text(info_match.group(1)) if info_match else ""
+
+        items.append({
+            'url': url,
+            'title': title,
+            'date_text': date_text,
+            'date': watched_date,
+            'progress': parse_progress(info_text)
+        })
+    return items
+
+
+def find_next_page(page_html):
+    """Href of the next /continue/ page, None on the last (or only) page."""
+    match = NEXT_PAGE_RE.search(page_html)
+    return html.unescape(match.group(1)) if match else None
+
+
+def parse_watch_list(page_html, now=None):
+    """Parses the whole /continue/ page in one go."""
+    return parse_watch_list_rows(split_watch_list_rows(page_html), now)
+
+
+def _text(fragment):
+    """Tag-stripped, entity-decoded, whitespace-collapsed text of an HTML fragment."""
+    return ' '.join(html.unescape(TAG_RE.sub(' ', fragment)).split())
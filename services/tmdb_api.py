@@ -1,6 +1,10 @@
 import requests
 import json
-import time
+import logging
+from utils.singleflight import singleflight
+from utils.transport import transport
+
+logger = logging.getLogger(__name__)
 
 TMDB_API_URL = "https://api.themoviedb.org"
 
@@ -15,6 +19,7 @@ class TMDBAPI:
         self.account_id = None # Will be fetched if needed, but not strictly required for v4 lists usually?
         # Actually v4 lists are owned by the token user.
 
+    @singleflight
     def find_by_imdb_id(self, imdb_id):
         """Finds a movie or TV show by IMDB ID."""
         url = f"{TMDB_API_URL}/3/find/{imdb_id}"
@@ -24,7 +29,8 @@ class TMDBAPI:
         }
         
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            # Transport retries 429 (Retry-After) and 5xx within its budget
+            response = transport.request('GET', url, headers=self.headers, params=params, service='tmdb')
             if response.status_code == 200:
                 data = response.json()
                 # Check movies result
@@ -33,14 +39,9 @@ class TMDBAPI:
                 # Check tv results
                 if data.get('tv_results'):
                     return {'type': 'tv', 'id': data['tv_results'][0]['id'], 'title': data['tv_results'][0]['name']}
-            elif response.status_code == 429:
-                # Rate limit
-                retry = int(response.headers.get('Retry-After', 1)) 
-                time.sleep(retry + 1)
-                return self.find_by_imdb_id(imdb_id)
                 
         except Exception as e:
-            print(f"TMDB Find Error ({imdb_id}): {e}")
+            logger.error("TMDB Find Error (%s): %s", imdb_id, e)
             
         return None
 
@@ -78,10 +79,10 @@ class TMDBAPI:
             "description": "Imported from HDRezka"
         }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        response = transport.request('POST', url, headers=self.headers, json=payload, retry_statuses=(429,), service='tmdb')
         if response.status_code in [200, 201]:
             list_id = response.json()['id']
-            print(f"Created TMDB List: {list_name} (ID: {list_id})")
+            logger.info("Created TMDB List: %s (ID: %s)", list_name, list_id)
             
             # Save it
             import os
@@ -90,7 +91,7 @@ class TMDBAPI:
                 
             return list_id
         else:
-            print(f"Error creating list: {response.text}")
+            logger.error("Error creating list: %s", response.text)
             return None
 
     def add_items_to_list(self, list_id, items):
@@ -111,18 +112,14 @@ class TMDBAPI:
         payload = {"items": items}
         
         try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            if response.status_code == 429:
-                wait = int(response.headers.get('Retry-After', 5))
-                time.sleep(wait)
-                return self.add_items_to_list(list_id, items)
+            response = transport.request('POST', url, headers=self.headers, json=payload, retry_statuses=(429,), service='tmdb')
                 
             if response.status_code in [200, 201]:
                 # returns results
                 return len(items) 
             else:
-                print(f"Error adding to list: {response.text}")
+                logger.error("Error adding to list: %s", response.text)
                 return 0
         except Exception as e:
-            print(f"TMDB Add List Error: {e}")
+            logger.error("TMDB Add List Error: %s", e)
             return 0
@@ -2,19 +2,34 @@ import requests
 import webbrowser
 import os
 import json
+import logging
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.auth_server import get_auth_code
+from utils.singleflight import singleflight
+from utils.transport import transport
 
-TRAKT_API_URL = 'https://api.trakt.tv'
+logger = logging.getLogger(__name__)
+
+# Overridable so the sync can run against a local fake (fakes/trakt_server.py)
+TRAKT_API_URL = os.getenv('TRAKT_API_URL', 'https://api.trakt.tv')
+TRAKT_AUTH_URL = os.getenv('TRAKT_AUTH_URL', 'https://trakt.tv')
 REDIRECT_URI = 'http://localhost:8080/callback'
-TOKEN_FILE = 'trakt_token.json'
+TOKEN_FILE = os.getenv('TRAKT_TOKEN_FILE', 'trakt_token.json')
+# Refresh this long before the access token expires (Trakt tokens live 24h)
+REFRESH_MARGIN = 60 * 60
+# Per-show watched progress, reused while the show's watched summary is unchanged
+PROGRESS_CACHE_FILE = 'trakt_progress_cache.json'
+PROGRESS_WORKERS = 5
 
 class TraktAPI:
     def __init__(self, client_id, client_secret):
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = None
+        self.refresh_token = None
+        self.expires_at = None
         self.headers = {
             'Content-Type': 'application/json',
             'trakt-api-version': '2',
@@ -22,109 +37,150 @@ class TraktAPI:
         }
         self.lock = threading.Lock()
         self.load_token()
+        self.progress_cache = self._load_progress_cache()
+        self.progress_lock = threading.Lock()
 
     def load_token(self):
         if os.path.exists(TOKEN_FILE):
             try:
                 with open(TOKEN_FILE, 'r') as f:
                     data = json.load(f)
-                    self.access_token = data.get('access_token')
-                    if self.access_token:
-                        self.headers['Authorization'] = f'Bearer {self.access_token}'
+                    self._apply_token(data)
             except Exception as e:
-                print(f"Error loading token: {e}")
+                logger.error("Error loading token: %s", e)
+
+    def _apply_token(self, data):
+        self.access_token = data.get('access_token')
+        self.refresh_token = data.get('refresh_token')
+        # Trakt returns created_at + expires_in (seconds); old token files may lack both
+        expires_in = data.get('expires_in')
+        created_at = data.get('created_at')
+        self.expires_at = created_at + expires_in if expires_in and created_at else None
+        if self.access_token:
+            self.headers['Authorization'] = f'Bearer {self.access_token}'
 
     def save_token(self, data):
         try:
             with open(TOKEN_FILE, 'w') as f:
                 json.dump(data, f)
         except Exception as e:
-            print(f"Error saving token: {e}")
+            logger.error("Error saving token: %s", e)
+
+    def _token_expiring(self):
+        return self.expires_at is not None and time.time() > self.expires_at - REFRESH_MARGIN
 
     def authenticate(self):
+        """
+        Makes sure we hold a usable token.
+        Cheap when the token is valid; refreshes it silently shortly before expiry.
+        The browser flow only runs when there is no refresh token (first-time setup)
+        or the refresh token was rejected.
+        """
+        if self.access_token and not self._token_expiring():
+            return
         with self.lock:
-            # Double check inside lock
-            if self.access_token: 
-                 # Maybe check validity here if we did validation
-                 return
+            # Double check inside lock, another thread may have refreshed already
+            if self.access_token and not self._token_expiring():
+                return
+            if self.refresh_token and self._refresh():
+                return
+            self._browser_auth()
 
-            print("Authenticating with Trakt...")
-            url = f"https://trakt.tv/oauth/authorize?response_type=code&client_id={self.client_id}&redirect_uri={REDIRECT_URI}"
-            
-            print(f"Opening browser: {url}")
-            webbrowser.open(url)
-            
-            code = get_auth_code()
-            if not code:
-                raise Exception("Failed to get authorization code.")
-                
-            print(f"Got code. Exchanging for token...")
-            response = requests.post(f'{TRAKT_API_URL}/oauth/token', json={
-                'code': code,
+    def handle_unauthorized(self, stale_token):
+        """
+        Called on a 401 with the token the request was sent with.
+        All threads that got a 401 for the same token share one refresh.
+        """
+        with self.lock:
+            if self.access_token and self.access_token != stale_token:
+                return # Already refreshed by another thread
+            logger.info("Token expired or invalid. Refreshing...")
+            if self.refresh_token and self._refresh():
+                return
+            self.access_token = None
+            self._browser_auth()
+
+    def _refresh(self):
+        """refresh_token grant. Caller holds self.lock. Returns True on success."""
+        try:
+            response = transport.request('POST', f'{TRAKT_API_URL}/oauth/token', retry_statuses=(429,), json={
+                'refresh_token': self.refresh_token,
                 'client_id': self.client_id,
                 'client_secret': self.client_secret,
                 'redirect_uri': REDIRECT_URI,
-                'grant_type': 'authorization_code'
-            })
+                'grant_type': 'refresh_token'
+            }, timeout=30, service='trakt')
+        except requests.RequestException as e:
+            logger.error("Token refresh failed: %s", e)
+            return False
+
+        if response.status_code == 200:
+            data = response.json()
+            data.setdefault('created_at', int(time.time()))
+            self._apply_token(data)
+            self.save_token(data)
+            logger.info("Refreshed Trakt token.")
+            return True
+
+        logger.warning("Token refresh rejected (%s), falling back to browser login.", response.status_code)
+        return False
+
+    def _browser_auth(self):
+        """Interactive OAuth code flow. Caller holds self.lock."""
+        logger.info("Authenticating with Trakt...")
+        url = f"{TRAKT_AUTH_URL}/oauth/authorize?response_type=code&client_id={self.client_id}&redirect_uri={REDIRECT_URI}"
+        
+        logger.info("Opening browser: %s", url)
+        webbrowser.open(url)
+        
+        code = get_auth_code()
+        if not code:
+            raise Exception("Failed to get authorization code.")
             
-            if response.status_code == 200:
-                data = response.json()
-                self.access_token = data['access_token']
-                self.headers['Authorization'] = f'Bearer {self.access_token}'
-                self.save_token(data)
-                print("Successfully authenticated with Trakt!")
-            else:
-                raise Exception(f"Authentication failed: {response.text}")
+        logger.info("Got code. Exchanging for token...")
+        response = transport.request('POST', f'{TRAKT_API_URL}/oauth/token', retry_statuses=(429,), json={
+            'code': code,
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'redirect_uri': REDIRECT_URI,
+            'grant_type': 'authorization_code'
+        }, service='trakt')
+        
+        if response.status_code == 200:
+            data = response.json()
+            data.setdefault('created_at', int(time.time()))
+            self._apply_token(data)
+            self.save_token(data)
+            logger.info("Successfully authenticated with Trakt!")
+        else:
+            raise Exception(f"Authentication failed: {response.text}")
 
-                raise Exception(f"Authentication failed: {response.text}")
+    def _request(self, method, url, **kwargs):
+        """
+        Authenticated request through the shared transport (which handles
+        backoff/budgets/breakers). A 401 triggers one shared token refresh
+        and a single replay.
+        """
+        self.authenticate()
+        token = self.access_token
+        response = transport.request(method, url, headers=self.headers, service='trakt', **kwargs)
+        if response.status_code == 401:
+            self.handle_unauthorized(token)
+            response = transport.request(method, url, headers=self.headers, service='trakt', **kwargs)
+        return response
 
     def _get_with_retry(self, url, description="data", retries=5):
-        """Helper to perform GET request with retries for 423/429/5xx status."""
-        if not self.access_token:
-            self.authenticate()
-            
-        try:
-            print(f"Fetching {description} from Trakt...")
-            response = requests.get(url, headers=self.headers)
-            
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 423:
-                 # 423 Locked Resource - usually means item/user is being indexed.
-                 # Re-auth does NOT fix this. We should just wait.
-                 if retries > 0:
-                     wait = 5 # Standard wait
-                     print(f"   [Trakt] Locked Resource (423). Waiting {wait}s to retry ({retries} left)...")
-                     time.sleep(wait)
-                     return self._get_with_retry(url, description, retries - 1)
-                 else:
-                     raise Exception(f"Trakt API Failed (423) after retries.")
-                     
-            elif response.status_code in [429, 500, 502, 503, 504]:
-                if retries > 0:
-                     msg = f"Status {response.status_code}"
-                     wait = 2
-                     if response.status_code == 429:
-                         wait = int(response.headers.get('Retry-After', 2)) + 1
-                     else:
-                         wait = 5
-                         
-                     print(f"   [Trakt] {msg}. Waiting {wait}s to retry ({retries} left)...")
-                     time.sleep(wait)
-                     return self._get_with_retry(url, description, retries - 1)
-                else:
-                    raise Exception(f"Trakt API Failed ({response.status_code}) after retries.")
-            elif response.status_code == 401:
-                print("Token expired or invalid. Re-authenticating...")
-                self.access_token = None
-                self.authenticate()
-                return self._get_with_retry(url, description, retries)
-            else:
-                # Other 4xx likely permanent
-                raise Exception(f"Trakt API Error: {response.status_code} {response.text}")
-                
-        except Exception as e:
-            raise e
+        """GET with retries for 423/429/5xx status. Returns parsed JSON or raises."""
+        logger.info("Fetching %s from Trakt...", description)
+        response = self._request('GET', url, max_retries=retries)
+        
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code in [423, 429, 500, 502, 503, 504]:
+            raise Exception(f"Trakt API Failed ({response.status_code}) after retries.")
+        else:
+            # Other 4xx likely permanent
+            raise Exception(f"Trakt API Error: {response.status_code} {response.text}")
 
     def get_watched_shows(self, load_progress=False):
         """Fetches list of all watched shows from Trakt."""
@@ -144,10 +200,90 @@ class TraktAPI:
                     watched[imdb] = item
             return watched
         except Exception as e:
-            print(f"CRITICAL ERROR: Could not fetch watched shows: {e}")
+            logger.error("CRITICAL ERROR: Could not fetch watched shows: %s", e)
             # Reraise so main.py aborts!
             raise e
 
+    def load_show_progress(self, watched, imdb_ids, workers=PROGRESS_WORKERS):
+        """
+        Second tier of the watched fetch: fills in 'seasons' (same shape as the
+        full /sync/watched/shows payload) only for the given shows, instead of
+        downloading every episode the account has ever watched.
+        watched: dict from get_watched_shows() (noseasons summary), updated in place.
+        Results are cached on disk per show and reused while the show's
+        last_watched_at/last_updated_at stay the same.
+        """
+        todo = []
+        cached_count = 0
+        for imdb_id in set(imdb_ids):
+            item = watched.get(imdb_id)
+            if not item or 'show' not in item or 'seasons' in item:
+                continue
+            trakt_id = item['show'].get('ids', {}).get('trakt')
+            if not trakt_id:
+                continue
+            version = f"{item.get('last_watched_at')}|{item.get('last_updated_at')}"
+            cached = self.progress_cache.get(str(trakt_id))
+            if cached and cached.get('version') == version:
+                item['seasons'] = cached['seasons']
+                cached_count += 1
+            else:
+                todo.append((item, trakt_id, version))
+
+        logger.info("Loading watched progress for %s shows (%s cached)...", len(todo), cached_count)
+        if not todo:
+            return watched
+
+        def fetch(entry):
+            item, trakt_id, version = entry
+            item['seasons'] = self.get_show_progress(trakt_id)
+            with self.progress_lock:
+                self.progress_cache[str(trakt_id)] = {'version': version, 'seasons': item['seasons']}
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # list() re-raises the first failure, same as the single big fetch did
+            list(executor.map(fetch, todo))
+        self._save_progress_cache()
+        return watched
+
+    def get_show_progress(self, trakt_id):
+        """
+        Watched episodes of one show, converted to the /sync/watched seasons format:
+        [{'number': 1, 'episodes': [{'number': 1, 'plays': 1, 'last_watched_at': ...}]}]
+        """
+        url = f'{TRAKT_API_URL}/shows/{trakt_id}/progress/watched?hidden=false&specials=false&count_specials=false'
+        response = self._request('GET', url)
+        if response.status_code != 200:
+            raise Exception(f"Trakt API Error: {response.status_code} fetching progress for {trakt_id}")
+
+        seasons = []
+        for season in response.json().get('seasons', []):
+            episodes = [
+                {'number': ep['number'], 'plays': 1, 'last_watched_at': ep.get('last_watched_at')}
+                for ep in season.get('episodes', []) if ep.get('completed')
+            ]
+            # The watched payload only lists seasons with something watched
+            if episodes:
+                seasons.append({'number': season['number'], 'episodes': episodes})
+        return seasons
+
+    def _load_progress_cache(self):
+        if os.path.exists(PROGRESS_CACHE_FILE):
+            try:
+                with open(PROGRESS_CACHE_FILE, 'r') as f:
+                    return json.load(f)
+            except Exception:
+                pass
+        return {}
+
+    def _save_progress_cache(self):
+        try:
+            with self.progress_lock:
+                with open(PROGRESS_CACHE_FILE, 'w') as f:
+                    json.dump(self.progress_cache, f)
+        except Exception as e:
+            logger.error("Error saving progress cache: %s", e)
+
     def get_watched_movies(self):
         """Fetches list of all watched movies from Trakt."""
         try:
@@ -161,32 +297,41 @@ class TraktAPI:
                     watched[imdb] = item
             return watched
         except Exception as e:
-             print(f"CRITICAL ERROR: Could not fetch watched movies: {e}")
+             logger.error("CRITICAL ERROR: Could not fetch watched movies: %s", e)
              raise e
 
-    def search_by_imdb(self, imdb_id, retries=5):
-        if not self.access_token:
-             self.authenticate()
+    def get_watched_entry(self, item_type, id_val):
+        """
+        /sync/watched-shaped entry of one show or movie ('last_watched_at' and,
+        for shows, 'seasons') from its latest history row and its watched
+        progress, without downloading the account's whole watched list.
+        id_val: Trakt ID, slug or IMDb ID. None if it was never watched.
+        """
+        history = self.get_history(id_val, type=f'{item_type}s', limit=1)
+        if not history:
+            return None
+        latest = history[0]
+        entry = {item_type: latest.get(item_type) or {}, 'last_watched_at': latest.get('watched_at')}
+        if item_type == 'show':
+            entry['seasons'] = self.get_show_progress(entry['show'].get('ids', {}).get('trakt') or id_val)
+        return entry
 
+    def get_last_activities(self):
+        """
+        Timestamps of the account's last changes per area (/sync/last_activities).
+        One small request that tells whether the watched state can have changed.
+        """
+        return self._get_with_retry(f'{TRAKT_API_URL}/sync/last_activities', "last activities")
+
+    @singleflight
+    def search_by_imdb(self, imdb_id, retries=5):
         try:
-            response = requests.get(f'{TRAKT_API_URL}/search/imdb/{imdb_id}?type=movie,show', headers=self.headers)
+            response = self._request('GET', f'{TRAKT_API_URL}/search/imdb/{imdb_id}?type=movie,show', max_retries=retries)
             
             if response.status_code == 200:
                 results = response.json()
                 if results:
                     return results[0]
-            elif response.status_code == 401:
-                print("Token expired or invalid. Re-authenticating...")
-                self.access_token = None
-                self.authenticate()
-                return self.search_by_imdb(imdb_id, retries)
-            elif response.status_code == 429:
-                if retries > 0:
-                    wait = int(response.headers.get('Retry-After', 2)) + 1
-                    time.sleep(wait)
-                    return self.search_by_imdb(imdb_id, retries - 1)
-                else:
-                    return None
             
         except Exception:
             pass
@@ -204,7 +349,7 @@ class TraktAPI:
         try:
             return self._get_with_retry(url, f"history for {type}/{id_val}")
         except Exception as e:
-            print(f"Error fetching history: {e}")
+            logger.error("Error fetching history: %s", e)
             # Use empty list only if 100% sure, but here exception is safer to bubble up?
             # Existing callers expect list. If we raise, main.py might crash.
             # But crashing is better than "Missing".
@@ -218,8 +363,7 @@ class TraktAPI:
     def add_to_history(self, item, retries=5):
         # ... (keep existing single item method if needed, or just rely on batch)
         # For compatibility with old code or single adds
-        if not self.access_token:
-             self.authenticate()
+        self.authenticate()
 
         payload = {}
         if item['type'] == 'movie':
@@ -231,8 +375,7 @@ class TraktAPI:
 
     def add_to_history_batch(self, imdb_ids, retries=5):
         """Adds a batch of items by IMDB ID to history."""
-        if not self.access_token:
-             self.authenticate()
+        self.authenticate()
              
         # Trakt allows mixing movies and shows in the payload, 
         # but we need to know which is which?
@@ -261,70 +404,7 @@ class TraktAPI:
         #    - HDRezka URL usually tells us! /films/ or /series/ or /cartoons/
         #    - We can use that hint!
         
-        movies = []
-        shows = []
-        
-        for item in imdb_ids:
-            # item is expected to be dict {'imdb_id': 'tt...', 'type': 'movie'/'show', 'progress': {...}, 'date': datetime}
-            ids = {}
-            if item.get('trakt_id'):
-                ids['trakt'] = item['trakt_id']
-            else:
-                ids['imdb'] = item['imdb_id']
-            
-            obj = {"ids": ids}
-            
-            # Prepare watched_at string
-            watched_at_str = None
-            if item.get('date'):
-                # Set to Noon UTC to be safe/neutral
-                watched_at_str = item['date'].strftime('%Y-%m-%dT12:00:00.000Z')
-                obj['watched_at'] = watched_at_str
-
-            if item['type'] == 'movie':
-                movies.append(obj)
-            else:
-                # SHOW
-                progress = item.get('progress')
-                if progress:
-                    # Sync "Watched Up To"
-                    # 1. Mark all previous seasons as fully watched
-                    seasons_list = []
-                    current_season = progress['season']
-                    current_episode = progress['episode']
-                    
-                    # Add previous seasons (assuming standard S1 start)
-                    # Add previous seasons (assuming standard S1 start)
-                    for s in range(1, current_season):
-                        season_obj = {"number": s}
-                        if watched_at_str:
-                             season_obj["watched_at"] = watched_at_str
-                        seasons_list.append(season_obj)
-                        
-                    # 2. Mark current season up to current episode
-                    # Create list of episodes 1..current_episode
-                    # Apply watched_at to EPISODES specifically (Trakt quirk?)
-                    episodes_list = []
-                    for e in range(1, current_episode + 1):
-                        ep_obj = {"number": e}
-                        if watched_at_str:
-                             ep_obj["watched_at"] = watched_at_str
-                        episodes_list.append(ep_obj)
-                    
-                    seasons_list.append({
-                        "number": current_season,
-                        "episodes": episodes_list
-                    })
-                    
-                    obj["seasons"] = seasons_list
-                    shows.append(obj)
-                else:
-                    # Sync whole show
-                    shows.append(obj)
-                
-        payload = {}
-        if movies: payload['movies'] = movies
-        if shows: payload['shows'] = shows
+        payload = build_history_payload(imdb_ids)
         
         if not payload:
             return None
@@ -337,26 +417,19 @@ class TraktAPI:
 
     def _post_history(self, payload, retries=5):
         try:
-            response = requests.post(f'{TRAKT_API_URL}/sync/history', json=payload, headers=self.headers)
+            # Compact separators, the body is sent as-is
+            body = json.dumps(payload, separators=(',', ':'))
+            logger.info("   [Trakt] History payload: %s objects, %s bytes", payload_item_count(payload), len(body))
+            # Only retry what Trakt rejected before applying (429/423), a 5xx may
+            # have been applied already and a replay would duplicate history
+            response = self._request('POST', f'{TRAKT_API_URL}/sync/history', data=body,
+                                     max_retries=retries, retry_statuses=(423, 429))
             
             if response.status_code == 201:
                 res = response.json()
                 # Log the result summary (added vs not found)
                 # print(f"[DEBUG] Trakt Sync Response: Added={res.get('added')} NotFound={res.get('not_found')}")
                 return res
-            elif response.status_code == 401:
-                print("Token expired or invalid. Re-authenticating...")
-                self.access_token = None
-                self.authenticate()
-                return self._post_history(payload, retries)
-            elif response.status_code == 429:
-                if retries > 0:
-                    wait = int(response.headers.get('Retry-After', 2)) + 1
-                    print(f"  Rate Limit (429). Waiting {wait}s...")
-                    time.sleep(wait)
-                    return self._post_history(payload, retries - 1)
-                else:
-                    return None
             else:
                  try:
                     return response.json()
@@ -377,8 +450,7 @@ class TraktAPI:
 
     def remove_from_history_batch(self, imdb_ids, retries=5):
         """Removes a batch of items by IMDB ID from history."""
-        if not self.access_token:
-             self.authenticate()
+        self.authenticate()
              
         movies = []
         shows = []
@@ -419,7 +491,9 @@ class TraktAPI:
 
     def _post_remove(self, payload, retries=5):
         try:
-            response = requests.post(f'{TRAKT_API_URL}/sync/history/remove', json=payload, headers=self.headers)
+            # Removal is idempotent, safe to retry on 5xx and connection errors
+            response = self._request('POST', f'{TRAKT_API_URL}/sync/history/remove', json=payload,
+                                     max_retries=retries, retry_errors=True)
             
             if response.status_code == 200:
                 data = response.json()
@@ -427,19 +501,6 @@ class TraktAPI:
                 not_found = data.get('not_found', {})
                 # print(f"  [Trakt Remove] Deleted: {deleted} | Not Found: {not_found}")
                 return data
-            elif response.status_code == 401:
-                print("Token expired or invalid. Re-authenticating...")
-                self.access_token = None
-                self.authenticate()
-                return self._post_remove(payload, retries)
-            elif response.status_code == 429:
-                if retries > 0:
-                    wait = int(response.headers.get('Retry-After', 2)) + 1
-                    print(f"  Rate Limit (429). Waiting {wait}s...")
-                    time.sleep(wait)
-                    return self._post_remove(payload, retries - 1)
-                else:
-                    return None
             else:
                  try:
                     return response.json()
@@ -447,5 +508,90 @@ class TraktAPI:
                     return None
                     
         except Exception as e:
-            print(f"Error in remove: {e}")
+            logger.error("Error in remove: %s", e)
         return None
+
+
+def _watched_at(date):
+    # Set to Noon UTC to be safe/neutral
+    return date.strftime('%Y-%m-%dT12:00:00.000Z')
+
+def build_history_payload(items):
+    """
+    Builds the most compact /sync/history payload for a batch.
+    item: {'imdb_id', 'trakt_id'?, 'type': 'movie'/'show', 'progress'?: {'season', 'episode'}, 'date'?: datetime}
+
+    - previous seasons are whole-season objects (no episode lists)
+    - only the current (partial) season lists episode numbers
+    - watched_at is set once per season object instead of on every episode
+    A show at S10E5 becomes 9 season objects + 1 season with 5 bare episode numbers.
+    """
+    movies = []
+    shows = []
+
+    for item in items:
+        ids = {}
+        if item.get('trakt_id'):
+            ids['trakt'] = item['trakt_id']
+        else:
+            ids['imdb'] = item['imdb_id']
+
+        obj = {"ids": ids}
+        watched_at = _watched_at(item['date']) if item.get('date') else None
+
+        progress = item.get('progress')
+        if item['type'] == 'movie':
+            if watched_at:
+                obj['watched_at'] = watched_at
+            movies.append(obj)
+        elif progress:
+            # Sync "Watched Up To" (assuming standard S1 start)
+            seasons_list = [{"number": s} for s in range(1, progress['season'])]
+            seasons_list.append({
+                "number": progress['season'],
+                "episodes": [{"number": e} for e in range(1, progress['episode'] + 1)]
+            })
+            if watched_at:
+                # Season level covers every episode in it, listed or whole
+                for season_obj in seasons_list:
+                    season_obj['watched_at'] = watched_at
+            obj["seasons"] = seasons_list
+            shows.append(obj)
+        else:
+            # Sync whole show, the show level timestamp covers all of it
+            if watched_at:
+                obj['watched_at'] = watched_at
+            shows.append(obj)
+
+    payload = {}
+    if movies: payload['movies'] = movies
+    if shows: payload['shows'] = shows
+    return payload
+
+def build_episodes_payload(show_ids, episodes, watched_at):
+    """
+    Re-add payload for a set of episodes of one show, grouped by season with a
+    single season-level watched_at: episodes = [(season, number), ...]
+    """
+    by_season = {}
+    for season, number in episodes:
+        by_season.setdefault(season, set()).add(number)
+
+    seasons_list = []
+    for season in sorted(by_season):
+        seasons_list.append({
+            "number": season,
+            "watched_at": watched_at,
+            "episodes": [{"number": e} for e in sorted(by_season[season])]
+        })
+    return {"shows": [{"ids": show_ids, "seasons": seasons_list}]}
+
+def payload_item_count(payload):
+    """Movies + show/season/episode objects in a history payload (for logging)."""
+    count = len(payload.get('movies', []))
+    for show in payload.get('shows', []):
+        count += 1
+        for season in show.get('seasons', []):
+            count += 1 + len(season.get('episodes', []))
+    count += len(payload.get('episodes', []))
+    return count
@@ -1,9 +1,11 @@
-from services.trakt_api import TraktAPI
 import os
 from dotenv import load_dotenv
 import json
 
 load_dotenv()
+
+from services.trakt_api import TraktAPI, TRAKT_API_URL
+
 client_id = os.getenv('TRAKT_CLIENT_ID')
 client_secret = os.getenv('TRAKT_CLIENT_SECRET')
 
@@ -50,7 +52,7 @@ for mid in missing_ids:
         payload = {"shows": [{"ids": {"imdb": mid}, "seasons": [{"number": 1, "episodes": [{"number": 1, "watched_at": "2024-01-01T12:00:00.000Z"}]}]}]}
         
         import requests
-        url = "https://api.trakt.tv/sync/history"
+        url = f"{TRAKT_API_URL}/sync/history"
         try:
              resp = requests.post(url, json=payload, headers=trakt.headers)
              print(f"   Add Result: {resp.status_code}")
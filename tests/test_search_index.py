@@ -0,0 +1,72 @@
+from utils.search_index import SearchIndex
+
+ENTRIES = {
+    '/series/drama/646-breaking-bad-2008.html': {
+        'id': 'tt0903747', 'status': 'completed',
+        'trakt_data': {'title': 'Breaking Bad', 'year': 2008, 'ids': {'trakt': 1388, 'imdb': 'tt0903747'}},
+    },
+    '/series/drama/12345-better-call-saul-2015.html': {
+        'id': 'tt3032476', 'status': 'active',
+        'trakt_data': {'title': 'Better Call Saul', 'year': 2015, 'ids': {'trakt': 59660}},
+    },
+    '/films/comedy/777-bad-santa-2003.html': {'id': 'tt0307987', 'status': 'ignored'},
+    '/films/drama/42-old-entry.html': 'tt0000042', # Old caches: bare IMDb ID
+}
+
+
+def make_index():
+    index = SearchIndex()
+    index.build(ENTRIES.items())
+    return index
+
+
+def test_prefix_match():
+    assert make_index().search('break') == {'/series/drama/646-breaking-bad-2008.html'}
+
+
+def test_short_words_match_by_prefix():
+    assert make_index().search('be') == {'/series/drama/12345-better-call-saul-2015.html'}
+
+
+def test_substring_match_through_trigrams():
+    assert make_index().search('reaking') == {'/series/drama/646-breaking-bad-2008.html'}
+    assert make_index().search('aul') == {'/series/drama/12345-better-call-saul-2015.html'}
+
+
+def test_every_word_must_match():
+    index = make_index()
+    assert index.search('bad') == {'/series/drama/646-breaking-bad-2008.html', '/films/comedy/777-bad-santa-2003.html'}
+    assert index.search('bad santa') == {'/films/comedy/777-bad-santa-2003.html'}
+    assert index.search('bad saul') == set()
+
+
+def test_ids_years_and_status():
+    index = make_index()
+    assert index.search('tt09037') == {'/series/drama/646-breaking-bad-2008.html'}
+    assert index.search('0903747') == {'/series/drama/646-breaking-bad-2008.html'}
+    assert index.search('2015') == {'/series/drama/12345-better-call-saul-2015.html'}
+    assert index.search('59660') == {'/series/drama/12345-better-call-saul-2015.html'}
+    assert index.search('ignored') == {'/films/comedy/777-bad-santa-2003.html'}
+    assert index.search('tt0000042') == {'/films/drama/42-old-entry.html'}
+
+
+def test_ids_are_not_substring_matched():
+    assert make_index().search('903747') == set()
+
+
+def test_empty_query_returns_everything():
+    assert make_index().search('  ') == set(ENTRIES)
+
+
+def test_update_and_remove_keep_index_current():
+    index = make_index()
+    index.search('break') # Builds the sorted terms
+    key = '/films/comedy/777-bad-santa-2003.html'
+    index.update(key, {'id': 'tt0307987', 'status': 'completed',
+                       'trakt_data': {'title': 'Bad Santa', 'year': 2003}})
+    assert key in index.search('completed')
+    assert key not in index.search('ignored')
+    index.remove(key)
+    assert index.search('santa') == set()
+    assert index.search('sant') == set()
+    assert index.search('bad') == {'/series/drama/646-breaking-bad-2008.html'}
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from utils.singleflight import SingleFlight, singleflight
+
+
+def run_concurrently(fn, count):
+    results = [None] * count
+    errors = [None] * count
+
+    def worker(i):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def join(threads):
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight()
+    calls = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return 'tt0903747'
+
+    leader, leader_results, _ = run_concurrently(lambda: group.do('key', fetch), 1)
+    entered.wait(5)
+    followers, results, errors = run_concurrently(lambda: group.do('key', fetch), 7)
+    time.sleep(0.1) # Followers reach the wait on the in-flight call
+    release.set()
+    join(leader + followers)
+    assert leader_results + results == ['tt0903747'] * 8
+    assert errors == [None] * 7
+    assert calls == [1]
+
+
+def test_errors_are_shared():
+    group = SingleFlight()
+    entered = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        entered.set()
+        release.wait(5)
+        raise ValueError('boom')
+
+    leader, _, leader_errors = run_concurrently(lambda: group.do('key', fetch), 1)
+    entered.wait(5)
+    followers, _, follower_errors = run_concurrently(lambda: group.do('key', lambda: 'not called'), 3)
+    release.set()
+    join(leader + followers)
+    assert isinstance(leader_errors[0], ValueError)
+    assert all(isinstance(e, ValueError) for e in follower_errors)
+
+
+def test_nothing_is_cached_after_the_call():
+    group = SingleFlight()
+    assert group.do('key', lambda: 1) == 1
+    assert group.do('key', lambda: 2) == 2
+    assert group.calls == {}
+
+
+def test_reentrant_call_from_the_leader_does_not_deadlock():
+    group = SingleFlight()
+
+    def fetch(retries):
+        if retries:
+            return group.do('key', fetch, retries - 1)
+        return 'done'
+
+    assert group.do('key', fetch, 3) == 'done'
+    assert group.calls == {}
+
+
+def test_decorator_keys_by_method_and_argument():
+    class Client:
+        def __init__(self):
+            self.calls = []
+
+        @singleflight
+        def lookup(self, imdb_id, retries=1):
+            self.calls.append(imdb_id)
+            if retries:
+                return self.lookup(imdb_id, retries - 1) # Retry recursion
+            return imdb_id.upper()
+
+    client = Client()
+    assert client.lookup('tt1') == 'TT1'
+    assert client.lookup('tt2') == 'TT2'
+    assert client.calls == ['tt1', 'tt1', 'tt2', 'tt2']
+    assert Client().lookup('tt1') == 'TT1'
+
+
+def test_errors_propagate_to_a_single_caller():
+    group = SingleFlight()
+    with pytest.raises(KeyError):
+        group.do('key', lambda: {}['missing'])
+    assert group.calls == {}
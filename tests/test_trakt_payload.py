@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from services.trakt_api import build_episodes_payload, build_history_payload, payload_item_count
+
+WATCHED_AT = '2024-03-05T12:00:00.000Z'
+
+
+def test_show_in_progress_s10e5():
+    payload = build_history_payload([{
+        'imdb_id': 'tt0903747', 'type': 'show', 'progress': {'season': 10, 'episode': 5},
+        'date': datetime(2024, 3, 5, 21, 30),
+    }])
+    assert list(payload) == ['shows']
+    show = payload['shows'][0]
+    assert show['ids'] == {'imdb': 'tt0903747'}
+    seasons = show['seasons']
+    # Nine whole seasons, then the current one with bare episode numbers
+    assert [season['number'] for season in seasons] == list(range(1, 11))
+    assert all('episodes' not in season for season in seasons[:9])
+    assert seasons[9]['episodes'] == [{'number': e} for e in range(1, 6)]
+    # Every season carries the date, episodes don't repeat it
+    assert all(season['watched_at'] == WATCHED_AT for season in seasons)
+    assert all(set(episode) == {'number'} for episode in seasons[9]['episodes'])
+    assert payload_item_count(payload) == 1 + 10 + 5
+
+
+def test_trakt_id_preferred_over_imdb():
+    payload = build_history_payload([{'imdb_id': 'tt1', 'trakt_id': 42, 'type': 'show',
+                                      'progress': {'season': 1, 'episode': 1}}])
+    assert payload['shows'][0]['ids'] == {'trakt': 42}
+
+
+def test_undated_items_carry_no_watched_at():
+    payload = build_history_payload([{'imdb_id': 'tt1', 'type': 'show', 'progress': {'season': 2, 'episode': 1}}])
+    assert all('watched_at' not in season for season in payload['shows'][0]['seasons'])
+
+
+def test_movies_and_whole_shows_dated_at_their_own_level():
+    payload = build_history_payload([
+        {'imdb_id': 'tt1', 'type': 'movie', 'date': datetime(2024, 3, 5)},
+        {'imdb_id': 'tt2', 'type': 'show', 'date': datetime(2024, 3, 5)},
+    ])
+    assert payload['movies'] == [{'ids': {'imdb': 'tt1'}, 'watched_at': WATCHED_AT}]
+    assert payload['shows'] == [{'ids': {'imdb': 'tt2'}, 'watched_at': WATCHED_AT}]
+
+
+def test_episodes_payload_groups_by_season():
+    payload = build_episodes_payload({'imdb': 'tt1'}, [(2, 3), (1, 2), (1, 1), (2, 3)], WATCHED_AT)
+    show = payload['shows'][0]
+    assert show['ids'] == {'imdb': 'tt1'}
+    assert show['seasons'] == [
+        {'number': 1, 'watched_at': WATCHED_AT, 'episodes': [{'number': 1}, {'number': 2}]},
+        {'number': 2, 'watched_at': WATCHED_AT, 'episodes': [{'number': 3}]},
+    ]
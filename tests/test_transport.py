@@ -0,0 +1,98 @@
+import threading
+import time
+
+from utils.transport import CircuitBreaker, RetryBudget, Transport
+
+
+def test_retry_budget_spends_and_earns_back():
+    budget = RetryBudget(max_tokens=2, earn_ratio=0.5)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw() # Half a token is not a retry yet
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_retry_budget_is_capped():
+    budget = RetryBudget(max_tokens=1, earn_ratio=1)
+    for _ in range(5):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_retry_budget_per_host():
+    transport = Transport()
+    hdrezka = transport.budget('hdrezka.example')
+    while hdrezka.withdraw():
+        pass
+    assert transport.budget('hdrezka.example') is hdrezka
+    assert transport.budget('api.trakt.tv').withdraw()
+
+
+def open_breaker(reset_timeout=0.05):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold():
+    breaker = open_breaker(reset_timeout=60)
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failures():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert [breaker.allow() for _ in range(4)] == [True, False, False, False]
+
+
+def test_half_open_single_probe_under_concurrency():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    allowed = []
+    start = threading.Barrier(16)
+
+    def worker():
+        start.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert allowed.count(True) == 1
+
+
+def test_failed_probe_reopens_and_successful_probe_closes():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow() # Cooldown starts over
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_lost_probe_frees_the_slot_after_cooldown():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow() # Probe never reports back
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
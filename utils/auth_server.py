@@ -1,6 +1,20 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 import urllib.parse
 import threading
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Control API of the sync daemon (main.py daemon), local only. 0 disables it.
+CONTROL_HOST = '127.0.0.1'
+CONTROL_PORT = int(os.getenv('CONTROL_PORT', '8765'))
+# Optional shared secret, sent as 'Authorization: Bearer <token>'
+CONTROL_TOKEN = os.getenv('CONTROL_TOKEN')
+LOCAL_HOSTS = {'127.0.0.1', 'localhost', '::1'}
+SEARCH_LIMIT = 50
+MAX_BODY_BYTES = 64 * 1024
 
 class AuthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -31,6 +45,129 @@ def get_auth_code(port=8080):
     Starts a server and waits for a single request to /callback to get the code.
     """
     server = run_server(port)
-    print(f"Waiting for callback on port {port}...")
+    logger.info("Waiting for callback on port %s...", port)
     server.handle_request() # Handles one request
     return server.auth_code
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over the daemon's controller (server.controller):
+
+        POST /sync      {"mode": "full" | "incremental"}   queue a sync
+        POST /sync/url  {"url": "<hdrezka url>"}           queue a sync of one title
+        GET  /status                                       running phase, progress, last result
+        GET  /cache?q=<words>&limit=<n>                    cache entries matching q (as 'search')
+        GET  /metrics                                      Prometheus text format
+
+    POSTs must be application/json, which browsers can't send cross-origin
+    without a preflight we never answer, and the Host header must be local
+    (no DNS rebinding). With CONTROL_TOKEN set every request needs it.
+    """
+    def log_message(self, format, *args):
+        logger.debug("[Control] %s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        if not self._allowed():
+            return
+        parsed = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        controller = self.server.controller
+        if parsed.path == '/status':
+            self._send_json(200, controller.status())
+        elif parsed.path == '/cache':
+            try:
+                limit = int(query.get('limit', [SEARCH_LIMIT])[0])
+            except ValueError:
+                return self._send_json(400, {'error': 'limit must be a number'})
+            self._send_json(200, controller.search(query.get('q', [''])[0], limit))
+        elif parsed.path == '/metrics':
+            self._send(200, controller.metrics().encode('utf-8'), 'text/plain; version=0.0.4')
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self._allowed():
+            return
+        if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+            return self._send_json(415, {'error': 'expected application/json'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            return self._send_json(400, {'error': 'invalid Content-Length'})
+        if length > MAX_BODY_BYTES:
+            return self._send_json(413, {'error': 'body too large'})
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': 'invalid JSON'})
+        if not isinstance(body, dict):
+            return self._send_json(400, {'error': 'expected a JSON object'})
+
+        path = urllib.parse.urlsplit(self.path).path
+        controller = self.server.controller
+        if path == '/sync':
+            mode = body.get('mode', 'incremental')
+            if mode not in ('full', 'incremental'):
+                return self._send_json(400, {'error': "mode must be 'full' or 'incremental'"})
+            controller.sync(full=mode == 'full')
+            self._send_json(202, {'queued': mode})
+        elif path == '/sync/url':
+            url = body.get('url')
+            if not isinstance(url, str) or not url.strip():
+                return self._send_json(400, {'error': 'url is required'})
+            controller.sync_url(url.strip())
+            self._send_json(202, {'queued': 'url', 'url': url.strip()})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _allowed(self):
+        host = urllib.parse.urlsplit('//' + self.headers.get('Host', '')).hostname
+        if host not in LOCAL_HOSTS:
+            self._send_json(403, {'error': 'forbidden host'})
+            return False
+        token = self.server.token
+        if token and self.headers.get('Authorization') != f'Bearer {token}':
+            self._send_json(401, {'error': 'unauthorized'})
+            return False
+        return True
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data, default=str).encode('utf-8'), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ControlServer(ThreadingHTTPServer):
+    """
+    Threaded local control API. controller provides sync(full), sync_url(url),
+    status(), search(query, limit) and metrics(); the handlers only parse and
+    answer, the work runs wherever the controller puts it.
+    """
+    daemon_threads = True
+
+    def __init__(self, controller, host=CONTROL_HOST, port=CONTROL_PORT, token=CONTROL_TOKEN):
+        super().__init__((host, port), ControlHandler)
+        self.controller = controller
+        self.token = token
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        """Serves in a background thread; returns self."""
+        self.thread = threading.Thread(target=self.serve_forever, name='control-api', daemon=True)
+        self.thread.start()
+        logger.info("Control API listening on %s", self.url)
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
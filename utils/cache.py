@@ -1,8 +1,32 @@
+import contextlib
 import json
 import os
 import threading
+import time
+import urllib.parse
+
+from utils.metrics import metrics
+from utils.search_index import SearchIndex
 
 CACHE_FILE = 'cache.json'
+# Entry fields bulk_update may set
+ENTRY_FIELDS = ('id', 'status', 'date', 'trakt_data')
+# Inside batch(), writes are still flushed this often so a crash loses little
+BATCH_FLUSH_SECONDS = 30
+
+def cache_key(url):
+    """
+    Mirror-independent key for an HDRezka URL: the path (and query) only.
+    'https://hdrezka-home.tv/series/x.html' and 'https://rezka.ag/series/x.html'
+    share the key '/series/x.html'. Keys that are already paths pass through.
+    """
+    if not url or not url.startswith('http'):
+        return url
+    parsed = urllib.parse.urlsplit(url)
+    key = parsed.path or '/'
+    if parsed.query:
+        key += '?' + parsed.query
+    return key
 
 class Cache:
     _instance = None
@@ -13,8 +37,13 @@ class Cache:
             if cls._instance is None:
                 cls._instance = super(Cache, cls).__new__(cls)
                 cls._instance.cache_file = cache_file
+                cls._instance.mtime = cls._instance._file_mtime()
                 cls._instance.data = cls._instance._load_cache()
                 cls._instance.lock = threading.Lock()
+                cls._instance.index = None # SearchIndex, built on the first search()
+                cls._instance.batch_depth = 0
+                cls._instance.dirty = False
+                cls._instance.last_save = time.monotonic()
         return cls._instance
 
     def __init__(self, cache_file=CACHE_FILE):
@@ -25,106 +54,250 @@ class Cache:
         if os.path.exists(self.cache_file):
             try:
                 with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    return self._normalize_keys(json.load(f))
             except json.JSONDecodeError:
                 return {}
         return {}
 
+    def _normalize_keys(self, data):
+        """Migrates full-URL keys (old caches) to mirror-independent paths."""
+        normalized = {}
+        for url, val in data.items():
+            key = cache_key(url)
+            existing = normalized.get(key)
+            if isinstance(existing, dict) and isinstance(val, dict):
+                # Same title cached under two mirrors: fill gaps, keep what we had
+                for k, v in val.items():
+                    if existing.get(k) is None:
+                        existing[k] = v
+            elif existing is None or not isinstance(existing, dict):
+                normalized[key] = val
+        return normalized
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.cache_file)
+        except OSError:
+            return None
+
+    def reload(self):
+        """Re-reads cache.json (e.g. after another process wrote it)."""
+        mtime = self._file_mtime()
+        data = self._load_cache()
+        with self.lock:
+            self.data = data
+            self.mtime = mtime
+            self.index = None
+
+    def reload_if_changed(self):
+        """
+        Reloads when cache.json changed on disk since we last read or wrote it
+        (the GUI or a 'bulk' command in another process). Unsaved writes of an
+        open batch win. Returns True if it reloaded.
+        """
+        with self.lock:
+            if self.dirty or self._file_mtime() == self.mtime:
+                return False
+        self.reload()
+        return True
+
     def save_cache(self):
+        start = time.perf_counter()
         with self.lock:
             with open(self.cache_file, 'w', encoding='utf-8') as f:
                 json.dump(self.data, f, indent=4)
+                size = f.tell()
+            self.mtime = self._file_mtime()
+            self.dirty = False
+            self.last_save = time.monotonic()
+        metrics.observe('cache_save_seconds', time.perf_counter() - start)
+        metrics.set('cache_save_bytes', size)
 
     def get_imdb_id(self, url):
+        key = cache_key(url)
         with self.lock:
-            val = self.data.get(url)
+            val = self.data.get(key)
             if isinstance(val, dict):
-                return val.get('id')
-            return val
+                val = val.get('id')
+        metrics.inc('cache_lookups_total', cache='imdb_id', result='hit' if val else 'miss')
+        return val
 
     def get_status(self, url):
+        key = cache_key(url)
         with self.lock:
-            val = self.data.get(url)
+            val = self.data.get(key)
             if isinstance(val, dict):
                 return val.get('status')
             return None
 
     def set_imdb_id(self, url, imdb_id):
+        key = cache_key(url)
         with self.lock:
             # Preserve existing status if it was a dict
-            current = self.data.get(url)
+            current = self.data.get(key)
             if isinstance(current, dict):
                 current['id'] = imdb_id
-                self.data[url] = current
+                self.data[key] = current
             else:
-                self.data[url] = {
+                self.data[key] = {
                     'id': imdb_id,
                     'status': 'active' # Default status
                 }
-        self.save_cache()
+            self._reindex(key)
+        self._persist()
 
     def get_trakt_data(self, url):
+        key = cache_key(url)
         with self.lock:
-            val = self.data.get(url)
-            if isinstance(val, dict):
-                return val.get('trakt_data')
-            return None
+            val = self.data.get(key)
+            trakt_data = val.get('trakt_data') if isinstance(val, dict) else None
+        metrics.inc('cache_lookups_total', cache='trakt_data', result='hit' if trakt_data else 'miss')
+        return trakt_data
 
     def set_trakt_data(self, url, trakt_data):
+        key = cache_key(url)
         with self.lock:
-            current = self.data.get(url)
+            current = self.data.get(key)
             if isinstance(current, dict):
                 current['trakt_data'] = trakt_data
-                self.data[url] = current
+                self.data[key] = current
             else:
                 # If it was a string ID or None, upgrade it
                 imdb_id = current if isinstance(current, str) else None
-                self.data[url] = {
+                self.data[key] = {
                     'id': imdb_id,
                     'trakt_data': trakt_data,
                     'status': 'active'
                 }
-        self.save_cache()
+            self._reindex(key)
+        self._persist()
 
     def set_status(self, url, status):
+        key = cache_key(url)
         with self.lock:
-            current = self.data.get(url)
+            current = self.data.get(key)
             if isinstance(current, dict):
                 current['status'] = status
-                self.data[url] = current
+                self.data[key] = current
             else:
                 # Upgrade to dict (keeping ID if it was string)
                 imdb_id = current if isinstance(current, str) else None
-                self.data[url] = {
+                self.data[key] = {
                     'id': imdb_id,
                     'status': status
                 }
-        self.save_cache()
+            self._reindex(key)
+        self._persist()
 
     def get_date(self, url):
+        key = cache_key(url)
         with self.lock:
-            val = self.data.get(url)
+            val = self.data.get(key)
             if isinstance(val, dict):
                 return val.get('date')
             return None
 
     def set_date(self, url, date_str):
         """Stores the watch date string (e.g., DD-MM-YYYY) in cache."""
+        key = cache_key(url)
         with self.lock:
-            current = self.data.get(url)
+            current = self.data.get(key)
             if isinstance(current, dict):
                 current['date'] = date_str
-                self.data[url] = current
+                self.data[key] = current
             else:
                 # Should normally be a dict by the time we have a date, but handle upgrade
                 imdb_id = current if isinstance(current, str) else None
-                self.data[url] = {
+                self.data[key] = {
                     'id': imdb_id,
                     'date': date_str,
                     'status': 'active'
                 }
+            self._reindex(key)
+        self._persist()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Defers persisting: writes inside the block (from any thread) are saved
+        once when the outermost batch ends, or every BATCH_FLUSH_SECONDS.
+        """
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                flush = self.batch_depth == 0 and self.dirty
+            if flush:
+                self.save_cache()
+
+    def _persist(self):
+        with self.lock:
+            if self.batch_depth:
+                self.dirty = True
+                if time.monotonic() - self.last_save < BATCH_FLUSH_SECONDS:
+                    return
         self.save_cache()
 
+    def bulk_update(self, updates):
+        """
+        updates: {url: {field: value}} with fields from ENTRY_FIELDS.
+        Applies everything under one lock and persists once. URLs not in the
+        cache are skipped, never created. Returns (updated count, skipped urls).
+        """
+        for fields in updates.values():
+            unknown = set(fields) - set(ENTRY_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown cache fields: {', '.join(sorted(unknown))}")
+        updated = 0
+        missing = []
+        with self.lock:
+            for url, fields in updates.items():
+                key = cache_key(url)
+                if key not in self.data:
+                    missing.append(url)
+                    continue
+                current = self.data[key]
+                if isinstance(current, dict):
+                    current.update(fields)
+                else:
+                    # Upgrade to dict (keeping ID if it was string)
+                    entry = {'id': current if isinstance(current, str) else None, 'status': 'active'}
+                    entry.update(fields)
+                    self.data[key] = entry
+                self._reindex(key)
+                updated += 1
+        if updated:
+            self._persist()
+        return updated, missing
+
+    def set_status_many(self, urls, status):
+        return self.bulk_update({url: {'status': status} for url in urls})
+
+    def _reindex(self, key):
+        # Caller holds self.lock
+        if self.index is not None:
+            self.index.update(key, self.data.get(key))
+
+    def ensure_index(self):
+        """Builds the search index if needed (the first search() does it otherwise)."""
+        with self.lock:
+            if self.index is None:
+                self.index = SearchIndex()
+                self.index.build(self.data.items())
+            return self.index
+
+    def search(self, query):
+        """Keys of the entries matching query (see SearchIndex), in no particular order."""
+        return self.ensure_index().search(query)
+
+    def get_entry(self, url):
+        """Raw cache value for url (dict, or an IMDb ID string in old caches)."""
+        with self.lock:
+            return self.data.get(cache_key(url))
+
     def get_all_items(self):
         with self.lock:
             # Return copy to avoid thread issues
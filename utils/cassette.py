@@ -0,0 +1,120 @@
+"""
+Record/replay of HTTP traffic going through the shared transport.
+
+Record mode writes every request/response pair (Trakt, TMDB, HDRezka) of a
+live sync to a gzipped JSON-lines cassette; replay mode serves them back, in
+recorded order per method+URL, with the original latency or none at all.
+
+Only requests that went through utils.transport are covered; Playwright
+traffic is not, so recorded/replayed runs use the HTTP watch list.
+Cassettes hold token responses and session cookies, treat them like
+trakt_token.json.
+"""
+import base64
+import gzip
+import io
+import json
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+class CassetteMiss(requests.RequestException):
+    """
+    Replay has no (more) recorded responses for this request.
+    Not a ConnectionError on purpose: retrying or failing over can't help.
+    """
+
+
+class Cassette:
+    def __init__(self, path, mode, realtime=True):
+        """
+        mode: 'record' or 'replay'.
+        realtime: replay with the recorded latency; False serves instantly.
+        """
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.count = 0
+        self.file = None
+        if mode == RECORD:
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            self._load()
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.entries.setdefault((entry['method'], entry['url']), []).append(entry)
+                self.count += 1
+
+    def record(self, method, url, response, elapsed):
+        """Appends one exchange. Reads the whole body, a streamed response is buffered."""
+        body = response.content
+        try:
+            encoded, encoding = body.decode('utf-8'), 'text'
+        except UnicodeDecodeError:
+            encoded, encoding = base64.b64encode(body).decode('ascii'), 'b64'
+        entry = {
+            'method': method,
+            'url': url,
+            'status': response.status_code,
+            'headers': dict(response.headers),
+            'body': encoded,
+            'encoding': encoding,
+            'elapsed': round(elapsed, 4)
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            self.file.write(line + '\n')
+            self.count += 1
+
+    def play(self, method, url):
+        """Next recorded response for method+url as a requests.Response."""
+        with self.lock:
+            queue = self.entries.get((method, url))
+            if not queue:
+                raise CassetteMiss(f"No recorded response for {method} {url}")
+            entry = queue.pop(0)
+        if self.realtime and entry['elapsed']:
+            time.sleep(entry['elapsed'])
+
+        if entry['encoding'] == 'b64':
+            body = base64.b64decode(entry['body'])
+        else:
+            body = entry['body'].encode('utf-8')
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        # Decoded body: drop the transfer headers that no longer apply
+        response.headers.pop('Content-Encoding', None)
+        response.headers['Content-Length'] = str(len(body))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+        response.url = url
+        return response
+
+    def remaining(self):
+        with self.lock:
+            return sum(len(q) for q in self.entries.values())
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,131 @@
+"""
+Typed progress events from the sync engine (main.start(events=...)).
+
+The sync thread emits; every subscriber gets its own bounded queue and drains
+it at its own pace (the GUI on a timer). A full queue drops the oldest
+progress ticks rather than blocking the sync, phase and finish events are
+always kept.
+"""
+import queue
+import threading
+import time
+
+PHASE_STARTED = 'phase_started'
+PHASE_FINISHED = 'phase_finished'
+PROGRESS = 'progress'           # An item resolved / a batch posted: done of total, ETA
+COUNTS = 'counts'               # Item counts so far (watch_list, resolved, to_sync, ...)
+SYNC_FINISHED = 'sync_finished'
+
+# Phases in the order a full sync runs them (fix_duplicates only with --fix-duplicates)
+PHASES = ('trakt_auth', 'fix_duplicates', 'trakt_watched', 'watch_list', 'phase1',
+          'trakt_progress', 'plan', 'phase2', 'verify')
+
+QUEUE_SIZE = 10000
+
+
+class Event:
+    __slots__ = ('kind', 'phase', 'done', 'total', 'eta', 'data', 'time')
+
+    def __init__(self, kind, phase=None, done=0, total=0, eta=None, data=None):
+        self.kind = kind
+        self.phase = phase
+        self.done = done
+        self.total = total
+        self.eta = eta # Seconds left in the phase, None until it can be estimated
+        self.data = data or {}
+        self.time = time.time()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Event({self.to_dict()})"
+
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.phase = None
+        self.phase_start = None
+        self.counts = {}
+        self.last_progress = None
+
+    def subscribe(self, maxsize=QUEUE_SIZE):
+        """Returns a queue.Queue that receives every event from now on."""
+        q = queue.Queue(maxsize)
+        with self.lock:
+            self.subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            if q in self.subscribers:
+                self.subscribers.remove(q)
+
+    def emit(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(event)
+                    break
+                except queue.Full:
+                    if event.kind == PROGRESS:
+                        break # Newer ticks will follow
+                    try:
+                        q.get_nowait() # Make room for a phase/finish event
+                    except queue.Empty:
+                        pass
+
+    def reset(self):
+        """Forgets the phase and counts of the previous run (one bus serves many runs)."""
+        self.phase = None
+        self.phase_start = None
+        self.last_progress = None
+        with self.lock:
+            self.counts = {}
+
+    def snapshot(self):
+        """Where the current run is, for pollers without a queue (the control API)."""
+        with self.lock:
+            counts = dict(self.counts)
+        progress = self.last_progress
+        return {'phase': self.phase, 'counts': counts,
+                'progress': progress.to_dict() if progress and progress.phase == self.phase else None}
+
+    def start_phase(self, name):
+        """Finishes the running phase (if any) and starts name."""
+        self.end_phase()
+        self.phase = name
+        self.phase_start = time.monotonic()
+        self.emit(Event(PHASE_STARTED, phase=name))
+
+    def end_phase(self):
+        if self.phase is None:
+            return
+        elapsed = round(time.monotonic() - self.phase_start, 3)
+        self.emit(Event(PHASE_FINISHED, phase=self.phase, data={'elapsed': elapsed}))
+        self.phase = None
+
+    def progress(self, done, total, **data):
+        """done of total in the current phase, with an ETA from the rate so far."""
+        eta = None
+        if self.phase_start is not None and 0 < done < total:
+            elapsed = time.monotonic() - self.phase_start
+            eta = round(elapsed / done * (total - done), 1)
+        self.last_progress = Event(PROGRESS, phase=self.phase, done=done, total=total, eta=eta, data=data)
+        self.emit(self.last_progress)
+
+    def count(self, **counts):
+        with self.lock:
+            self.counts.update(counts)
+            counts = dict(self.counts)
+        self.emit(Event(COUNTS, phase=self.phase, data=counts))
+
+    def finish(self, ok):
+        self.end_phase()
+        with self.lock:
+            counts = dict(self.counts)
+        self.emit(Event(SYNC_FINISHED, data={'ok': ok, 'counts': counts}))
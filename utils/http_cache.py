@@ -0,0 +1,182 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from utils.cache import cache_key
+from utils.metrics import metrics
+
+HTTP_CACHE_DIR = 'http_cache'
+HTTP_CACHE_MAX_BYTES = 64 * 1024 * 1024  # compressed size on disk
+INDEX_FILE = 'index.json'
+# index.json is written at most this often while entries change, and on flush()
+INDEX_SAVE_SECONDS = 30
+
+class HttpCache:
+    """
+    Compressed on-disk cache for HDRezka GET responses, keyed by URL path
+    (cache_key), so a page cached via one mirror revalidates via another.
+    Stores ETag/Last-Modified so pages can be revalidated with conditional
+    requests, and evicts least recently used bodies above max_bytes.
+    Bodies are read and written outside the lock; the index is saved
+    periodically and on flush() (also run at exit).
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+        self.dirty = False
+        self.last_save = time.monotonic()
+        atexit.register(self.flush)
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _body_path(self, url):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest() + '.gz'
+        return os.path.join(self.cache_dir, name)
+
+    def _load_index(self):
+        if os.path.exists(self._index_path()):
+            try:
+                with open(self._index_path(), 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError):
+                return {}
+        return {}
+
+    def _save_index(self):
+        # Caller holds self.lock
+        # Write-then-rename so a crash never leaves a half written index
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self._index_path())
+        self.dirty = False
+        self.last_save = time.monotonic()
+
+    def _changed(self):
+        # Caller holds self.lock
+        self.dirty = True
+        if time.monotonic() - self.last_save >= INDEX_SAVE_SECONDS:
+            self._save_index()
+
+    def flush(self):
+        """Writes index.json if entries changed since the last save."""
+        with self.lock:
+            if self.dirty:
+                self._save_index()
+
+    def get(self, url):
+        """
+        Returns (meta, body) for a cached URL, or (None, None).
+        meta: {'etag', 'last_modified', 'complete', 'size', 'atime'}
+        """
+        url = cache_key(url)
+        with self.lock:
+            meta = self.index.get(url)
+        if not meta:
+            metrics.inc('cache_lookups_total', cache='http', result='miss')
+            return None, None
+        try:
+            with gzip.open(self._body_path(url), 'rb') as f:
+                body = f.read()
+        except (OSError, EOFError):
+            # Body was removed behind our back, forget the entry (unless replaced meanwhile)
+            with self.lock:
+                if self.index.get(url) is meta:
+                    del self.index[url]
+                    self._changed()
+            return None, None
+        with self.lock:
+            meta['atime'] = time.time()
+            meta = dict(meta)
+        metrics.inc('cache_lookups_total', cache='http', result='hit')
+        return meta, body
+
+    def validators(self, meta):
+        """Conditional request headers for a cached entry."""
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def put(self, url, body, response_headers, complete=True):
+        """
+        Stores a response body.
+        complete=False marks a prefix of the page (streaming stopped early).
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        url = cache_key(url)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._body_path(url)
+        # Compress outside the lock, the rename makes the new body visible at once
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, 'wb', compresslevel=6) as f:
+            f.write(body)
+        size = os.path.getsize(tmp)
+        with self.lock:
+            os.replace(tmp, path)
+            self.index[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'complete': complete,
+                'size': size,
+                'atime': time.time()
+            }
+            self._evict()
+            self._changed()
+
+    def touch(self, url):
+        """Marks a cached entry as fresh after a 304."""
+        url = cache_key(url)
+        with self.lock:
+            if url in self.index:
+                self.index[url]['atime'] = time.time()
+                self._changed()
+
+    def _evict(self):
+        total = sum(m.get('size', 0) for m in self.index.values())
+        if total <= self.max_bytes:
+            return
+        # Oldest access first
+        for url, meta in sorted(self.index.items(), key=lambda kv: kv[1].get('atime', 0)):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+            total -= meta.get('size', 0)
+            del self.index[url]
+
+    def fetch(self, session, url, headers=None, timeout=10, offline=False):
+        """
+        Full-body conditional GET (used by the debug scripts).
+        Returns (body, from_cache). A cached prefix from an early-stopped stream
+        is not trusted here, it is downloaded again in full.
+        offline=True serves whatever is cached without touching the network.
+        """
+        meta, body = self.get(url)
+        if offline:
+            return body, body is not None
+        req_headers = dict(headers or {})
+        if meta and meta.get('complete'):
+            req_headers.update(self.validators(meta))
+
+        response = session.get(url, headers=req_headers, timeout=timeout)
+        if response.status_code == 304 and body is not None:
+            self.touch(url)
+            return body, True
+        if response.status_code == 200:
+            self.put(url, response.content, response.headers, complete=True)
+        return response.content, False
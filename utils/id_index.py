@@ -0,0 +1,39 @@
+import threading
+
+ID_SOURCES = ('imdb', 'tmdb', 'tvdb', 'trakt')
+
+class IdIndex:
+    """
+    In-memory ID lookup built from the Trakt watched payloads we already downloaded.
+    Maps imdb/tmdb/tvdb/trakt IDs to the Trakt object and its type, in the same
+    shape as a search_by_imdb result: {'type': 'show', 'show': {...}}.
+    """
+
+    def __init__(self):
+        self.by_id = {}
+        self.lock = threading.Lock()
+
+    def add_watched(self, watched):
+        """watched: dict/list of /sync/watched items ({'show': {...}} or {'movie': {...}})."""
+        items = watched.values() if isinstance(watched, dict) else watched
+        with self.lock:
+            for item in items:
+                for item_type in ('show', 'movie'):
+                    obj = item.get(item_type)
+                    if not obj:
+                        continue
+                    # Summary only, the seasons/episodes stay in the watched payload
+                    entry = {'type': item_type, item_type: obj}
+                    for source in ID_SOURCES:
+                        value = obj.get('ids', {}).get(source)
+                        if value:
+                            # tmdb/tvdb numbers are shared between movies and shows
+                            self.by_id[(source, item_type, str(value))] = entry
+                            self.by_id.setdefault((source, None, str(value)), entry)
+
+    def lookup(self, source, value, item_type=None):
+        """Returns the search-result shaped entry or None. source: imdb/tmdb/tvdb/trakt."""
+        if not value:
+            return None
+        with self.lock:
+            return self.by_id.get((source, item_type, str(value)))
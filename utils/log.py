@@ -0,0 +1,78 @@
+"""
+Logging setup for the CLI, the GUI and the daemon.
+
+Every record goes through a QueueHandler; a QueueListener thread does the
+actual console/file writes, so a sync thread never blocks on I/O. The log
+file rotates at LOG_MAX_BYTES. Modules log with logging.getLogger(__name__)
+and %-style arguments, so disabled levels (per-row DEBUG output) cost only
+the level check.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FILE = os.getenv('LOG_FILE', 'sync_log.txt')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 5 * 1024 * 1024))
+LOG_BACKUP_COUNT = 3
+
+CONSOLE_FORMAT = '%(message)s'
+FILE_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+# Chatty third-party loggers, kept at WARNING even with --log-level DEBUG
+QUIET_LOGGERS = ('urllib3', 'asyncio', 'PIL')
+
+_listener = None
+_queue_handler = None
+
+
+def setup_logging(level=LOG_LEVEL, log_file=LOG_FILE, console=True, handlers=()):
+    """
+    Routes the root logger through a queue to the console (stdout, bare
+    messages), the rotating log file and any extra handlers (the GUI adds
+    one). Calling it again replaces the previous setup.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    targets = []
+    if console:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        targets.append(stream)
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
+        file_handler.setFormatter(logging.Formatter(FILE_FORMAT))
+        targets.append(file_handler)
+    targets.extend(handlers)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *targets, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flushes pending records and stops the writer thread."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,241 @@
+"""
+Process-wide metrics registry: counters, gauges and histograms with labels.
+
+The shared transport records per-endpoint latency, status codes, retries,
+throttling waits and bytes; Cache/HttpCache record hits and misses; start()
+records phase durations. At the end of a run write_reports() dumps a JSON
+summary of that run (counters/histograms since start_run()) and a Prometheus
+textfile with the process lifetime totals (node_exporter textfile collector
+format).
+"""
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+# Seconds, tuned for HTTP calls and sync phases
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+METRICS_JSON = os.getenv('METRICS_JSON', 'metrics.json')
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE', 'trakt_sync.prom')
+PREFIX = 'trakt_sync_'
+
+# Path segments that are IDs, collapsed so endpoints stay low-cardinality
+ID_SEGMENT_RE = re.compile(r'^(tt\d+|\d{2,}|\d+-.+)$')
+
+HELP = {
+    'http_request_duration_seconds': 'HTTP request latency per endpoint',
+    'http_responses_total': 'HTTP responses by status code',
+    'http_errors_total': 'HTTP requests that failed without a response',
+    'http_retries_total': 'HTTP retries by reason',
+    'http_throttle_wait_seconds_total': 'Seconds spent waiting on 423/429 responses',
+    'http_request_bytes_total': 'Request body bytes sent',
+    'http_response_bytes_total': 'Response body bytes received',
+    'cache_lookups_total': 'Cache lookups by result (hit/miss)',
+    'cache_save_seconds': 'Time to persist cache.json',
+    'cache_save_bytes': 'Size of the last cache.json write',
+    'sync_phase_duration_seconds': 'Wall time of each sync phase in the last run',
+    'sync_items': 'Item counts of the last run',
+    'sync_last_run_timestamp_seconds': 'Unix time the last run finished',
+    'sync_last_run_success': '1 if the last run finished without aborting',
+    'sync_runs_total': 'Syncs by mode (full/incremental) and result',
+}
+
+# Gauges describing a single run, dropped by start_run() so a short run
+# (one title, an unchanged incremental one) doesn't report an older run's values
+RUN_GAUGES = ('sync_phase_duration_seconds', 'sync_items')
+
+
+def endpoint_template(url):
+    """'https://api.trakt.tv/sync/history/shows/123?x=1' -> '/sync/history/shows/:id'"""
+    path = urllib.parse.urlsplit(url).path or '/'
+    parts = [':id' if part and ID_SEGMENT_RE.match(part) else part for part in path.split('/')]
+    return '/'.join(parts)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the overflow bucket)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        # Same, since the last start_run() (the JSON summary)
+        self.run_counters = {}
+        self.run_histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.run_counters[key] = self.run_counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            for histograms in (self.histograms, self.run_histograms):
+                histogram = histograms.get(key)
+                if histogram is None:
+                    histogram = histograms[key] = Histogram()
+                histogram.observe(value)
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.run_counters.clear()
+            self.run_histograms.clear()
+
+    def start_run(self):
+        """Starts the per-run view: drops RUN_GAUGES and the run's counters/histograms."""
+        with self.lock:
+            self.run_counters.clear()
+            self.run_histograms.clear()
+            for key in [key for key in self.gauges if key[0] in RUN_GAUGES]:
+                del self.gauges[key]
+
+    def summary(self):
+        """
+        JSON-friendly view of the current run: {'counters': {name: [{labels, value}]},
+        'gauges': ..., 'histograms': ...}, counters and histograms since start_run().
+        """
+        def group(items, render):
+            out = {}
+            for (name, labels), value in sorted(items, key=lambda kv: kv[0]):
+                out.setdefault(name, []).append(dict(labels=dict(labels), **render(value)))
+            return out
+
+        with self.lock:
+            return {
+                'counters': group(self.run_counters.items(), lambda v: {'value': v}),
+                'gauges': group(self.gauges.items(), lambda v: {'value': v}),
+                'histograms': group(self.run_histograms.items(), lambda h: h.summary()),
+            }
+
+    def prometheus(self):
+        """Prometheus text exposition format, counters and histograms over the process lifetime."""
+        lines = []
+
+        def header(name, kind):
+            help_text = HELP.get(name)
+            if help_text:
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = ','.join(f'{k}="{_escape(v)}"' for k, v in pairs)
+            return '{' + escaped + '}'
+
+        with self.lock:
+            for kind, items in (('counter', self.counters), ('gauge', self.gauges)):
+                last = None
+                for (name, labels), value in sorted(items.items()):
+                    if name != last:
+                        header(name, kind)
+                        last = name
+                    lines.append(f"{PREFIX}{name}{fmt(labels)} {value}")
+            last = None
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                if name != last:
+                    header(name, 'histogram')
+                    last = name
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{PREFIX}{name}_bucket{fmt(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{PREFIX}{name}_sum{fmt(labels)} {histogram.sum}")
+                lines.append(f"{PREFIX}{name}_count{fmt(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_reports(self, json_path=METRICS_JSON, textfile_path=METRICS_TEXTFILE):
+        """Writes both files atomically (the textfile collector may read at any time)."""
+        for path, content in ((json_path, json.dumps(self.summary(), indent=4)),
+                              (textfile_path, self.prometheus())):
+            if not path:
+                continue
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp, path)
+
+
+class _Timer:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Shared by all services, like utils.transport.transport
+metrics = Metrics()
@@ -0,0 +1,173 @@
+"""
+Per-phase profiling for a sync run (main.py --profile).
+
+Each phase gets a cProfile of the sync thread, its wall/CPU time and the
+tracemalloc peak plus top allocation sites. A sampling thread records the
+stacks of all threads (Phase 1 runs on a pool) into a collapsed-stack file,
+one 'phase;frame;frame count' line per stack, which flamegraph.pl,
+speedscope and inferno read directly.
+
+Output in PROFILE_DIR: report.txt, report.json, <phase>.prof (pstats),
+stacks.collapsed.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from utils.metrics import metrics
+
+PROFILE_DIR = 'profile'
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 10
+# tracemalloc frames kept per allocation, more is more precise and slower
+TRACE_FRAMES = 5
+
+
+class Profiler:
+    """
+    profiler.switch('phase1') ends the running phase (if any) and starts the
+    next one, so phases can be marked inline without re-indenting start().
+    finish() ends the last phase and writes the reports.
+    Phase wall times always go to the metrics registry; a disabled profiler
+    does nothing else.
+    """
+
+    def __init__(self, enabled=True, output_dir=PROFILE_DIR, sample_interval=SAMPLE_INTERVAL):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.phases = []
+        self.current = None
+        self.stacks = Counter()
+        self.sampler = None
+        self.stop_sampling = threading.Event()
+        self.started_tracemalloc = False
+        self.phase_name = None
+        self.phase_start = None
+
+    def _record_duration(self):
+        if self.phase_name is not None:
+            metrics.set('sync_phase_duration_seconds', round(time.perf_counter() - self.phase_start, 3),
+                        phase=self.phase_name)
+            self.phase_name = None
+
+    def switch(self, name):
+        self._record_duration()
+        self.phase_name = name
+        self.phase_start = time.perf_counter()
+        if not self.enabled:
+            return
+        self._end_phase()
+        if self.sampler is None:
+            self._start_sampler()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self.started_tracemalloc = True
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        self.current = {
+            'name': name,
+            'profile': profile,
+            'wall_start': time.perf_counter(),
+            'cpu_start': time.process_time(),
+            'mem_start': tracemalloc.get_traced_memory()[0]
+        }
+        profile.enable()
+
+    def _end_phase(self):
+        phase = self.current
+        if phase is None:
+            return
+        phase['profile'].disable()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        phase.update({
+            'wall_s': time.perf_counter() - phase['wall_start'],
+            'cpu_s': time.process_time() - phase['cpu_start'],
+            'peak_alloc_bytes': peak,
+            'retained_bytes': current - phase['mem_start'],
+            'top_allocations': [
+                {'where': str(stat.traceback[0]), 'bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            ]
+        })
+        self.phases.append(phase)
+        self.current = None
+
+    def _start_sampler(self):
+        def sample():
+            me = threading.get_ident()
+            while not self.stop_sampling.wait(self.sample_interval):
+                label = self.current['name'] if self.current else 'idle'
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.append(label)
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+        self.sampler = threading.Thread(target=sample, name='profiler-sampler', daemon=True)
+        self.sampler.start()
+
+    def finish(self):
+        """Ends the last phase and writes the reports. Returns the report path or None."""
+        self._record_duration()
+        if not self.enabled:
+            return None
+        self._end_phase()
+        if self.sampler is not None:
+            self.stop_sampling.set()
+            self.sampler.join()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        if not self.phases:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = []
+        text = io.StringIO()
+        total = sum(p['wall_s'] for p in self.phases)
+        text.write(f"Sync profile, {total:.2f}s in {len(self.phases)} phases\n\n")
+        text.write(f"{'phase':<16}{'wall s':>10}{'cpu s':>10}{'share':>8}{'peak MB':>10}\n")
+        for phase in self.phases:
+            share = phase['wall_s'] / total if total else 0
+            text.write(f"{phase['name']:<16}{phase['wall_s']:>10.2f}{phase['cpu_s']:>10.2f}"
+                       f"{share:>8.0%}{phase['peak_alloc_bytes'] / 1e6:>10.1f}\n")
+
+        for phase in self.phases:
+            phase['profile'].dump_stats(os.path.join(self.output_dir, f"{phase['name']}.prof"))
+            stream = io.StringIO()
+            stats = pstats.Stats(phase['profile'], stream=stream)
+            stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            text.write(f"\n=== {phase['name']} ({phase['wall_s']:.2f}s wall, {phase['cpu_s']:.2f}s cpu) ===\n")
+            text.write("Top allocations:\n")
+            for alloc in phase['top_allocations']:
+                text.write(f"  {alloc['bytes'] / 1024:>10.1f} KB  {alloc['count']:>7}  {alloc['where']}\n")
+            text.write(stream.getvalue())
+            summary.append({k: v for k, v in phase.items()
+                            if k not in ('profile', 'wall_start', 'cpu_start', 'mem_start')})
+
+        report_path = os.path.join(self.output_dir, 'report.txt')
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+        with open(os.path.join(self.output_dir, 'report.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
+        with open(os.path.join(self.output_dir, 'stacks.collapsed'), 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+        return report_path
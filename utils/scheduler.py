@@ -0,0 +1,94 @@
+"""
+Run loop of the sync daemon (main.py daemon).
+
+Calls a job every interval seconds, spread by a random jitter so restarts of
+several daemons don't hit Trakt/HDRezka in lockstep. While the job fails the
+wait doubles per consecutive failure, up to max_backoff. trigger() runs the
+job early (with keyword arguments for that run), stop() ends the loop.
+"""
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 30 * 60
+DEFAULT_JITTER = 0.1            # +-10% of the wait
+MAX_BACKOFF_SECONDS = 6 * 60 * 60
+
+
+class Scheduler:
+    def __init__(self, job, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER, max_backoff=MAX_BACKOFF_SECONDS):
+        self.job = job # job(**kwargs) -> truthy on success, raising counts as a failure
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max(max_backoff, interval)
+        self.failures = 0
+        self.running = False
+        self.next_run = None # Unix time of the next scheduled run, None while running
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.pending = None # kwargs of a triggered run
+
+    def next_delay(self):
+        delay = self.interval
+        if self.failures:
+            delay = min(self.interval * 2 ** self.failures, self.max_backoff)
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def trigger(self, **kwargs):
+        """
+        Runs the job as soon as the current run (if any) is done. Triggers
+        queued meanwhile are merged into that one run: list values add up,
+        other values are overwritten by later triggers.
+        """
+        with self.lock:
+            pending = self.pending or {}
+            for name, value in kwargs.items():
+                if isinstance(value, list):
+                    value = pending.get(name, []) + value
+                pending[name] = value
+            self.pending = pending
+        self.wake.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+    def run(self, run_now=True):
+        """Blocks until stop(). run_now: first run immediately instead of after a delay."""
+        delay = 0 if run_now else self.next_delay()
+        while not self.stopping.is_set():
+            if delay:
+                self.next_run = time.time() + delay
+                logger.info("Next sync in %s.", format_delay(delay))
+            self.wake.wait(delay)
+            if self.stopping.is_set():
+                break
+            with self.lock:
+                kwargs, self.pending = self.pending or {}, None
+                self.wake.clear()
+            self.next_run = None
+
+            self.running = True
+            try:
+                ok = self.job(**kwargs)
+            except Exception as e:
+                logger.exception("Sync failed: %s", e)
+                ok = False
+            finally:
+                self.running = False
+            self.failures = 0 if ok else self.failures + 1
+            if self.failures:
+                logger.warning("%s failed sync(s) in a row, backing off.", self.failures)
+            delay = self.next_delay()
+
+
+def format_delay(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
@@ -0,0 +1,148 @@
+import bisect
+import re
+import threading
+
+# Words of URLs/titles, unicode aware (titles may be Cyrillic)
+WORD_RE = re.compile(r'[^\W_]+')
+# Path words that every entry has
+STOP_TERMS = {'html'}
+TRIGRAM = 3
+# Numbers and IMDb IDs are looked up by prefix only, trigrams of every unique ID
+# would dominate the index
+ID_TERM_RE = re.compile(r'^(tt)?\d+$')
+
+def words(text):
+    return WORD_RE.findall(str(text).lower())
+
+def trigrams(term):
+    return {term[i:i + TRIGRAM] for i in range(len(term) - TRIGRAM + 1)}
+
+def entry_terms(key, entry):
+    """Search terms of one cache entry: URL slug words, Trakt title words, year, IDs, status."""
+    parts = [key]
+    if isinstance(entry, dict):
+        trakt_data = entry.get('trakt_data') or {}
+        parts += [entry.get('id'), entry.get('status'), trakt_data.get('title'), trakt_data.get('year')]
+        parts += (trakt_data.get('ids') or {}).values()
+    else:
+        parts.append(entry) # Old caches: bare IMDb ID
+    terms = set(words(' '.join(str(part) for part in parts if part))) - STOP_TERMS
+    # '0903747' finds tt0903747 too
+    terms.update([term[2:] for term in terms if term[:2] == 'tt' and term[2:].isdigit()])
+    return terms
+
+class SearchIndex:
+    """
+    Inverted index over cache entries. A query matches an entry when every query
+    word matches one of its terms, as a prefix ('break' -> 'breaking', '2019',
+    'tt09037') or, for words of three or more characters, as a substring of a
+    title/slug word found through trigram postings ('reaking' -> 'breaking').
+    Kept current by Cache on every write.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.terms_by_key = {}
+        self.keys_by_term = {}
+        self.terms_by_trigram = {}
+        self.sorted_terms = None # For prefix lookups, kept sorted once built
+
+    def build(self, items):
+        with self.lock:
+            for key, entry in items:
+                self._add(key, entry_terms(key, entry))
+            self.sorted_terms = sorted(self.keys_by_term)
+
+    def update(self, key, entry):
+        terms = entry_terms(key, entry)
+        with self.lock:
+            old = self.terms_by_key.get(key)
+            if old == terms:
+                return
+            if old is not None:
+                self._remove(key)
+            self._add(key, terms)
+
+    def remove(self, key):
+        with self.lock:
+            if key in self.terms_by_key:
+                self._remove(key)
+
+    def _add(self, key, terms):
+        self.terms_by_key[key] = terms
+        for term in terms:
+            keys = self.keys_by_term.get(term)
+            if keys is None:
+                keys = self.keys_by_term[term] = set()
+                if not ID_TERM_RE.match(term):
+                    for gram in trigrams(term):
+                        self.terms_by_trigram.setdefault(gram, set()).add(term)
+                if self.sorted_terms is not None:
+                    bisect.insort(self.sorted_terms, term)
+            keys.add(key)
+
+    def _remove(self, key):
+        for term in self.terms_by_key.pop(key):
+            keys = self.keys_by_term[term]
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_term[term]
+                if not ID_TERM_RE.match(term):
+                    for gram in trigrams(term):
+                        grams = self.terms_by_trigram[gram]
+                        grams.discard(term)
+                        if not grams:
+                            del self.terms_by_trigram[gram]
+                if self.sorted_terms is not None:
+                    del self.sorted_terms[bisect.bisect_left(self.sorted_terms, term)]
+
+    def _matching_terms(self, word):
+        matches = []
+        if len(word) >= TRIGRAM and not ID_TERM_RE.match(word):
+            postings = [self.terms_by_trigram.get(gram) for gram in trigrams(word)]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            return [term for term in postings[0].intersection(*postings[1:]) if word in term]
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.keys_by_term)
+        for i in range(bisect.bisect_left(self.sorted_terms, word), len(self.sorted_terms)):
+            if not self.sorted_terms[i].startswith(word):
+                break
+            matches.append(self.sorted_terms[i])
+        return matches
+
+    def _term_matches(self, word, term):
+        if len(word) >= TRIGRAM and not ID_TERM_RE.match(word):
+            return word in term
+        return term.startswith(word)
+
+    def search(self, query):
+        """Set of cache keys matching every word of query (all keys for an empty query)."""
+        query_words = words(query)
+        with self.lock:
+            if not query_words:
+                return set(self.terms_by_key)
+            # Most selective word first (by posting sizes), the rest only narrow it down
+            candidates = []
+            for word in set(query_words):
+                terms = self._matching_terms(word)
+                candidates.append((sum(len(self.keys_by_term[term]) for term in terms), word, terms))
+            candidates.sort(key=lambda c: c[0])
+
+            _, _, terms = candidates[0]
+            result = set()
+            for term in terms:
+                result.update(self.keys_by_term[term])
+            for size, word, terms in candidates[1:]:
+                if not result:
+                    break
+                if len(result) < size:
+                    result = {key for key in result
+                              if any(self._term_matches(word, term) for term in self.terms_by_key[key])}
+                else:
+                    keys = set()
+                    for term in terms:
+                        keys.update(self.keys_by_term[term])
+                    result &= keys
+            return result
@@ -0,0 +1,64 @@
+import functools
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.owner = threading.get_ident()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, everyone arriving while it is in flight waits for and shares
+    its result (or exception). Nothing is cached once the call returns.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+
+        if not leader:
+            if call.owner == threading.get_ident():
+                # Re-entrant call from the leader itself (retry recursion), don't wait on ourselves
+                return fn(*args, **kwargs)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+_groups_lock = threading.Lock()
+
+def singleflight(method):
+    """
+    Method decorator: concurrent calls on the same instance with the same first
+    argument (IMDb ID, URL...) share one in-flight request.
+    """
+    @functools.wraps(method)
+    def wrapper(self, key, *args, **kwargs):
+        group = self.__dict__.get('_singleflight')
+        if group is None:
+            with _groups_lock:
+                group = self.__dict__.setdefault('_singleflight', SingleFlight())
+        return group.do((method.__name__, key), method, self, key, *args, **kwargs)
+    return wrapper
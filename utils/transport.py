@@ -0,0 +1,259 @@
+"""
+Shared HTTP transport for Trakt, TMDB and HDRezka.
+
+One place for retries (jittered exponential backoff, Retry-After aware, no
+recursion), per-host retry budgets so throttling can't turn into a retry storm,
+per-host circuit breakers and per-host keep-alive connection pools.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import metrics, endpoint_template
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (423, 429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+
+# Circuit breaker: open after N consecutive failures, probe again after reset_timeout
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+# Retry budget per host: retries spend tokens, successful requests earn a fraction back
+BUDGET_MAX_TOKENS = 50.0
+BUDGET_EARN_RATIO = 0.2
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without touching the network while a host's breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None # Start of the in-flight half-open probe
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        Closed: allow. Open: refuse until reset_timeout passed, then let one
+        probe through (half-open) and refuse the rest until it succeeds or fails.
+        A probe that never reports back frees the slot after another reset_timeout.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            if self.probe_at is not None and now - self.probe_at < self.reset_timeout:
+                return False
+            self.probe_at = now
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                # (Re)open, a failed half-open probe restarts the timer
+                self.opened_at = time.monotonic()
+                self.probe_at = None
+
+
+class RetryBudget:
+    def __init__(self, max_tokens=BUDGET_MAX_TOKENS, earn_ratio=BUDGET_EARN_RATIO):
+        self.max_tokens = max_tokens
+        self.earn_ratio = earn_ratio
+        self.tokens = max_tokens
+        self.lock = threading.Lock()
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.earn_ratio)
+
+
+class Transport:
+    def __init__(self, max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY,
+                 pool_size=POOL_SIZE):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.breakers = {}
+        self.budgets = {}
+        self.lock = threading.Lock()
+        # Optional utils.cassette.Cassette: records every exchange or serves them back
+        self.cassette = None
+
+    def session(self, host):
+        """Per-host session, so one slow host can't exhaust another host's pool."""
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return session
+
+    def breaker(self, host):
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker()
+            return breaker
+
+    def budget(self, host):
+        """Per-host retry budget, so a failing mirror can't spend Trakt's retries."""
+        with self.lock:
+            budget = self.budgets.get(host)
+            if budget is None:
+                budget = self.budgets[host] = RetryBudget()
+            return budget
+
+    def backoff(self, attempt):
+        """Equal jitter: half the exponential delay fixed, half random."""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def request(self, method, url, retry_statuses=RETRY_STATUSES, max_retries=None,
+                retry_errors=None, service=None, **kwargs):
+        """
+        Sends a request, retrying retry_statuses and connection errors.
+        retry_errors defaults to True for idempotent methods only, a POST that
+        timed out may already have been applied.
+        service labels the metrics ('trakt', 'tmdb', 'hdrezka'), defaults to the host.
+        Returns the last response (callers check status_code) or raises the
+        last connection error / CircuitOpenError.
+        """
+        method = method.upper()
+        max_retries = self.max_retries if max_retries is None else max_retries
+        if retry_errors is None:
+            retry_errors = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+
+        host = urllib.parse.urlsplit(url).netloc
+        session = self.session(host)
+        breaker = self.breaker(host)
+        budget = self.budget(host)
+        labels = {'service': service or host, 'endpoint': endpoint_template(url)}
+        sent_bytes = _body_size(kwargs)
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                metrics.inc('http_errors_total', error='CircuitOpen', **labels)
+                raise CircuitOpenError(f"Circuit open for {host}")
+
+            start = time.perf_counter()
+            try:
+                response = self._send(session, method, url, kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.inc('http_errors_total', error=e.__class__.__name__, **labels)
+                breaker.record_failure()
+                if not retry_errors or attempt >= max_retries or not budget.withdraw():
+                    raise
+                metrics.inc('http_retries_total', reason=e.__class__.__name__, service=labels['service'])
+                wait = self.backoff(attempt)
+                logger.warning("   [HTTP] %s: %s. Waiting %.1fs to retry (%s left)...", host, e.__class__.__name__, wait, max_retries - attempt)
+                self._sleep(wait)
+                attempt += 1
+                continue
+
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - start, method=method, **labels)
+            metrics.inc('http_responses_total', status=response.status_code, **labels)
+            if sent_bytes:
+                metrics.inc('http_request_bytes_total', sent_bytes, **labels)
+            if not kwargs.get('stream'):
+                # Already downloaded; streaming callers count what they actually read
+                metrics.inc('http_response_bytes_total', len(response.content), **labels)
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if response.status_code in retry_statuses and attempt < max_retries and budget.withdraw():
+                wait = self._retry_after(response)
+                if wait is None:
+                    wait = self.backoff(attempt)
+                metrics.inc('http_retries_total', reason=response.status_code, service=labels['service'])
+                if response.status_code in (423, 429):
+                    metrics.inc('http_throttle_wait_seconds_total', wait, service=labels['service'])
+                logger.warning("   [HTTP] %s: Status %s. Waiting %.1fs to retry (%s left)...", host, response.status_code, wait, max_retries - attempt)
+                response.close()
+                self._sleep(wait)
+                attempt += 1
+                continue
+
+            if response.status_code < 400:
+                budget.deposit()
+            return response
+
+    def _send(self, session, method, url, kwargs):
+        cassette = self.cassette
+        if cassette is not None and cassette.replaying:
+            return cassette.play(method, url)
+        start = time.monotonic()
+        response = session.request(method, url, **kwargs)
+        if cassette is not None:
+            cassette.record(method, url, response, time.monotonic() - start)
+        return response
+
+    def _sleep(self, seconds):
+        # Zero-latency replay skips the backoff waits too
+        if self.cassette is not None and self.cassette.replaying and not self.cassette.realtime:
+            return
+        time.sleep(seconds)
+
+    def _retry_after(self, response):
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            # Small jitter so threads throttled together don't return together
+            return min(self.max_delay, float(value)) + random.uniform(0, 1)
+        except ValueError:
+            return None
+
+def _body_size(kwargs):
+    data = kwargs.get('data')
+    if isinstance(data, (bytes, str)):
+        return len(data.encode('utf-8') if isinstance(data, str) else data)
+    if kwargs.get('json') is not None:
+        return len(json.dumps(kwargs['json']))
+    return 0
+
+# Shared by all services: one pool and one breaker per host for the whole process
+transport = Transport()